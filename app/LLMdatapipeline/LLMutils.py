@@ -3,85 +3,67 @@ LLM-utils.py
 
 =+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ utility functions for LLM ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
 
+The embedding model is loaded on first use, not at import, sentence_transformers (and torch) is
+only imported inside get_embedding_model(). Importing app.main (api workers, tests) therefore never
+pays for loading it. The summarizer is only used for ingestion, see ingest.py.
+
+benchmarks/startup_bench.py measures the import time and checks none of them are pulled in.
 """
-import json
+import logging
+import threading
+from functools import lru_cache
+from typing import Optional
 
 from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, Distance, VectorParams
-from sentence_transformers import SentenceTransformer, util
-from transformers import pipeline
-import time
-import torch
+from qdrant_client.models import Distance, VectorParams
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
 client = QdrantClient(host="qdrant", port=6333)
 
-def setup_qdrant():
+#lru_cache alone is not enough, two requests arriving together would both load the model
+_model_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+def get_embedding_model():
+    """
+    returns the SentenceTransformer used to embed hikes and chat queries, loaded on first call
+    """
+    with _model_lock:
+        return _load_embedding_model()
+
+def setup_qdrant(attempts: int = 5, stop: Optional[threading.Event] = None) -> bool:
+    """
+    waits for Qdrant and creates the hikes collection, returns False instead of failing startup
+    when Qdrant is not reachable, chat then uses the NumPy index (see retrieval.py)
+
+    blocking, the api runs it in a thread (see main.py), setting stop ends the wait early
+    """
+    stop = stop or threading.Event()
     #called as function to wait for docker to setup fastapi
-    for attempt in range(5):
+    for attempt in range(attempts):
         try:
             collections = client.get_collections().collections
             break
         except Exception as e:
-            print("waiting for Qdrant ...")
-            time.sleep(2)
+            error = e
+            if stop.wait(2):
+                return False
     else:
-        raise RuntimeError("Qdrant didnt start")
+        logging.warning(f"Qdrant is not reachable ({error!r}), chat uses the NumPy index")
+        return False
         
     if "hikes" not in [col.name for col in collections]:
-        client.recreate_collection(
-            collection_name="hikes",
-            vectors_config=VectorParams(size=384, distance=Distance.COSINE),
-        )
-
-#----------------------------------[summarize tool]----------------------------------
-MAX_SUMMARY_LENGTH = 100
-MIN_SUMMARY_LENGTH = 30
-
-summarizer = pipeline("summarization", model="t5-small")
-
-def summarize(text):
-    return summarizer(text, max_length=MAX_SUMMARY_LENGTH, min_length=MIN_SUMMARY_LENGTH, do_sample=False)[0]["summary_text"]
-
-#----------------------------------[ Embed data]----------------------------------
-"""
-Embeds provided data with numerical representation vector based off description 
-
-How it works: 
-    It takes in the data saved in collected_data.json, summarizes the copied hike description to be able
-    to use less tokens to process the sumamry, and then upserts it to Qdrant for storage and faster access
-
-"""
-
-def embed_data():
-    with open("collected_data.json","r") as file:
-        data = file.read()
-        hikes = json.loads(data)
-
-        for i, hike in enumerate(hikes):
-            id = i+1
-            
-            trail_name = hike["Trail name"]
-            trail_distance = hike["Length"]
-            trail_time = hike["Estimated time"]
-            trail_description = summarize(hike["Summary"])
-
-            trail_string = f"{trail_name} is a {trail_distance} hike that takes around {trail_time} to complete. {trail_description}"
-            vector = model.encode(trail_string).tolist()
-            client.upsert(
+        try:
+            client.recreate_collection(
                 collection_name="hikes",
-                points=[
-                    PointStruct(
-                        id=id,
-                        vector=vector,
-                        payload={
-                            "hike_name": trail_name,
-                            "distance": trail_distance,
-                            "time_to_complete": trail_time,
-                            "summary": trail_description
-                        }
-                    )
-                ]
+                vectors_config=VectorParams(size=384, distance=Distance.COSINE),
             )
-
-        
\ No newline at end of file
+        except Exception as e:
+            logging.warning(f"could not create the Qdrant hikes collection ({e!r}), chat uses the NumPy index")
+            return False
+    return True
@@ -0,0 +1,131 @@
+"""
+embedding_cache.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Query Embedding Cache ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+caches chat query embeddings so repeated questions skip inference
+
+Queries are normalized (lower case, whitespace collapsed) and looked up in:
+    1. an in-process TTLCache (EMBEDDING_CACHE_SIZE entries, EMBEDDING_CACHE_TTL_SEC)
+    2. optionally a SharedEmbeddingStore, a sqlite file at EMBEDDING_CACHE_PATH that every
+       api worker on the host reads and writes, so a query embedded by one worker is a hit
+       for the others
+and only embedded (by the embedding_batcher) when both miss. Concurrent misses for the same
+query wait on a single embedding, if the request embedding it is cancelled the others take over.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.cache import TTLCache
+from app.config import settings
+from app.LLMdatapipeline.LLMutils import EMBEDDING_MODEL_NAME
+from app.LLMdatapipeline.embedding_service import embedding_batcher
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+#----------------------------------[ Shared store ]----------------------------------
+
+class SharedEmbeddingStore:
+    """
+    sqlite backed embedding store, vectors are stored as float32 bytes with an expiry time
+    WAL mode lets several worker processes read while one writes
+    """
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT vector FROM embeddings WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return array("f", row[0]).tolist()
+
+    def set(self, key: str, vector: List[float]):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, expires_at) VALUES (?, ?, ?)",
+                (key, array("f", vector).tobytes(), time.time() + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._connection.execute("DELETE FROM embeddings WHERE expires_at <= ?", (time.time(),))
+
+#----------------------------------[ Cached embedder ]----------------------------------
+
+class CachedEmbedder:
+    def __init__(self, embed: Callable[[str], Awaitable[List[float]]], cache: TTLCache, store: Optional[SharedEmbeddingStore] = None):
+        self._embed = embed
+        self.cache = cache
+        self.store = store
+        self.store_hits = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def embed(self, text: str) -> List[float]:
+        key = f"{EMBEDDING_MODEL_NAME}:{normalize_query(text)}"
+        vector = self.cache.get(key)
+        if vector is not None:
+            return list(vector)
+
+        if key in self._in_flight:
+            in_flight = self._in_flight[key]
+            try:
+                return list(await asyncio.shield(in_flight))
+            except asyncio.CancelledError:
+                #the caller embedding it was cancelled, embed it ourselves unless we were cancelled too
+                if not in_flight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.embed(text)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            vector = await run_in_threadpool(self.store.get, key) if self.store else None
+            if vector is not None:
+                self.store_hits += 1
+            else:
+                vector = await self._embed(normalize_query(text))
+                if self.store:
+                    await run_in_threadpool(self.store.set, key, vector)
+            vector = tuple(vector)
+            self.cache.set(key, vector)
+            future.set_result(vector)
+        except Exception as e:
+            future.set_exception(e)
+            #retrieved here so the loop does not log it when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            #cancellation is not an Exception, waiters must not be left on an unresolved future
+            if not future.done():
+                future.cancel()
+            del self._in_flight[key]
+        return list(vector)
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "store_enabled": self.store is not None, "store_hits": self.store_hits}
+
+
+query_embedder = CachedEmbedder(
+    embedding_batcher.embed,
+    TTLCache(maxsize=settings.EMBEDDING_CACHE_SIZE, ttl=settings.EMBEDDING_CACHE_TTL_SEC),
+    SharedEmbeddingStore(settings.EMBEDDING_CACHE_PATH, ttl=settings.EMBEDDING_CACHE_TTL_SEC) if settings.EMBEDDING_CACHE_PATH else None
+)
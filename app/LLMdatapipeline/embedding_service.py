@@ -0,0 +1,132 @@
+"""
+embedding_service.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Embedding Service ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+embeds chat queries off the event loop, in batches
+
+A transformer forward pass is CPU bound and holds the GIL, running it in the api process (even in
+the threadpool) slows every other request on that worker. The EmbeddingBatcher sends the work to
+a pool of worker processes instead, each worker loads the SentenceTransformer once (lazily, see
+LLMutils.get_embedding_model) and keeps it for its lifetime.
+
+Queries arriving within EMBEDDING_BATCH_WINDOW_MS of each other are collected and encoded with a
+single encode() call (up to EMBEDDING_MAX_BATCH texts), one batched forward pass is much cheaper
+than the same number of single ones, so under load chat embedding scales with the worker count.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, List, Optional, Set, Tuple
+
+from app.config import settings
+
+def encode_batch(texts: List[str]) -> List[List[float]]:
+    """
+    runs in the worker process, module level so it can be pickled
+    """
+    from app.LLMdatapipeline.LLMutils import get_embedding_model
+    return get_embedding_model().encode(texts, batch_size=len(texts)).tolist()
+
+
+def _default_executor() -> Executor:
+    #spawned so the workers do not inherit the api's sockets and event loop
+    return ProcessPoolExecutor(
+        max_workers=settings.EMBEDDING_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+class EmbeddingBatcher:
+    """
+    await embed(text) returns the embedding of text, concurrent calls are encoded together
+
+    encode and executor_factory can be swapped out (tests, benchmarks), by default texts are
+    encoded with encode_batch in a process pool created on first use
+    """
+    def __init__(
+        self,
+        encode: Callable[[List[str]], List[List[float]]] = encode_batch,
+        executor_factory: Callable[[], Executor] = _default_executor,
+        batch_window_ms: float = settings.EMBEDDING_BATCH_WINDOW_MS,
+        max_batch: int = settings.EMBEDDING_MAX_BATCH,
+    ):
+        self.encode = encode
+        self.executor_factory = executor_factory
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self._executor: Optional[Executor] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        #the loop only keeps weak references to tasks, a running batch must not be collected
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        if self._executor is None:
+            self._executor = self.executor_factory()
+        self.batches += 1
+        self.texts += len(batch)
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.encode, [text for text, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except asyncio.CancelledError:
+            #cancelled by shutdown, the callers are cancelled too instead of waiting forever
+            for _, future in batch:
+                future.cancel()
+            raise
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def warm_up(self) -> asyncio.Task:
+        """
+        starts the workers and loads their model in the background
+        """
+        return asyncio.ensure_future(self.embed("warm up"))
+
+    async def shutdown(self, timeout: float = 5.0):
+        """
+        encodes the texts still waiting for a batch window, waits up to timeout seconds for the
+        running batches and cancels the rest, then stops the workers
+        """
+        self._flush()
+        if self._tasks:
+            _, unfinished = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+embedding_batcher = EmbeddingBatcher()
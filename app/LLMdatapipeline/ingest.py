@@ -0,0 +1,318 @@
+"""
+ingest.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Hike Ingestion Pipeline ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+Indexes the collected hikes into Qdrant, replaces LLMutils.embed_data
+
+How it works:
+    - hikes are streamed from the JSON array one object at a time (iter_json_array), so the whole
+      dataset is never held in memory
+    - every --batch-size hikes are summarized with one t5 pipeline call and embedded with one
+      model.encode call, batched inference is many times faster than one hike at a time
+    - points are sent with Qdrant's batch upsert, --upsert-batch points per request, in a
+      background thread so the next batch is summarized while the previous one is uploaded
+    - progress (hikes done, hikes/s) is printed after every batch
+
+Re-indexing is incremental: every point id is derived from the trail name (uuid5, stable across
+edits and reorderings of the file) and its payload stores a hash of the hike's content. Hikes whose
+hash matches the indexed one are skipped, only new or edited hikes are summarized, embedded and
+upserted, and points of hikes that are no longer in the file are deleted. --full re-indexes all.
+
+After every run the collection is exported to the NumPy index chat falls back to when Qdrant is
+down (see retrieval.py), --index-path sets where, --no-export skips it.
+
+usage (from the repo root):
+    python -m app.LLMdatapipeline.ingest
+    python -m app.LLMdatapipeline.ingest --data path/to/hikes.json --batch-size 64 --qdrant-host localhost
+    python -m app.LLMdatapipeline.ingest --full
+"""
+import argparse
+import hashlib
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from app.LLMdatapipeline.LLMutils import EMBEDDING_MODEL_NAME
+
+DEFAULT_DATA_PATH = Path(__file__).resolve().parent / "collected_data.json"
+COLLECTION_NAME = "hikes"
+READ_CHUNK_CHARS = 64 * 1024
+
+#----------------------------------[ Streaming JSON ]----------------------------------
+
+def iter_json_array(path, chunk_chars: int = READ_CHUNK_CHARS) -> Iterator[dict]:
+    """
+    yields the objects of a top level JSON array one at a time, reading the file in chunks
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as file:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+        while True:
+            #skip whitespace, the opening bracket and separators between objects
+            while position < len(buffer) and buffer[position] in " \t\r\n,[":
+                if buffer[position] == "[":
+                    if started:
+                        raise ValueError(f"{path} is not a JSON array of objects")
+                    started = True
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            if position < len(buffer) and (buffer[position] != "{" or not started):
+                raise ValueError(f"{path} is not a JSON array of objects")
+
+            try:
+                if position == len(buffer):
+                    raise ValueError("need more data")
+                obj, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    if buffer[position:].strip():
+                        raise ValueError(f"{path} ended in the middle of an object")
+                    return
+                chunk = file.read(chunk_chars)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield obj
+            position = end
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+#----------------------------------[ Models ]----------------------------------
+MAX_SUMMARY_LENGTH = 100
+MIN_SUMMARY_LENGTH = 30
+SUMMARY_MODEL_NAME = "t5-small"
+
+@lru_cache(maxsize=1)
+def get_summarizer():
+    """
+    t5 summarization pipeline, only needed while ingesting so it is not part of LLMutils
+    """
+    from transformers import pipeline
+    return pipeline("summarization", model=SUMMARY_MODEL_NAME)
+
+def summarize_batch(texts: List[str]) -> List[str]:
+    summaries = get_summarizer()(
+        texts,
+        max_length=MAX_SUMMARY_LENGTH,
+        min_length=MIN_SUMMARY_LENGTH,
+        do_sample=False,
+        truncation=True,
+        batch_size=len(texts),
+    )
+    return [summary["summary_text"] for summary in summaries]
+
+def embed_batch(texts: List[str]) -> List[List[float]]:
+    from app.LLMdatapipeline.LLMutils import get_embedding_model
+    return get_embedding_model().encode(texts, batch_size=len(texts)).tolist()
+
+#----------------------------------[ Hike identity ]----------------------------------
+
+HIKE_ID_NAMESPACE = uuid.UUID("6c1f8f0e-3b9a-4d52-9a57-2f4d8b1e7c30")
+
+def hike_id(hike: dict) -> str:
+    """
+    stable point id of a hike, derived from its normalized trail name
+    """
+    name = " ".join(hike["Trail name"].lower().split())
+    return str(uuid.uuid5(HIKE_ID_NAMESPACE, name))
+
+def hike_content_hash(hike: dict) -> str:
+    """
+    changes when any field of the hike, or one of the models that index it, changes
+    """
+    content = json.dumps(
+        {"hike": hike, "summary_model": SUMMARY_MODEL_NAME, "embedding_model": EMBEDDING_MODEL_NAME},
+        sort_keys=True
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def indexed_hashes(client, collection_name: str, page_size: int = 1000) -> Dict[str, Optional[str]]:
+    """
+    point id -> content_hash of every point in the collection (None for points without one)
+    """
+    hashes = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=page_size,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False,
+        )
+        for point in points:
+            hashes[str(point.id)] = (point.payload or {}).get("content_hash")
+        if offset is None:
+            return hashes
+
+#----------------------------------[ Pipeline ]----------------------------------
+
+def hike_text(hike: dict, summary: str) -> str:
+    return f"{hike['Trail name']} is a {hike['Length']} hike that takes around {hike['Estimated time']} to complete. {summary}"
+
+def hike_payload(hike: dict, summary: str) -> dict:
+    return {
+        "hike_name": hike["Trail name"],
+        "distance": hike["Length"],
+        "time_to_complete": hike["Estimated time"],
+        "summary": summary,
+        "content_hash": hike_content_hash(hike)
+    }
+
+
+@dataclass
+class IngestStats:
+    indexed: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+
+
+class Progress:
+    def __init__(self, report: Callable[[str], None] = print):
+        self.report = report
+        self.start = time.perf_counter()
+        self.done = 0
+
+    def add(self, count: int):
+        self.done += count
+        elapsed = time.perf_counter() - self.start
+        self.report(f"{self.done} hikes indexed, {elapsed:.1f} s, {self.done / elapsed:.1f} hikes/s")
+
+
+def delete_points(client, collection_name: str, ids: List[str], delete_batch: int):
+    from qdrant_client.models import PointIdsList
+    for start in range(0, len(ids), delete_batch):
+        client.delete(collection_name=collection_name, points_selector=PointIdsList(points=ids[start:start + delete_batch]))
+
+
+def upsert_points(client, collection_name: str, ids: list, vectors: list, payloads: list, upsert_batch: int):
+    from qdrant_client.models import Batch
+    for start in range(0, len(ids), upsert_batch):
+        end = start + upsert_batch
+        client.upsert(
+            collection_name=collection_name,
+            points=Batch(ids=ids[start:end], vectors=vectors[start:end], payloads=payloads[start:end]),
+        )
+
+
+def ingest(
+    hikes: Iterable[dict],
+    client,
+    summarize: Callable[[List[str]], List[str]] = summarize_batch,
+    embed: Callable[[List[str]], List[List[float]]] = embed_batch,
+    batch_size: int = 32,
+    upsert_batch: int = 256,
+    collection_name: str = COLLECTION_NAME,
+    progress: Optional[Progress] = None,
+    full: bool = False,
+) -> IngestStats:
+    """
+    summarizes, embeds and upserts the new or changed hikes in batches, and deletes the points
+    of hikes that are gone, with full every hike is re-indexed
+    """
+    progress = progress or Progress()
+    stats = IngestStats()
+    indexed = indexed_hashes(client, collection_name)
+    seen: Set[str] = set()
+
+    def changed_hikes():
+        for hike in hikes:
+            point_id = hike_id(hike)
+            seen.add(point_id)
+            if not full and indexed.get(point_id) == hike_content_hash(hike):
+                stats.unchanged += 1
+                continue
+            yield point_id, hike
+
+    pending_upload = None
+    with ThreadPoolExecutor(max_workers=1) as uploader:
+        for batch in batched(changed_hikes(), batch_size):
+            ids = [point_id for point_id, _ in batch]
+            batch = [hike for _, hike in batch]
+            summaries = summarize([hike["Summary"] for hike in batch])
+            vectors = embed([hike_text(hike, summary) for hike, summary in zip(batch, summaries)])
+            payloads = [hike_payload(hike, summary) for hike, summary in zip(batch, summaries)]
+            stats.indexed += len(batch)
+
+            #one upload in flight at a time, errors surface here
+            if pending_upload is not None:
+                pending_upload.result()
+            pending_upload = uploader.submit(upsert_points, client, collection_name, ids, vectors, payloads, upsert_batch)
+            pending_upload.add_done_callback(lambda future, count=len(batch): future.exception() is None and progress.add(count))
+
+        if pending_upload is not None:
+            pending_upload.result()
+
+    #only after every hike was read, so a partial run never deletes anything
+    stale = sorted(set(indexed) - seen)
+    if stale:
+        delete_points(client, collection_name, stale, upsert_batch)
+    stats.deleted = len(stale)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="index hikes into Qdrant")
+    parser.add_argument("--data", default=str(DEFAULT_DATA_PATH), help="JSON array of hikes")
+    parser.add_argument("--batch-size", type=int, default=32, help="hikes summarized and embedded per model call")
+    parser.add_argument("--upsert-batch", type=int, default=256, help="points per Qdrant upsert request")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--qdrant-host", default="qdrant")
+    parser.add_argument("--qdrant-port", type=int, default=6333)
+    parser.add_argument("--full", action="store_true", help="re-index every hike, not only new or changed ones")
+    parser.add_argument("--index-path", default=None, help="NumPy index to export to (default: VECTOR_INDEX_PATH)")
+    parser.add_argument("--no-export", action="store_true", help="do not export the NumPy index")
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, VectorParams
+    client = QdrantClient(host=args.qdrant_host, port=args.qdrant_port)
+    if not client.collection_exists(args.collection):
+        client.create_collection(
+            collection_name=args.collection,
+            vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+        )
+
+    start = time.perf_counter()
+    stats = ingest(
+        iter_json_array(args.data),
+        client,
+        batch_size=args.batch_size,
+        upsert_batch=args.upsert_batch,
+        collection_name=args.collection,
+        full=args.full,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"indexed {stats.indexed} hikes into {args.collection} in {elapsed:.1f} s "
+        f"({stats.indexed / elapsed if elapsed else 0:.1f} hikes/s), "
+        f"{stats.unchanged} unchanged, {stats.deleted} deleted"
+    )
+
+    if not args.no_export:
+        from app.config import settings
+        from app.LLMdatapipeline.retrieval import DEFAULT_INDEX_PATH, export_index
+        index_path = args.index_path or settings.VECTOR_INDEX_PATH or DEFAULT_INDEX_PATH
+        exported = export_index(client, index_path, args.collection)
+        print(f"exported {exported} points to the NumPy index at {index_path}")
+
+
+if __name__ == "__main__":
+    main()
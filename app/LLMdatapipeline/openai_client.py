@@ -0,0 +1,63 @@
+"""
+openai_client.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ OpenAI client ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+One AsyncOpenAI client per process, shared by every chat request
+
+The client keeps a pool of HTTP connections (OPENAI_MAX_CONNECTIONS, kept alive between requests)
+so TLS handshakes are not repeated per completion, and completions are awaited instead of blocking
+the event loop, a slow completion only delays its own request.
+
+Timeouts and retries come from settings, the SDK retries connection errors, 429 and 5xx responses
+with exponential backoff (up to OPENAI_MAX_RETRIES times).
+"""
+from typing import AsyncIterator
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.config import settings
+
+OPENAI_TIMEOUT = httpx.Timeout(settings.OPENAI_TIMEOUT_SEC, connect=settings.OPENAI_CONNECT_TIMEOUT_SEC)
+
+OPENAI_LIMITS = httpx.Limits(
+    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+    keepalive_expiry=60,
+)
+
+openai_client = AsyncOpenAI(
+    api_key=settings.CHAT_KEY,
+    base_url=settings.OPENAI_BASE_URL,
+    timeout=OPENAI_TIMEOUT,
+    max_retries=settings.OPENAI_MAX_RETRIES,
+    http_client=httpx.AsyncClient(timeout=OPENAI_TIMEOUT, limits=OPENAI_LIMITS),
+)
+
+
+async def complete(prompt: str) -> str:
+    """
+    answer of the chat model to a single user message
+    """
+    response = await openai_client.chat.completions.create(
+        model=settings.CHAT_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+    )
+    return response.choices[0].message.content
+
+
+async def stream_completion(prompt: str) -> AsyncIterator[str]:
+    """
+    same as complete, but yields the answer in chunks as the model generates them
+    """
+    stream = await openai_client.chat.completions.create(
+        model=settings.CHAT_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
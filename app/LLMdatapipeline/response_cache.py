@@ -0,0 +1,104 @@
+"""
+response_cache.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Semantic Response Cache ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+reuses Roamly Rabbit answers for questions that mean the same thing
+
+Every answer is stored with the query embedding and the ids of the hikes that were retrieved for it.
+A new query gets a cached answer when
+    - the same hikes were retrieved for it (same context in the prompt), and
+    - its embedding is within CHAT_CACHE_SIMILARITY cosine similarity of the cached query
+so "easy hikes near victoria" and "what are some easy hikes close to Victoria?" share one paid
+completion, while a question that pulls in different hikes never gets a stale answer.
+
+Entries expire after CHAT_CACHE_TTL_SEC and the least recently used is evicted past CHAT_CACHE_SIZE,
+both handled by the shared TTLCache (app/cache.py) the answers are stored in, this class only adds
+the similarity matching. Only entries with the same hike ids are compared, so a lookup costs a
+handful of dot products.
+"""
+import threading
+import time
+from itertools import count
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.cache import TTLCache
+from app.config import settings
+
+def _unit(vector: Iterable[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class _AnswerEntries(TTLCache):
+    """
+    (unit query vector, hits key, answer) by entry id, indexed by hits key
+    """
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float]):
+        super().__init__(maxsize=maxsize, ttl=ttl, clock=clock)
+        self.by_hits: Dict[tuple, Set[int]] = {}
+
+    def set(self, key: Hashable, value: Tuple[np.ndarray, tuple, str], ttl: Optional[float] = None):
+        with self._lock:
+            self.by_hits.setdefault(value[1], set()).add(key)
+        super().set(key, value, ttl)
+
+    def _removed(self, key: Hashable, value: Tuple[np.ndarray, tuple, str]):
+        group = self.by_hits[value[1]]
+        group.discard(key)
+        if not group:
+            del self.by_hits[value[1]]
+
+
+class SemanticResponseCache:
+    def __init__(self, maxsize: int, ttl: float, threshold: float, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.entries = _AnswerEntries(maxsize=maxsize, ttl=ttl, clock=clock)
+        self._ids = count()
+        #the entries lock is not reentrant, this one keeps a lookup's scan and its get together
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hits_key(hit_ids: Iterable) -> tuple:
+        return tuple(sorted(str(hit_id) for hit_id in hit_ids))
+
+    def lookup(self, vector: List[float], hit_ids: Iterable) -> Optional[str]:
+        """
+        cached answer for a query with this embedding that retrieved these hikes, or None
+        """
+        hits_key = self.hits_key(hit_ids)
+        query = _unit(vector)
+        with self._lock:
+            best_id, best_similarity = None, self.threshold
+            for entry_id in list(self.entries.by_hits.get(hits_key, ())):
+                entry = self.entries.peek(entry_id)
+                if entry is None:
+                    continue
+                similarity = float(np.dot(entry[0], query))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.entries.record_miss()
+                return None
+            return self.entries.get(best_id)[2]
+
+    def store(self, vector: List[float], hit_ids: Iterable, answer: str):
+        with self._lock:
+            self.entries.set(next(self._ids), (_unit(vector), self.hits_key(hit_ids), answer))
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        return self.entries.stats()
+
+response_cache = SemanticResponseCache(
+    maxsize=settings.CHAT_CACHE_SIZE,
+    ttl=settings.CHAT_CACHE_TTL_SEC,
+    threshold=settings.CHAT_CACHE_SIMILARITY
+)
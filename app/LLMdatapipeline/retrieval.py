@@ -0,0 +1,226 @@
+"""
+retrieval.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Hike Retrieval Backends ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+finds the hikes most similar to a chat query, behind one interface so /chat does not care where
+the vectors live
+
+Backends (RETRIEVAL_BACKEND):
+    - qdrant: the "hikes" collection on the Qdrant server, one network round trip per query
+    - numpy:  an in-process index, a float32 matrix of unit vectors memory-mapped from
+              VECTOR_INDEX_PATH.npy (payloads and ids in VECTOR_INDEX_PATH.json), a query is one
+              matrix-vector product plus an argpartition for the top k, no network hop
+    - auto:   Qdrant, falling back to the NumPy index while Qdrant is unreachable (default)
+
+The hike corpus is tiny, so the NumPy index is a few hundred KB and every api worker shares the
+same pages through the mmap. It is written by the ingestion pipeline after every run (see ingest.py),
+or exported from an existing collection with export_index. The file is re-opened when it changes,
+so a new export is picked up without a restart.
+
+benchmarks/retrieval_bench.py compares the backends at several corpus sizes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Protocol, Sequence
+
+import numpy as np
+
+from app.config import settings
+from app.LLMdatapipeline.LLMutils import client
+
+COLLECTION_NAME = "hikes"
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parent / "hikes_index"
+
+
+@dataclass
+class Hit:
+    id: str
+    score: float
+    payload: dict = field(default_factory=dict)
+
+
+class RetrievalBackend(Protocol):
+    name: str
+
+    def search(self, vector: Sequence[float], limit: int) -> List[Hit]:
+        ...
+
+#----------------------------------[ Qdrant ]----------------------------------
+
+class QdrantBackend:
+    name = "qdrant"
+
+    def __init__(self, client, collection_name: str = COLLECTION_NAME):
+        self.client = client
+        self.collection_name = collection_name
+
+    def search(self, vector: Sequence[float], limit: int) -> List[Hit]:
+        results = self.client.search(
+            collection_name=self.collection_name,
+            query_vector=list(vector),
+            limit=limit,
+            with_payload=True
+        )
+        return [Hit(str(point.id), point.score, point.payload or {}) for point in results]
+
+#----------------------------------[ NumPy ]----------------------------------
+
+def _unit_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError("vectors must be a 2D array")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class NumpyIndex:
+    name = "numpy"
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        path = Path(path)
+        self.matrix_path = path.with_name(path.name + ".npy")
+        self.meta_path = path.with_name(path.name + ".json")
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._payloads: List[dict] = []
+
+    @staticmethod
+    def write(path, ids: Sequence, vectors, payloads: Sequence[dict]):
+        """
+        writes an index, the files are replaced atomically so running workers never read half of one
+        """
+        if not (len(ids) == len(payloads) == len(vectors)):
+            raise ValueError("ids, vectors and payloads must have the same length")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        matrix = _unit_rows(vectors) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        matrix_path = path.with_name(path.name + ".npy")
+        meta_path = path.with_name(path.name + ".json")
+
+        #metadata first, a reader only reloads once the matrix file changes
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump({"ids": [str(point_id) for point_id in ids], "payloads": list(payloads)}, file)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        with open(f"{matrix_path}.tmp", "wb") as file:
+            np.save(file, matrix)
+        os.replace(f"{matrix_path}.tmp", matrix_path)
+
+    def _load(self):
+        mtime = os.stat(self.matrix_path).st_mtime_ns
+        if mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+            with open(self.meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            if len(meta["ids"]) != matrix.shape[0]:
+                raise RuntimeError(f"{self.meta_path} does not match {self.matrix_path}")
+            self._matrix, self._ids, self._payloads = matrix, meta["ids"], meta["payloads"]
+            self._loaded_mtime = mtime
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._ids)
+
+    def search(self, vector: Sequence[float], limit: int) -> List[Hit]:
+        self._load()
+        matrix, ids, payloads = self._matrix, self._ids, self._payloads
+        if not ids or limit <= 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        #rows are unit vectors, so the dot product is the cosine similarity
+        scores = matrix @ query
+        if limit < len(scores):
+            top = np.argpartition(scores, -limit)[-limit:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [Hit(ids[i], float(scores[i]), payloads[i]) for i in top]
+
+
+def export_index(client, path, collection_name: str = COLLECTION_NAME, page_size: int = 1000) -> int:
+    """
+    writes every point of a Qdrant collection to a NumPy index, returns the number of points
+    """
+    ids, vectors, payloads = [], [], []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=page_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for point in points:
+            ids.append(str(point.id))
+            vectors.append(point.vector)
+            payloads.append(point.payload or {})
+        if offset is None:
+            break
+    NumpyIndex.write(path, ids, vectors, payloads)
+    return len(ids)
+
+#----------------------------------[ Fallback ]----------------------------------
+
+class FallbackBackend:
+    """
+    searches primary, and fallback while primary fails; after a failure primary is skipped for
+    retry_after seconds so queries do not each wait for a connection timeout
+    """
+    def __init__(self, primary, fallback, retry_after: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.primary = primary
+        self.fallback = fallback
+        self.retry_after = retry_after
+        self.clock = clock
+        self._primary_down_until = 0.0
+        self.fallbacks = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.primary.name}+{self.fallback.name}"
+
+    def search(self, vector: Sequence[float], limit: int) -> List[Hit]:
+        if self.clock() >= self._primary_down_until:
+            try:
+                return self.primary.search(vector, limit)
+            except Exception as primary_error:
+                logging.warning(f"{self.primary.name} search failed ({primary_error!r}), using {self.fallback.name}")
+                self._primary_down_until = self.clock() + self.retry_after
+                error = primary_error
+        else:
+            error = None
+        self.fallbacks += 1
+        try:
+            return self.fallback.search(vector, limit)
+        except Exception as fallback_error:
+            raise fallback_error from error
+
+
+def build_retriever(backend: str, index_path=None) -> RetrievalBackend:
+    index_path = index_path or DEFAULT_INDEX_PATH
+    if backend == "qdrant":
+        return QdrantBackend(client)
+    if backend == "numpy":
+        return NumpyIndex(index_path)
+    if backend == "auto":
+        return FallbackBackend(QdrantBackend(client), NumpyIndex(index_path))
+    raise ValueError(f"unknown retrieval backend {backend!r}, use qdrant, numpy or auto")
+
+
+retriever = build_retriever(settings.RETRIEVAL_BACKEND, settings.VECTOR_INDEX_PATH)
@@ -7,19 +7,63 @@ collects functions for dealing with aws
 
 """
 
+import asyncio
 import logging
+import threading
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import os
+from typing import BinaryIO, List, Tuple
+from fastapi.concurrency import run_in_threadpool
 from urllib.parse import urlparse
-import boto3
-from botocore.exceptions import ClientError
 
 from app.config import settings
 
 
 AWS_REGION = settings.AWS_REGION
 
+#----------------------------------[ Shared S3 client ]----------------------------------
+"""
+One S3 client is created per process and reused by every call below, boto3 clients are thread safe,
+so credential resolution, endpoint setup and TLS handshakes happen once instead of on every request.
+
+max_pool_connections is sized for the threadpool uploads (S3_MAX_CONCURRENT_UPLOADS * transfer
+threads) so concurrent requests do not queue on urllib3 connections.
+
+S3_TRANSFER_CONFIG controls how upload_file / upload_fileobj split large files into multipart uploads.
+"""
+S3_CLIENT_CONFIG = Config(
+    region_name=AWS_REGION,
+    max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+    retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": "standard"},
+)
+
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=settings.S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+    multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE_MB * 1024 * 1024,
+    max_concurrency=settings.S3_TRANSFER_MAX_CONCURRENCY,
+    use_threads=True,
+)
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+def get_s3_client():
+    """
+    returns the process wide S3 client, creating it on first use
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.session.Session(
+                    aws_access_key_id=settings.AWS_ACCESS_KEY,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=AWS_REGION,
+                ).client("s3", config=S3_CLIENT_CONFIG)
+    return _s3_client
 
 #----------------------------------[ S3 ]----------------------------------
 
@@ -37,9 +81,9 @@ def upload_file(file_name, bucket, object_name=None):
         object_name = os.path.basename(file_name)
 
     # Upload the file
-    s3_client = boto3.client('s3', region_name=AWS_REGION)
+    s3_client = get_s3_client()
     try:
-        response = s3_client.upload_file(file_name, bucket, object_name)
+        response = s3_client.upload_file(file_name, bucket, object_name, Config=S3_TRANSFER_CONFIG)
     except ClientError as e:
         logging.error(e)
         return False
@@ -53,14 +97,133 @@ def delete_file_from_s3(file_url: str):
     key = parsed.path.lstrip('/')
     print(f"Deleting from bucket: {settings.S3_BUCKET_NAME}, key: {key}")
 
-    s3 = boto3.client(
-        "s3",
-        region_name=settings.AWS_REGION,
-        aws_access_key_id=settings.AWS_ACCESS_KEY,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    )
+    s3 = get_s3_client()
     try:
         s3.delete_object(Bucket=settings.S3_BUCKET_NAME, Key=key)
     except ClientError as e:
         raise Exception(f"S3 deletion failed: {e}")
 
+S3_DELETE_BATCH_SIZE = 1000 #most keys S3 accepts in one DeleteObjects request
+
+def delete_files_from_s3(file_urls: List[str]) -> List[str]:
+    """Bulk delete files from S3 using their full URLs
+
+    keys are grouped by bucket and sent in DeleteObjects requests of up to S3_DELETE_BATCH_SIZE,
+    so deleting N objects takes N/1000 round trips instead of N
+
+    :param file_urls: urls as stored in Images.url
+    :return: urls that could not be deleted (errors are logged, not raised)
+    """
+    keys_by_bucket = {}
+    url_by_key = {}
+    for file_url in file_urls:
+        parsed = urlparse(file_url)
+        bucket = parsed.netloc.split('.')[0]
+        key = parsed.path.lstrip('/')
+        keys_by_bucket.setdefault(bucket, []).append(key)
+        url_by_key[(bucket, key)] = file_url
+
+    s3 = get_s3_client()
+    failed = []
+    for bucket, keys in keys_by_bucket.items():
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[start:start + S3_DELETE_BATCH_SIZE]
+            try:
+                response = s3.delete_objects(
+                    Bucket=bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+                )
+            except ClientError as e:
+                logging.error(f"S3 batch deletion failed for {len(batch)} objects in {bucket}: {e}")
+                failed += [url_by_key[(bucket, key)] for key in batch]
+                continue
+            for error in response.get("Errors", []):
+                logging.error(f"S3 could not delete {error.get('Key')} from {bucket}: {error.get('Message')}")
+                failed.append(url_by_key.get((bucket, error.get("Key")), error.get("Key")))
+    return failed
+
+def s3_url(object_name: str, bucket: str = settings.S3_BUCKET_NAME) -> str:
+    """
+    public url of an object in the bucket, this is what is stored in Images.url
+    """
+    return f"https://{bucket}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
+
+def generate_presigned_upload(object_name: str, content_type: str, max_bytes: int, expires_in: int, bucket: str = settings.S3_BUCKET_NAME) -> dict:
+    """Create a presigned POST so a client can upload an object straight to S3
+
+    :param object_name: key the object must be uploaded to
+    :param content_type: MIME type the upload must declare
+    :param max_bytes: largest upload S3 will accept
+    :param expires_in: seconds the presigned POST stays valid
+    :return: dict with the "url" to POST to and the form "fields" to send with the file
+    """
+    s3_client = get_s3_client()
+    return s3_client.generate_presigned_post(
+        Bucket=bucket,
+        Key=object_name,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, max_bytes],
+        ],
+        ExpiresIn=expires_in,
+    )
+
+def get_object_metadata(object_name: str, bucket: str = settings.S3_BUCKET_NAME):
+    """
+    HEAD an object, returns its metadata or None if the object does not exist
+    """
+    s3_client = get_s3_client()
+    try:
+        return s3_client.head_object(Bucket=bucket, Key=object_name)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+def get_object_bytes(object_name: str, bucket: str = settings.S3_BUCKET_NAME) -> bytes:
+    """
+    downloads a whole object into memory, only used for images (at most MAX_IMAGE_BYTES)
+    """
+    s3_client = get_s3_client()
+    return s3_client.get_object(Bucket=bucket, Key=object_name)["Body"].read()
+
+def upload_fileobj(fileobj: BinaryIO, object_name: str, content_type: str, bucket: str = settings.S3_BUCKET_NAME):
+    """Stream a file-like object to S3 without writing it to a temporary file first
+
+    boto3 reads the object in chunks (multipart for large files), errors are raised to the caller
+    """
+    s3_client = get_s3_client()
+    fileobj.seek(0)
+    s3_client.upload_fileobj(fileobj, bucket, object_name, ExtraArgs={"ContentType": content_type}, Config=S3_TRANSFER_CONFIG)
+
+async def upload_fileobjs(uploads: List[Tuple[BinaryIO, str, str]], bucket: str = settings.S3_BUCKET_NAME, max_concurrency: int = settings.S3_MAX_CONCURRENT_UPLOADS) -> List[str]:
+    """Upload several (fileobj, object_name, content_type) to S3 concurrently
+
+    Each blocking boto3 upload runs in the threadpool so the event loop stays free, at most
+    max_concurrency at a time, so a post with many images takes about as long as its slowest image.
+
+    If any upload fails every other upload is allowed to finish, the objects that did make it
+    are deleted again and the first error is raised, so a failed post leaves nothing behind in S3.
+
+    :return: object names that were uploaded, in the same order as uploads
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    uploaded = []
+
+    async def upload_one(fileobj, object_name, content_type):
+        async with semaphore:
+            await run_in_threadpool(upload_fileobj, fileobj, object_name, content_type, bucket)
+            uploaded.append(object_name)
+
+    results = await asyncio.gather(
+        *[upload_one(fileobj, object_name, content_type) for fileobj, object_name, content_type in uploads],
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        if uploaded:
+            await run_in_threadpool(delete_files_from_s3, [s3_url(object_name, bucket) for object_name in uploaded])
+        raise errors[0]
+
+    return [object_name for _, object_name, _ in uploads]
@@ -0,0 +1,116 @@
+"""
+cache.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ In-process Caches ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+TTLCache: bounded LRU with a time to live per entry and hit/miss counters
+
+get() moves an entry to the most recently used end, set() evicts the least recently used entry
+once maxsize is reached, entries older than their ttl count as misses and are dropped when read.
+It is guarded by a lock so it can be shared between the event loop and the threadpool.
+
+Caches that do not look entries up by key (the semantic response cache) search them with peek(),
+which does not count a lookup, and record the outcome with get() or record_miss(). Subclasses
+that index the entries override _removed() to hear about entries leaving the cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                self._expire(key, value)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        value of key without counting a lookup or making it recently used, expired entries are dropped
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                self._expire(key, value)
+                return default
+            return value
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _expire(self, key: Hashable, value: Any):
+        del self._entries[key]
+        self.expirations += 1
+        self._removed(key, value)
+
+    def _removed(self, key: Hashable, value: Any):
+        """
+        called with the lock held when an entry expires, is evicted, popped or cleared
+        """
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        ttl overrides the caches ttl for this entry (seconds from now)
+        """
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted_key, (evicted, _) = self._entries.popitem(last=False)
+                self.evictions += 1
+                self._removed(evicted_key, evicted)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+            if entry is not _MISSING:
+                self._removed(key, entry[0])
+
+    def clear(self):
+        with self._lock:
+            for key, (value, _) in self._entries.items():
+                self._removed(key, value)
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
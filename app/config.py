@@ -7,6 +7,8 @@ Uses Pydantic to search for enviroment variables needed created on the
 system and import to form database connections
 
 """
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -17,17 +19,76 @@ class Settings(BaseSettings):
     DATABASE_USERNAME: str
     DATABASE_NAME: str
 
+    #Database connection pool tuning (applies to both the sync and async engine)
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: int = 30
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = True
+
     #Security ENV variables (JWT/Encoding)
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MIN: int
+    #JWT implementation (jose or hmac) and verified token cache size (app/oauth2.py)
+    JWT_BACKEND: str = "jose"
+    JWT_CACHE_SIZE: int = 10000
 
     AWS_REGION: str
     S3_BUCKET_NAME: str
     AWS_ACCESS_KEY: str
     AWS_SECRET_ACCESS_KEY: str
+    S3_MAX_CONCURRENT_UPLOADS: int = 4
+    S3_MAX_POOL_CONNECTIONS: int = 50
+    S3_MAX_ATTEMPTS: int = 3
+    S3_MULTIPART_THRESHOLD_MB: int = 8
+    S3_MULTIPART_CHUNKSIZE_MB: int = 8
+    S3_TRANSFER_MAX_CONCURRENCY: int = 4
+
+    #authenticated users cached by get_current_user (app/oauth2.py)
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SEC: float = 60
+
+    #bcrypt hashing / verification (app/passwords.py), runs in its own thread pool
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    #Background job worker (app/jobs.py)
+    JOB_WORKER_ENABLED: bool = True
+    JOB_POLL_INTERVAL_SEC: float = 5.0
+    JOB_BATCH_SIZE: int = 10
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SEC: float = 2.0
+
+    #Worker processes for thumbnail / WebP generation (app/image_processing.py)
+    IMAGE_PROCESS_WORKERS: int = 2
 
     CHAT_KEY: str
+    #OpenAI client (app/LLMdatapipeline/openai_client.py), base url can point at a local fake for benchmarks
+    CHAT_MODEL: str = "gpt-3.5-turbo"
+    OPENAI_BASE_URL: Optional[str] = None
+    OPENAI_TIMEOUT_SEC: float = 30.0
+    OPENAI_CONNECT_TIMEOUT_SEC: float = 5.0
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_MAX_CONNECTIONS: int = 20
+    #load the embedding model (in the embedding workers) during startup instead of on the first /chat request
+    EMBEDDING_MODEL_PRELOAD: bool = False
+    #chat query embedding (app/LLMdatapipeline/embedding_service.py)
+    EMBEDDING_WORKERS: int = 1
+    EMBEDDING_BATCH_WINDOW_MS: float = 10.0
+    EMBEDDING_MAX_BATCH: int = 32
+    #query embedding cache (app/LLMdatapipeline/embedding_cache.py), set the path to share it between workers
+    EMBEDDING_CACHE_SIZE: int = 2048
+    EMBEDDING_CACHE_TTL_SEC: float = 86400
+    EMBEDDING_CACHE_PATH: Optional[str] = None
+    #hike retrieval for chat (app/LLMdatapipeline/retrieval.py): qdrant, numpy or auto (qdrant, numpy while it is down)
+    RETRIEVAL_BACKEND: str = "auto"
+    VECTOR_INDEX_PATH: Optional[str] = None
+    #semantic cache of chat answers (app/LLMdatapipeline/response_cache.py)
+    CHAT_CACHE_SIZE: int = 1000
+    CHAT_CACHE_TTL_SEC: float = 3600
+    CHAT_CACHE_SIMILARITY: float = 0.92
     
     class Config:
         env_file = ".env"
@@ -2,18 +2,40 @@
 Database.py
 
 =+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ DataBase Layer ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
-handles Database connections 
+handles Database connections
+
+Two engines are built from the same settings:
+    - engine / SessionLocal: synchronous psycopg2 engine, kept for alembic and scripts
+    - async_engine / AsyncSessionLocal: asyncpg engine used by the api routers so
+      database round trips do not block the event loop
+
+Both engines share the pool settings from app.config (size, overflow, timeout,
+recycle, pre-ping) and pool_stats() reports how busy the async pool is.
 """
 
+import time
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 
 from app.config import settings
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}/{settings.DATABASE_NAME}"
+SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
+SQLALCHEMY_ASYNC_DATABASE_URL = f"postgresql+asyncpg://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+#pre-ping tests each connection on checkout so stale connections left over from an RDS
+#failover are replaced instead of failing the request, recycle retires them periodically
+POOL_SETTINGS = {
+    "pool_size": settings.DATABASE_POOL_SIZE,
+    "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+    "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+    "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+    "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_SETTINGS)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -21,9 +43,62 @@ SessionLocal = sessionmaker(
     bind= engine
 )
 
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, **POOL_SETTINGS)
+
+#expire_on_commit is off so ORM objects can still be read (and serialized by
+#pydantic) after a commit without triggering a lazy load outside of an await
+AsyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    bind= async_engine
+)
+
 Base = declarative_base()
 #create base class that all ORM classes will inherit from
 
+#----------------------------------[ Pool Metrics ]----------------------------------
+"""
+Tracks how long requests wait to check a connection out of the async pool
+
+pool_wait_stats is updated by get_async_db every time a request acquires its connection,
+pool_stats() combines it with the live pool counters so it can be scraped to size workers
+"""
+pool_wait_stats = {
+    "checkouts": 0,
+    "total_wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+}
+
+def record_pool_wait(wait_seconds: float):
+    pool_wait_stats["checkouts"] += 1
+    pool_wait_stats["total_wait_seconds"] += wait_seconds
+    pool_wait_stats["max_wait_seconds"] = max(pool_wait_stats["max_wait_seconds"], wait_seconds)
+
+async def acquire_connection(db: AsyncSession):
+    """
+    checks the sessions connection out of the pool and records how long it took
+    """
+    start = time.perf_counter()
+    await db.connection()
+    record_pool_wait(time.perf_counter() - start)
+
+def pool_stats() -> dict:
+    pool = async_engine.pool
+    checkouts = pool_wait_stats["checkouts"]
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "checkouts": checkouts,
+        "average_wait_ms": (pool_wait_stats["total_wait_seconds"] / checkouts * 1000) if checkouts else 0.0,
+        "max_wait_ms": pool_wait_stats["max_wait_seconds"] * 1000,
+    }
+
+#----------------------------------[ Session Dependencies ]----------------------------------
 
 #function to ensure database connection on each route
 def get_gb():
@@ -31,4 +106,11 @@ def get_gb():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+#async version of get_gb, used by every router
+#the connection is checked out up front so the time spent waiting on the pool can be measured
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        await acquire_connection(db)
+        yield db
@@ -0,0 +1,93 @@
+"""
+image_processing.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Image Derivatives ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+builds the smaller versions of an uploaded image that clients download instead of the original
+
+    - thumbnail: THUMBNAIL_SIZE square crop, used by the feed cards
+    - webp: the full image scaled down to fit WEBP_MAX_SIZE, used by the carousel
+
+Both are WebP, a feed card fetches a few tens of KB instead of a multi MB camera original.
+
+Decoding and re-encoding is CPU bound and holds the GIL, so make_derivatives runs in a
+process pool (get_process_pool) instead of the threadpool, the api process only waits on it.
+The job that uploads the results and stores their urls on the Images row is in app/jobs.py.
+"""
+
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+
+THUMBNAIL_SIZE = (320, 320)
+WEBP_MAX_SIZE = (1600, 1600)
+WEBP_QUALITY = 80
+THUMBNAIL_QUALITY = 70
+
+def derivative_object_names(object_name: str) -> Tuple[str, str]:
+    """
+    (thumbnail, webp) keys for the derivatives of an original, stored next to it
+    """
+    return f"{object_name}_thumb.webp", f"{object_name}_full.webp"
+
+
+def _encode_webp(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def make_derivatives(data: bytes) -> Dict[str, bytes]:
+    """
+    input: bytes of the original JPEG/PNG/WebP image
+    return: {"thumbnail": webp bytes, "webp": webp bytes}
+    raises PIL.UnidentifiedImageError if data is not an image
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        #phones store rotation in EXIF, apply it before the metadata is dropped by re-encoding
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        thumbnail = ImageOps.fit(image, THUMBNAIL_SIZE, method=Image.Resampling.LANCZOS)
+
+        scaled = image.copy()
+        scaled.thumbnail(WEBP_MAX_SIZE, Image.Resampling.LANCZOS)
+
+        return {
+            "thumbnail": _encode_webp(thumbnail, THUMBNAIL_QUALITY),
+            "webp": _encode_webp(scaled, WEBP_QUALITY),
+        }
+
+#----------------------------------[ Process pool ]----------------------------------
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    returns the process wide pool, created on first use
+    workers are spawned rather than forked so they never inherit the api's open connections
+    """
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
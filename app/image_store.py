@@ -0,0 +1,188 @@
+"""
+image_store.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Content Addressed Image Storage ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+stores uploaded images once per distinct content
+
+Every upload is hashed (sha256, streamed in chunks from the spooled UploadFile) and looked up in
+image_blobs. An image that is already stored is not uploaded again, the new Images row points at
+the existing object and its ref_count is incremented, only new content is sent to S3 under
+images/{sha256}/{filename}.
+
+When Images rows are deleted release_images() decrements the counts, a blob that is no longer
+referenced is removed and its object and derivatives are returned so the caller can queue the
+S3 delete, objects that are still referenced are left alone.
+
+The blob rows are locked (FOR UPDATE) while an upload references them, so a concurrent delete can
+not drop a blob between the lookup and the increment. Rows that do not exist yet can not be locked:
+two requests uploading the same new content at once both upload it, possibly under different
+filenames. The upsert returns the object_name that ended up in image_blobs, the loser points its
+rows at that object, deletes the object it uploaded for nothing and does not queue derivatives.
+"""
+
+import asyncio
+import hashlib
+import os
+from collections import Counter
+from typing import BinaryIO, Dict, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update, delete, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.aws import upload_fileobjs, delete_files_from_s3, s3_url
+from app.image_processing import derivative_object_names
+from app.jobs import enqueue_image_derivatives
+from app.models import Images, ImageBlobs
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+def hash_fileobj(fileobj: BinaryIO) -> str:
+    """
+    sha256 of a file-like object, read in chunks, the file is rewound afterwards
+    """
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def content_object_name(sha256: str, filename: str) -> str:
+    return f"images/{sha256}/{os.path.basename(filename)}"
+
+
+def blob_object_urls(object_name: str) -> List[str]:
+    """
+    urls of the original and derivative objects of a blob
+    """
+    return [s3_url(name) for name in (object_name, *derivative_object_names(object_name))]
+
+#----------------------------------[ Store ]----------------------------------
+
+async def store_images(db: AsyncSession, files: List[Tuple[BinaryIO, str, str]]) -> List[Tuple[str, str, bool]]:
+    """
+    uploads the (fileobj, filename, content_type) whose content is not stored yet and adds one
+    reference per file to its blob, in the callers transaction
+
+    raises the S3 error if an upload fails, objects uploaded by this call are removed again
+    (see upload_fileobjs) and the caller is expected to roll back
+
+    Return: (sha256, object_name, uploaded) for every file, in order, uploaded is True
+            for the first file of content that was not stored before, object_name is the one
+            in image_blobs, which may come from a concurrent request that stored it first
+    """
+    hashes = await asyncio.gather(*[run_in_threadpool(hash_fileobj, fileobj) for fileobj, _, _ in files])
+
+    #sorted so concurrent requests lock the blobs in the same order
+    existing = await db.execute(
+        select(ImageBlobs)
+        .where(ImageBlobs.sha256.in_(set(hashes)))
+        .order_by(ImageBlobs.sha256)
+        .with_for_update()
+    )
+    object_names: Dict[str, str] = {blob.sha256: blob.object_name for blob in existing.scalars()}
+
+    uploads = []
+    uploaded = []
+    for sha256, (fileobj, filename, content_type) in zip(hashes, files):
+        uploaded.append(sha256 not in object_names)
+        if sha256 not in object_names:
+            object_names[sha256] = content_object_name(sha256, filename)
+            uploads.append((fileobj, object_names[sha256], content_type))
+    if uploads:
+        await upload_fileobjs(uploads)
+
+    uploaded_names = {object_name for _, object_name, _ in uploads}
+    redundant = []
+    for sha256, references in sorted(Counter(hashes).items()):
+        statement = insert(ImageBlobs).values(sha256=sha256, object_name=object_names[sha256], ref_count=references)
+        result = await db.execute(statement.on_conflict_do_update(
+            index_elements=[ImageBlobs.sha256],
+            set_={"ref_count": ImageBlobs.ref_count + references}
+        ).returning(ImageBlobs.object_name, literal_column("(xmax = 0)").label("inserted")))
+        blob = result.first()
+        if object_names[sha256] in uploaded_names and not blob.inserted:
+            #a concurrent request stored this content first, its object and derivative job are kept
+            if blob.object_name != object_names[sha256]:
+                redundant.append(s3_url(object_names[sha256]))
+            uploaded = [new and content_hash != sha256 for content_hash, new in zip(hashes, uploaded)]
+        object_names[sha256] = blob.object_name
+    if redundant:
+        await run_in_threadpool(delete_files_from_s3, redundant)
+
+    return [(sha256, object_names[sha256], new) for sha256, new in zip(hashes, uploaded)]
+
+
+async def add_images(db: AsyncSession, adventure_id: int, owner_id: int, files: List[Tuple[BinaryIO, str, str]], captions: List[str]) -> List[Images]:
+    """
+    stores the files and adds an Images row for each, flushed so they have ids
+
+    A derivative job is queued for content that was just uploaded, rows for content that is
+    already stored copy the derivative urls of an existing row, or get them from the job that
+    is still pending for that content
+    """
+    stored = await store_images(db, files)
+
+    derivatives = {}
+    hashes = {sha256 for sha256, _, _ in stored}
+    known = await db.execute(
+        select(Images.content_hash, Images.thumbnail_url, Images.webp_url)
+        .where(Images.content_hash.in_(hashes), Images.thumbnail_url.isnot(None))
+    )
+    for content_hash, thumbnail_url, webp_url in known:
+        derivatives[content_hash] = {"thumbnail_url": thumbnail_url, "webp_url": webp_url}
+
+    new_images = []
+    for (sha256, object_name, _), caption in zip(stored, captions):
+        new_image = Images(
+            url=s3_url(object_name),
+            caption=caption,
+            adventure_id=adventure_id,
+            owner_id=owner_id,
+            content_hash=sha256,
+            **derivatives.get(sha256, {})
+        )
+        db.add(new_image)
+        new_images.append(new_image)
+    await db.flush()
+
+    for new_image, (_, object_name, uploaded) in zip(new_images, stored):
+        if uploaded:
+            enqueue_image_derivatives(db, new_image, object_name)
+    return new_images
+
+#----------------------------------[ Release ]----------------------------------
+
+async def release_images(db: AsyncSession, *criteria) -> List[str]:
+    """
+    drops the references of the Images rows matching criteria, call before deleting the rows
+
+    Return: urls of the S3 objects that are no longer referenced and should be deleted
+    """
+    images = (await db.execute(select(Images).where(*criteria))).scalars().all()
+
+    urls = []
+    references = Counter()
+    for image in images:
+        if image.content_hash:
+            references[image.content_hash] += 1
+        else:
+            urls += image.object_urls()
+
+    for sha256, count in sorted(references.items()):
+        result = await db.execute(
+            update(ImageBlobs)
+            .where(ImageBlobs.sha256 == sha256)
+            .values(ref_count=ImageBlobs.ref_count - count)
+            .returning(ImageBlobs.ref_count, ImageBlobs.object_name)
+            .execution_options(synchronize_session= False)
+        )
+        blob = result.first()
+        if blob and blob.ref_count <= 0:
+            await db.execute(delete(ImageBlobs).where(ImageBlobs.sha256 == sha256))
+            urls += blob_object_urls(blob.object_name)
+    return urls
@@ -0,0 +1,217 @@
+"""
+jobs.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Background Jobs ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+runs side effects (S3 deletes, image post-processing) off the request path
+
+The jobs table is an outbox: a router calls enqueue_job() in the same transaction as the change
+that caused the side effect, so the job is only visible once that change commits and is never
+lost if the process dies before it runs.
+
+JobWorker runs inside the api process (started from the lifespan in main.py), it claims due jobs
+with FOR UPDATE SKIP LOCKED so several api workers can poll the same table without running a job
+twice, runs the handler in the threadpool and marks the job done. A failing job is retried with
+exponential backoff until max_attempts, after that it is left as failed with its last error.
+
+Handlers are registered with @job_handler("kind") and must be idempotent, a job can run again if
+the process dies between the handler finishing and the commit. A plain function is called with the
+payload in the threadpool, an async function is called with (db, payload) inside a savepoint so the
+rows it changes are rolled back if it fails.
+"""
+
+import asyncio
+import io
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.aws import delete_files_from_s3, get_object_bytes, upload_fileobjs, s3_url
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.image_processing import make_derivatives, get_process_pool, derivative_object_names
+from app.models import Jobs, Images
+
+JOB_PENDING = "pending"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+#----------------------------------[ Handlers ]----------------------------------
+
+JOB_HANDLERS: Dict[str, Callable] = {}
+
+def job_handler(kind: str):
+    """
+    registers the decorated function as the handler for jobs of this kind,
+    it is called with the jobs payload
+    """
+    def register(func: Callable):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+@job_handler("delete_s3_objects")
+def delete_s3_objects(payload: dict):
+    """
+    payload: {"urls": [...]} as stored in Images.url
+    deleting an object that is already gone succeeds, so retrying the whole batch is safe
+    """
+    failed = delete_files_from_s3(payload["urls"])
+    if failed:
+        raise RuntimeError(f"could not delete {len(failed)} of {len(payload['urls'])} objects from S3")
+
+
+@job_handler("image_derivatives")
+async def image_derivatives(db: AsyncSession, payload: dict):
+    """
+    payload: {"image_id": int, "object_name": key of the original, "content_hash": optional sha256}
+    builds the thumbnail and WebP version in the process pool, uploads them next to the
+    original and stores their urls on the Images row, and every other row sharing the object
+    """
+    image_id, object_name = payload["image_id"], payload["object_name"]
+    content_hash = payload.get("content_hash")
+    #rows sharing the same content get the derivatives too, even if this image was deleted since
+    images = or_(Images.image_id == image_id, Images.content_hash == content_hash) if content_hash else Images.image_id == image_id
+    if not (await db.execute(select(Images.image_id).where(images).limit(1))).scalars().first():
+        return #image was deleted before the job ran
+
+    original = await run_in_threadpool(get_object_bytes, object_name)
+    loop = asyncio.get_running_loop()
+    derivatives = await loop.run_in_executor(get_process_pool(), make_derivatives, original)
+
+    thumbnail_name, webp_name = derivative_object_names(object_name)
+    await upload_fileobjs([
+        (io.BytesIO(derivatives["thumbnail"]), thumbnail_name, "image/webp"),
+        (io.BytesIO(derivatives["webp"]), webp_name, "image/webp"),
+    ])
+
+    result = await db.execute(
+        update(Images)
+        .where(images)
+        .values(thumbnail_url=s3_url(thumbnail_name), webp_url=s3_url(webp_name))
+        .execution_options(synchronize_session= False)
+    )
+    if result.rowcount == 0:
+        #deleted while the derivatives were built, nothing will reference them
+        await run_in_threadpool(delete_files_from_s3, [s3_url(thumbnail_name), s3_url(webp_name)])
+
+#----------------------------------[ Queue ]----------------------------------
+
+def enqueue_job(db: AsyncSession, kind: str, payload: dict, max_attempts: int = settings.JOB_MAX_ATTEMPTS) -> Jobs:
+    """
+    adds a job to the callers transaction, it becomes visible to the worker when the caller commits
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"no job handler registered for {kind}")
+    job = Jobs(kind=kind, payload=payload, max_attempts=max_attempts)
+    db.add(job)
+    return job
+
+
+def enqueue_image_derivatives(db: AsyncSession, image: Images, object_name: str) -> Jobs:
+    """
+    queues thumbnail / WebP generation for an image, image must already be flushed (needs its id)
+    """
+    return enqueue_job(db, "image_derivatives", {"image_id": image.image_id, "object_name": object_name, "content_hash": image.content_hash})
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.JOB_RETRY_BASE_SEC * 2 ** (attempts - 1))
+
+
+async def process_jobs(db: AsyncSession, limit: int = settings.JOB_BATCH_SIZE) -> int:
+    """
+    claims up to limit due jobs, runs them and records the outcome
+
+    Return: number of jobs that were run (succeeded or failed)
+    """
+    result = await db.execute(
+        select(Jobs)
+        .where(Jobs.status == JOB_PENDING, Jobs.run_at <= func.now())
+        .order_by(Jobs.run_at, Jobs.job_id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    jobs = result.scalars().all()
+
+    for job in jobs:
+        job.attempts += 1
+        handler = JOB_HANDLERS.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"no job handler registered for {job.kind}")
+            if asyncio.iscoroutinefunction(handler):
+                async with db.begin_nested():
+                    await handler(db, job.payload)
+            else:
+                await run_in_threadpool(handler, job.payload)
+        except Exception as e:
+            job.last_error = str(e)
+            if job.attempts >= job.max_attempts:
+                job.status = JOB_FAILED
+                logging.error(f"job {job.job_id} ({job.kind}) failed after {job.attempts} attempts: {e}")
+            else:
+                job.run_at = datetime.now(timezone.utc) + retry_delay(job.attempts)
+                logging.warning(f"job {job.job_id} ({job.kind}) failed, retrying: {e}")
+        else:
+            job.status = JOB_DONE
+            job.last_error = None
+
+    #the row locks are held until here, so no other worker picks these jobs up mid run
+    await db.commit()
+    return len(jobs)
+
+#----------------------------------[ Worker ]----------------------------------
+
+class JobWorker:
+    """
+    polls the jobs table every JOB_POLL_INTERVAL_SEC, notify() wakes it up early
+    so a job enqueued by a request usually runs right after the response is sent
+    """
+    def __init__(self, poll_interval: float = settings.JOB_POLL_INTERVAL_SEC, batch_size: int = settings.JOB_BATCH_SIZE):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        self._wake.set()
+
+    async def run_once(self) -> int:
+        async with AsyncSessionLocal() as db:
+            return await process_jobs(db, self.batch_size)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                #keep draining while full batches come back
+                while await self.run_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                logging.error(f"job worker poll failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+job_worker = JobWorker()
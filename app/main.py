@@ -6,12 +6,22 @@ handles middleware, directing,
 anything you would excpect the main file to do
 """
 
+import asyncio
+import threading
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.LLMdatapipeline.LLMutils import setup_qdrant
-from app.routers import adventure, user, comments, images, chat
+from app.LLMdatapipeline.embedding_service import embedding_batcher
+from app.LLMdatapipeline.openai_client import openai_client
+from app.jobs import job_worker
+from app.image_processing import shutdown_process_pool
+from app.passwords import password_hasher
+from app.config import settings
+from app.routers import adventure, user, comments, images, chat, metrics, likes
 
 origins = [
     "http://localhost:8080",
@@ -27,8 +37,25 @@ origins = [
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    setup_qdrant()
+    qdrant_setup = None
+    qdrant_stop = threading.Event()
+    if settings.RETRIEVAL_BACKEND != "numpy":
+        #in the background, chat answers from the NumPy index while Qdrant is starting or down
+        qdrant_setup = asyncio.ensure_future(run_in_threadpool(setup_qdrant, stop=qdrant_stop))
+    if settings.EMBEDDING_MODEL_PRELOAD:
+        #loads in the embedding workers, the api starts serving CRUD requests right away
+        embedding_batcher.warm_up()
+    if settings.JOB_WORKER_ENABLED:
+        job_worker.start()
     yield
+    qdrant_stop.set()
+    if qdrant_setup is not None:
+        await qdrant_setup
+    await job_worker.stop()
+    shutdown_process_pool()
+    password_hasher.shutdown()
+    await embedding_batcher.shutdown()
+    await openai_client.close()
     
 app = FastAPI(lifespan=lifespan)
 
@@ -38,8 +65,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+#before adventure.router, otherwise GET /adventure/likes would be matched by GET /adventure/{id}
+app.include_router(
+	likes.router, 
+	prefix="/adventure",
+	tags= ['Likes']
+	)
+
 app.include_router(
 	adventure.router, 
 	prefix="/adventure",
@@ -68,4 +103,10 @@ app.include_router(
 	chat.router, 
 	prefix="/chat",
 	tags= ['Roamly-Rabbit']
-	)
\ No newline at end of file
+	)
+
+app.include_router(
+	metrics.router, 
+	prefix="/metrics",
+	tags= ['Metrics']
+	)
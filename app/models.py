@@ -9,6 +9,7 @@ handles SQLalchemy Database Model Schema creation (Database strucuture)
 from app.database import Base
 from sqlalchemy import text, Column, Integer, String, Text, TIMESTAMP, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import JSONB
 
 #----------------------------------[ Users ]----------------------------------
 """
@@ -49,12 +50,17 @@ Data model for adventure table in Database
        owner_id: int, 
        created_at: time, 
        Description: string, write about adventure
+       like_count: int, number of Likes rows of the adventure, kept in step by the like / unlike
+                   endpoints (see routers/likes.py) so the feed never counts likes
+       comment_count: int, number of Comments rows of the adventure, kept in step by the comment
+                      endpoints (see routers/comments.py)
 
     Relationship to Users:
         Matches a user to the adventure based on the foreinKey Created
 
     Notes:
         Unique Constraint set to make the combination of title and owner_id unique
+        Composite (created_at DESC, adventure_id) index backs keyset pagination of the feed
 """
 
 class Adventures(Base):
@@ -64,6 +70,8 @@ class Adventures(Base):
     owner_id = Column(Integer, ForeignKey("users.user_id", ondelete= "CASCADE"), nullable= False)
     created_at = Column(TIMESTAMP(timezone= True), nullable= False, server_default= text("now()"))
     description = Column(Text)
+    like_count = Column(Integer, nullable= False, server_default= text("0"))
+    comment_count = Column(Integer, nullable= False, server_default= text("0"))
 
     owner = relationship("Users")
 
@@ -74,7 +82,8 @@ class Adventures(Base):
         "title",
         postgresql_using="gin",
         postgresql_ops={"title": "gin_trgm_ops"},
-        )
+        ),
+        Index("adventures_created_at_id_idx", created_at.desc(), adventure_id)
         )
 
 #----------------------------------[ Likes ]----------------------------------
@@ -101,16 +110,52 @@ Data model for images table in Database, This will contain urls to AWS S3 for st
     url, url to AWS S3
     adventure_id, int, foreign key to adventure id
     caption, str
+    thumbnail_url, url of the square WebP thumbnail, null until the derivative job ran
+    webp_url, url of the scaled down WebP version, null until the derivative job ran
+    content_hash, sha256 of the image bytes, key into image_blobs (null for images
+                  registered through a presigned upload, those own their object)
+
+    Notes:
+        url is not unique, identical uploads share one S3 object (see ImageBlobs)
 
 """
 
 class Images(Base):
     __tablename__ = "images"
     image_id = Column(Integer, nullable=False, primary_key = True)
-    url = Column(String, nullable = False, unique=True)
+    url = Column(String, nullable = False)
     adventure_id = Column(Integer, ForeignKey("adventures.adventure_id", ondelete="CASCADE"), nullable = False)
     caption = Column(String)
     owner_id = Column(Integer, nullable= False)
+    thumbnail_url = Column(String)
+    webp_url = Column(String)
+    content_hash = Column(String(64), index=True)
+
+    def object_urls(self):
+        """
+        urls of every S3 object belonging to this image (original and derivatives)
+        """
+        return [url for url in (self.url, self.thumbnail_url, self.webp_url) if url]
+
+#----------------------------------[ Image Blobs ]----------------------------------
+"""
+Data model for image_blobs table in Database, one row per distinct image stored in S3
+    Collums:
+    sha256, string, primary key, hash of the image bytes
+    object_name, string, unique, S3 key of the object
+    ref_count, int, number of Images rows that point at the object
+    created_at, time
+
+    Notes:
+        the object (and its derivatives) is deleted from S3 when ref_count drops to 0,
+        see app/image_store.py
+"""
+class ImageBlobs(Base):
+    __tablename__ = "image_blobs"
+    sha256 = Column(String(64), primary_key=True, nullable=False)
+    object_name = Column(String, nullable=False, unique=True)
+    ref_count = Column(Integer, nullable=False, server_default=text("1"))
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
 
 #----------------------------------[ Comments ]----------------------------------
 """
@@ -121,6 +166,10 @@ Data model for comments table in Database
     created_at, time
     adventure_id, int, foreign key to adventures.adventure_id
     comment, string, main comment
+
+    Notes:
+        Composite (adventure_id, created_at, comment_id) index backs the cursor pagination of an
+        adventures comments (see queries.py)
 """
 class Comments(Base):
     __tablename__ = "comments"
@@ -129,4 +178,42 @@ class Comments(Base):
     adventure_id = Column(Integer, ForeignKey("adventures.adventure_id", ondelete="CASCADE"), nullable = False)
     created_at = Column(TIMESTAMP(timezone=True),nullable = False, server_default=text("now()"))
     comment = Column(String, nullable = False)
-    owner = relationship("Users")
\ No newline at end of file
+    owner = relationship("Users")
+
+    __table_args__ = (
+        Index("comments_adventure_id_created_at_idx", adventure_id, created_at, comment_id),
+    )
+
+#----------------------------------[ Jobs ]----------------------------------
+"""
+Data model for the jobs table (outbox) in Database, side effects that run after the request (see app/jobs.py)
+    Collums:
+    job_id, int, primary key
+    kind, string, name of the registered handler that runs the job
+    payload, json, arguments passed to the handler
+    status, string, pending -> done, or failed once max_attempts is reached
+    attempts, int, how many times the job has been tried
+    max_attempts, int
+    run_at, time, job is not picked up before this (used for retry backoff)
+    last_error, string, error of the last failed attempt
+    created_at, time
+
+    Notes:
+        jobs are written in the same transaction as the change that caused them,
+        so a committed change always has its side effect queued
+"""
+class Jobs(Base):
+    __tablename__ = "jobs"
+    job_id = Column(Integer, primary_key=True, nullable=False)
+    kind = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    status = Column(String, nullable=False, server_default=text("'pending'"))
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    max_attempts = Column(Integer, nullable=False, server_default=text("5"))
+    run_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+    last_error = Column(Text)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+
+    __table_args__ = (
+        Index("jobs_status_run_at_idx", "status", "run_at"),
+    )
@@ -7,26 +7,131 @@ handles authentication using JWT's (JSON Web Tokens)
 
 """
 
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import base64
+import hashlib
+import hmac
+import json
+import time
+from jose import JWTError, ExpiredSignatureError, jwt
 from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Protocol
 from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
+from app.cache import TTLCache
 from app.config import settings
-from app.database import get_gb
+from app.database import get_async_db
 from app.models import Users
 from app.utils import is_email
-from app.models import Users
+from app.passwords import password_hasher, pwd_context
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MIN = settings.ACCESS_TOKEN_EXPIRE_MIN
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+#----------------------------------[ JWT backends ]----------------------------------
+"""
+Encoding and decoding of the tokens, picked with JWT_BACKEND:
+    - jose: python-jose (default), any algorithm it supports
+    - hmac: the HS256/HS384/HS512 JWS format implemented with the standard library hmac module,
+            several times faster to decode (see benchmarks/jwt_bench.py), tokens are interchangeable
+            with jose's
+Both raise jose's JWTError (ExpiredSignatureError once exp has passed) for invalid tokens.
+"""
+class JWTBackend(Protocol):
+    name: str
+
+    def encode(self, claims: dict) -> str:
+        ...
+
+    def decode(self, token: str) -> dict:
+        ...
+
+
+class JoseBackend:
+    name = "jose"
+
+    def __init__(self, secret_key: str, algorithm: str):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+
+    def encode(self, claims: dict) -> str:
+        return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+
+    def decode(self, token: str) -> dict:
+        return jwt.decode(token, self.secret_key, algorithms=self.algorithm)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class HmacBackend:
+    name = "hmac"
+    DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+    def __init__(self, secret_key: str, algorithm: str):
+        if algorithm not in self.DIGESTS:
+            raise ValueError(f"the hmac JWT backend only supports {', '.join(self.DIGESTS)}, not {algorithm}")
+        self.secret_key = secret_key.encode()
+        self.algorithm = algorithm
+        self.digest = self.DIGESTS[algorithm]
+        self.header = _b64encode(json.dumps({"alg": algorithm, "typ": "JWT"}, separators=(",", ":")).encode())
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        return hmac.new(self.secret_key, signing_input, self.digest).digest()
+
+    def encode(self, claims: dict) -> str:
+        claims = {key: int(value.timestamp()) if isinstance(value, datetime) else value for key, value in claims.items()}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        signing_input = f"{self.header}.{payload}"
+        return f"{signing_input}.{_b64encode(self._sign(signing_input.encode()))}"
+
+    def decode(self, token: str) -> dict:
+        try:
+            signing_input, signature = token.rsplit(".", 1)
+            header, payload = signing_input.split(".")
+            if json.loads(_b64decode(header)).get("alg") != self.algorithm:
+                raise JWTError("The specified alg value is not allowed")
+            if not hmac.compare_digest(_b64decode(signature), self._sign(signing_input.encode())):
+                raise JWTError("Signature verification failed.")
+            claims = json.loads(_b64decode(payload))
+        except JWTError:
+            raise
+        except (ValueError, TypeError, AttributeError) as error:
+            raise JWTError("Error decoding token") from error
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload")
+
+        now = time.time()
+        if "exp" in claims:
+            if not isinstance(claims["exp"], (int, float)):
+                raise JWTError("Expiration Time claim (exp) must be an integer.")
+            if claims["exp"] < now:
+                raise ExpiredSignatureError("Signature has expired.")
+        if "nbf" in claims:
+            if not isinstance(claims["nbf"], (int, float)):
+                raise JWTError("Not Before claim (nbf) must be an integer.")
+            if claims["nbf"] > now:
+                raise JWTError("The token is not yet valid (nbf)")
+        return claims
+
+
+def build_jwt_backend(name: str, secret_key: str, algorithm: str) -> JWTBackend:
+    if name == "jose":
+        return JoseBackend(secret_key, algorithm)
+    if name == "hmac":
+        return HmacBackend(secret_key, algorithm)
+    raise ValueError(f"unknown JWT backend {name!r}, use jose or hmac")
+
+jwt_backend = build_jwt_backend(settings.JWT_BACKEND, SECRET_KEY, ALGORITHM)
 
 
 #----------------------------------[ Create JWT Token ]----------------------------------
@@ -51,7 +156,7 @@ def create_access_token(data: dict, testing_state:bool = False):
         expire = datetime.now(timezone.utc) - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MIN)
 
     to_encode.update({"exp": expire, "user_id": str(data["user_id"])})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt_backend.encode(to_encode)
 
     return encoded_jwt
 
@@ -64,18 +169,39 @@ input:
     -Standard created credentials exception, does not specify
 
 process:
-    - decodes token
+    - decodes token, or takes its claims from the token cache
     - wrap in TokenData pydantic class for schema validation
 
 Returns:
     User data (id)
+
+Token cache: clients send the same bearer token on every request, so the claims of a verified
+token are cached under the sha256 digest of the token until the token's exp, then the entry expires
+and the token is decoded (and rejected as expired) again. Tokens without exp, or already expired,
+are never cached. Tampered tokens have a different digest and always go through the backend.
 """
 class TokenData(BaseModel):
     id: Optional[int]
 
+token_cache = TTLCache(maxsize=settings.JWT_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MIN * 60)
+
+def decode_token(token: str) -> dict:
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(digest)
+    if claims is not None:
+        return claims
+
+    claims = jwt_backend.decode(token)
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = exp - time.time()
+        if ttl > 0:
+            token_cache.set(digest, claims, ttl=ttl)
+    return claims
+
 def verify_token(token: str, credentials_exception):
     try:
-        payload_data: dict = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
+        payload_data: dict = decode_token(token)
         id: str = payload_data.get("user_id")
 
         if id is None:
@@ -88,6 +214,31 @@ def verify_token(token: str, credentials_exception):
     
     return user_data
 
+#----------------------------------[ Principal cache ]----------------------------------
+"""
+get_current_user runs on every protected request, the user it loads is cached by user_id for
+PRINCIPAL_CACHE_TTL_SEC so hot paths skip that query
+
+The cache holds the users column values, every request gets its own detached Users built from them
+(it can be attached to the request's session, e.g. as a comment owner). Routes that change or
+delete a user call invalidate_principal after committing. A lookup that started before an
+invalidation does not store its (possibly stale) result. Every api worker has its own cache, the
+ttl bounds how long another worker can serve a changed user.
+"""
+principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL_SEC)
+_invalidations = 0
+
+def invalidate_principal(user_id: int):
+    global _invalidations
+    _invalidations += 1
+    principal_cache.pop(user_id)
+
+def detached_principal(values: dict) -> Users:
+    user = Users(**values)
+    #persistent identity without a session, adding it to one does not insert it again
+    make_transient_to_detached(user)
+    return user
+
 #----------------------------------[ JWT Middleware processing ]----------------------------------
 """
 oauth2_scheme: tells fastapi to expect a bearer token in authorization header for routes that are protected
@@ -102,13 +253,13 @@ authentication dependency used in protected routes
     process:
         - extracts token
         - verifies token with verify_token()
-        - fetches the user accessing the path
+        - fetches the user accessing the path from the principal cache, or the database on a miss
 
-    returns: authenticated User from database
+    returns: authenticated User
 """
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_gb)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
 
     credentials_exception = HTTPException(
         status_code= status.HTTP_401_UNAUTHORIZED,
@@ -117,14 +268,39 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     )
 
     token_data = verify_token(token, credentials_exception)
-    queried_user = db.query(Users).filter(Users.user_id == token_data.id).first()
-
+    cached_values = principal_cache.get(token_data.id)
+    if cached_values is not None:
+        return detached_principal(cached_values)
+
+    invalidations = _invalidations
+    result = await db.execute(select(Users).where(Users.user_id == token_data.id))
+    queried_user = result.scalars().first()
+    if queried_user is None:
+        return None
+
+    if invalidations == _invalidations:
+        values = {column.key: getattr(queried_user, column.key) for column in Users.__table__.columns}
+        principal_cache.set(token_data.id, values)
     return queried_user
 
+"""
+get_optional_current_user:
+dependency for public routes that personalize their response (e.g. liked_by_me in the feed)
+    returns None when no bearer token was sent, otherwise the same as get_current_user
+    (an invalid or expired token is still HTTP 401)
+"""
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+async def get_optional_current_user(token: Optional[str] = Depends(optional_oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    if token is None:
+        return None
+    return await get_current_user(token, db)
+
 #----------------------------------[ Authenticate User ]----------------------------------
 def verify_password(attempted_password: str, password: str)-> bool:
     """
-    helper function to check if a password is the same as another password that is hashed
+    helper function to check if a password is the same as another password that is hashed,
+    blocks for the whole bcrypt verify, async code uses password_hasher instead
     """
     return pwd_context.verify(attempted_password, password)
 
@@ -136,25 +312,46 @@ Inputs: identifcation, password: recieved from fast api's OAuth2PasswordRequestF
 
 Process: uses the is_email function to check if the identification is of an email type
     if it is then it parses the database with that if not then uses username
+    the password is verified in the password hashing pool (see passwords.py), if the stored hash
+    uses an outdated bcrypt cost it is replaced with one hashed at the current cost
 
 return:
     - HTTP 404 if user_information could not be found
+    - HTTP 503 if too many passwords are being verified at once
     - db_query: users information if found
 """
-def authenticate_user(identification: str, password: str, db : Session):
+async def authenticate_user(identification: str, password: str, db : AsyncSession):
     if is_email(identification):
         user_email = identification
-        db_query = db.query(Users).filter(Users.email == user_email).first()
+        result = await db.execute(select(Users).where(Users.email == user_email))
     
     else:
         users_username = identification
-        db_query = db.query(Users).filter(Users.username == users_username).first()
+        result = await db.execute(select(Users).where(Users.username == users_username))
 
-    if not db_query or not verify_password(password, db_query.password):
+    db_query = result.scalars().first()
+
+    if db_query:
+        verified, new_hash = await password_hasher.verify_and_update(password, db_query.password)
+    else:
+        verified, new_hash = False, None
+
+    if not verified:
         raise HTTPException(
             status_code= status.HTTP_404_NOT_FOUND,
             detail= f"Password or Identification entered was wrong or does not exist"
         )
 
+    if new_hash:
+        await db.execute(
+            update(Users)
+            .where(Users.user_id == db_query.user_id)
+            .values(password=new_hash)
+            .execution_options(synchronize_session = False)
+        )
+        await db.commit()
+        db_query.password = new_hash
+        invalidate_principal(db_query.user_id)
+
     return db_query
 
@@ -0,0 +1,138 @@
+"""
+passwords.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Password Hashing Service ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+bcrypt hashing and verification off the event loop
+
+A bcrypt hash or verify costs 100-300 ms of CPU. Called inside an async handler it froze the worker,
+so a burst of logins stalled every other request. Here they run in a dedicated thread pool
+(bcrypt releases the GIL while hashing) of PASSWORD_HASH_WORKERS threads, capping how many cores
+logins can take.
+
+Back-pressure: at most PASSWORD_HASH_MAX_PENDING hashes may be running or queued, past that
+requests get HTTP 503 with Retry-After right away instead of piling up behind a long queue.
+
+Rehash on login: the cost is set with BCRYPT_ROUNDS, when it changes a successful login returns
+the password hashed with the new cost (verify_and_update) so stored hashes migrate as users log in.
+
+GET /metrics/password-hashing exposes the queue depth, wait and hash times.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import settings
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, max_workers: int, max_pending: int):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.hash_ms_total = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+            return self._executor
+
+    def _timed(self, submitted: float, function, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self.running += 1
+        try:
+            return function(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                wait_ms = (started - submitted) * 1000
+                self.wait_ms_total += wait_ms
+                self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+                self.hash_ms_total += (finished - started) * 1000
+
+    async def _run(self, function, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code= status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many logins at once, try again shortly",
+                    headers={"Retry-After": "1"}
+                )
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            executor = self._get_executor()
+            future = executor.submit(self._timed, time.perf_counter(), function, *args)
+        except Exception:
+            self._release()
+            raise
+        #runs when the hash finished, and when a queued hash is cancelled (the caller went away)
+        #before it started, so the slot is always given back
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        (matches, new hash or None), the new hash is set when hashed uses outdated cost parameters
+        """
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": self.wait_ms_total / self.completed if self.completed else 0.0,
+                "max_wait_ms": self.wait_ms_max,
+                "avg_hash_ms": self.hash_ms_total / self.completed if self.completed else 0.0,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,184 @@
+"""
+queries.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Query Layer ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+shared read queries used by the routers
+
+Every query that returns objects serialized into a response with nested relationships
+(AdventureReturn.owner) eager loads them here, so a page of N adventures costs one
+statement instead of N+1 lazy loads of each owner. like_count is a column of adventures and
+liked_by_me is filled in for the whole page with one more statement (add_liked_by_me).
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, func, desc, and_, or_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Adventures, Likes, Comments
+
+#----------------------------------[ Adventures ]----------------------------------
+
+def select_adventures():
+    """
+    base select for adventures, owner is joined in the same statement (many-to-one)
+    """
+    return select(Adventures).options(joinedload(Adventures.owner))
+
+
+async def get_adventure_page(db: AsyncSession, limit: int, skip: int, search: Optional[str] = None, similarity_amount: float = 0.2) -> List[Adventures]:
+    """
+    page of adventures for the feed, newest first, or ranked by title similarity if search is given
+    """
+    if search:
+        statement = (
+            select_adventures()
+            .where(func.similarity(Adventures.title, search) > similarity_amount)
+            .order_by(func.similarity(Adventures.title, search).desc())
+        )
+    else:
+        statement = select_adventures().order_by(*FEED_ORDER)
+
+    result = await db.execute(statement.offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+#----------------------------------[ Feed Cursors ]----------------------------------
+"""
+Keyset (cursor) pagination for the adventure feed
+
+The feed is ordered by (created_at DESC, adventure_id ASC), the adventure id breaks ties between
+posts created in the same transaction. A cursor is the opaque, url safe encoding of the last
+(created_at, adventure_id) a client has seen, the next page starts strictly after it using the
+adventures_created_at_id_idx index, so every page costs the same no matter how deep the client
+has scrolled and posts arriving between pages cannot shift the results.
+"""
+FEED_ORDER = (desc(Adventures.created_at), Adventures.adventure_id)
+
+def _encode_cursor(created_at: datetime, id_name: str, row_id: int) -> str:
+    payload = json.dumps({"created_at": created_at.isoformat(), id_name: row_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor: str, id_name: str) -> Tuple[datetime, int]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(payload["created_at"]), int(payload[id_name])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def encode_adventure_cursor(adventure: Adventures) -> str:
+    return _encode_cursor(adventure.created_at, "adventure_id", adventure.adventure_id)
+
+
+def decode_adventure_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    raises ValueError if the cursor was not produced by encode_adventure_cursor
+    """
+    return _decode_cursor(cursor, "adventure_id")
+
+
+async def get_adventure_page_after(db: AsyncSession, limit: int, cursor: str) -> List[Adventures]:
+    """
+    page of the feed that comes after the adventure encoded in cursor
+    """
+    created_at, adventure_id = decode_adventure_cursor(cursor)
+    statement = (
+        select_adventures()
+        .where(and_(
+            #redundant bound lets postgres start the index scan at the cursor
+            Adventures.created_at <= created_at,
+            or_(
+                Adventures.created_at < created_at,
+                Adventures.adventure_id > adventure_id
+            )
+        ))
+        .order_by(*FEED_ORDER)
+        .limit(limit)
+    )
+    result = await db.execute(statement)
+    return result.scalars().all()
+
+
+async def get_adventure_by_id(db: AsyncSession, adventure_id: int) -> Optional[Adventures]:
+    result = await db.execute(select_adventures().where(Adventures.adventure_id == adventure_id))
+    return result.scalars().first()
+
+
+async def get_adventures_by_owner(db: AsyncSession, owner_id: int) -> List[Adventures]:
+    result = await db.execute(select_adventures().where(Adventures.owner_id == owner_id))
+    return result.scalars().all()
+
+
+#----------------------------------[ Comments ]----------------------------------
+"""
+Cursor pagination of the comments of an adventure, oldest first
+
+Ordered by (created_at, comment_id), the comment id breaks ties between comments created in the
+same transaction. The cursor encodes the last (created_at, comment_id) a client has seen, the next
+page is a range scan of comments_adventure_id_created_at_idx starting right after it. Owners are
+joined in the same statement.
+"""
+COMMENT_ORDER = (Comments.created_at, Comments.comment_id)
+
+def encode_comment_cursor(comment: Comments) -> str:
+    return _encode_cursor(comment.created_at, "comment_id", comment.comment_id)
+
+
+def decode_comment_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    raises ValueError if the cursor was not produced by encode_comment_cursor
+    """
+    return _decode_cursor(cursor, "comment_id")
+
+
+async def get_comment_page(db: AsyncSession, adventure_id: int, limit: int, cursor: Optional[str] = None) -> List[Comments]:
+    """
+    page of an adventures comments, the first one or the one after the comment encoded in cursor
+    """
+    statement = (
+        select(Comments)
+        .options(joinedload(Comments.owner))
+        .where(Comments.adventure_id == adventure_id)
+    )
+    if cursor:
+        created_at, comment_id = decode_comment_cursor(cursor)
+        statement = statement.where(and_(
+            #redundant bound lets postgres start the index scan at the cursor
+            Comments.created_at >= created_at,
+            or_(
+                Comments.created_at > created_at,
+                Comments.comment_id > comment_id
+            )
+        ))
+    result = await db.execute(statement.order_by(*COMMENT_ORDER).limit(limit))
+    return result.scalars().all()
+
+#----------------------------------[ Likes ]----------------------------------
+
+async def get_liked_ids(db: AsyncSession, user_id: int, adventure_ids: List[int]) -> set:
+    """
+    the ids among adventure_ids that the user liked, in one statement (likes primary key lookup)
+    """
+    if not adventure_ids:
+        return set()
+    result = await db.execute(
+        select(Likes.adventure_id)
+        .where(Likes.owner_id == user_id, Likes.adventure_id.in_(adventure_ids))
+    )
+    return set(result.scalars().all())
+
+
+async def add_liked_by_me(db: AsyncSession, adventures: List[Adventures], user_id: Optional[int]) -> List[Adventures]:
+    """
+    sets liked_by_me (read by AdventureReturn) on every adventure of a page, false for anonymous users
+    """
+    liked = await get_liked_ids(db, user_id, [adventure.adventure_id for adventure in adventures]) if user_id else set()
+    for adventure in adventures:
+        adventure.liked_by_me = adventure.adventure_id in liked
+    return adventures
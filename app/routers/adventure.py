@@ -6,21 +6,19 @@ handles Adventure CRUD operations for the api
 
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from typing import List, Optional
-from sqlalchemy.orm import Session, joinedload
-from app.database import get_gb
-from sqlalchemy import func, desc
-import tempfile
-import os
-import boto3
-from botocore.exceptions import ClientError
-from urllib.parse import urlparse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from sqlalchemy import select, update, delete
+from botocore.exceptions import ClientError, BotoCoreError
 
 from app.schemas import AdventureReturn, AdventureUpdate
 from app.models import Adventures, Images, Users
-from app.oauth2 import get_current_user
-from app.aws import upload_file
+from app.oauth2 import get_current_user, get_optional_current_user
+from app.queries import get_adventure_page, get_adventure_page_after, get_adventure_by_id, encode_adventure_cursor, add_liked_by_me
+from app.image_store import add_images, release_images
+from app.jobs import enqueue_job, job_worker
 from app.config import settings
 
 
@@ -36,39 +34,52 @@ Input:
     limit: limit the amount of objects returned
     skip: skips a certain amount of adventures
     search: searches for a keyword in titles of Adventures
+    cursor: opaque cursor from the X-Next-Cursor header of the previous page,
+            continues the feed after it (keyset pagination, skip is ignored)
+    optional bearer token, fills in liked_by_me for that user
     Example: http://localhost:8000/adventure/?limit=2&search=hiking
     
 Return: Returns list of AdventureReturn pydantic schemas 
+        X-Next-Cursor header is set when the page is full and not a search,
+        pass it back as cursor to get the next page
 
 """
 @router.get("/",response_model = List[AdventureReturn])
-async def get_adventure(db: Session = Depends(get_gb), limit:int=5, skip:int = 0, search:Optional[str]=None):
+async def get_adventure(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    limit:int=5,
+    skip:int = 0,
+    search:Optional[str]=None,
+    cursor:Optional[str]=None,
+    current_user: Optional[Users] = Depends(get_optional_current_user)
+):
     if limit<1:
         raise HTTPException(
             status_code= status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail= "limit parameter may not be less than 1 if included"
         )
-    if search:
-        similarity_amount = 0.2
-        adventures = (
-            db.query(Adventures)
-            .filter(func.similarity(Adventures.title, search) > similarity_amount)
-            .order_by(func.similarity(Adventures.title, search).desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
+    if cursor and search:
+        raise HTTPException(
+            status_code= status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail= "cursor parameter cannot be combined with search"
         )
-        return adventures
-    
+
+    if cursor:
+        try:
+            queried_adventures = await get_adventure_page_after(db, limit=limit, cursor=cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code= status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail= "cursor parameter is invalid"
+            )
     else:
-        queried_adventures = (
-            db.query(Adventures)
-            .order_by(desc(Adventures.created_at))
-            .limit(limit)
-            .offset(skip)
-            .all()
-        )
-        return queried_adventures
+        queried_adventures = await get_adventure_page(db, limit=limit, skip=skip, search=search)
+
+    if not search and len(queried_adventures) == limit:
+        response.headers["X-Next-Cursor"] = encode_adventure_cursor(queried_adventures[-1])
+
+    return await add_liked_by_me(db, queried_adventures, current_user.user_id if current_user else None)
 
 #----------------------------------[ GET /adventures/{id} ]----------------------------------
 """
@@ -76,6 +87,7 @@ Basic Get request to retrieve Adventure data based on id
 
 Input:
     id: searches for a specific adventure with matching id
+    optional bearer token, fills in liked_by_me for that user
     Example: http://localhost:8000/adventure/2
     
 Return: Returns AdventureReturn pydantic schema if id is found
@@ -83,8 +95,8 @@ Return: Returns AdventureReturn pydantic schema if id is found
 
 """
 @router.get("/{id}",response_model=AdventureReturn)
-async def get_adventure_id(id: int, db: Session = Depends(get_gb)):
-    adventure_query = db.query(Adventures).filter(Adventures.adventure_id == id).first()
+async def get_adventure_id(id: int, db: AsyncSession = Depends(get_async_db), current_user: Optional[Users] = Depends(get_optional_current_user)):
+    adventure_query = await get_adventure_by_id(db, id)
     if id<1:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -96,6 +108,7 @@ async def get_adventure_id(id: int, db: Session = Depends(get_gb)):
             detail=f"Adventure with id={id} could not be found"
         )
     
+    await add_liked_by_me(db, [adventure_query], current_user.user_id if current_user else None)
     return adventure_query
 
 #----------------------------------[ POST /adventures ]----------------------------------
@@ -119,16 +132,19 @@ Notes about how this works:
     input. Image is stored in an UploadFile type and avoids writing the entire image into 
     memory.
 
-    The adventure is then written into an Adventures model which is then uploaded to POSTGRES,
-    the database writes the data and then returns with the updated data
+    The adventure is then written into an Adventures model and flushed to POSTGRES to get its id,
+    every image is hashed and, unless identical content is already stored, streamed straight from
+    its UploadFile to S3, concurrently and off the event loop (see app/image_store.py), so the
+    request takes about as long as the slowest image.
 
-    
-
-PLAN: EXPORT THE DATA INTO S3 AND UPLOAD URL INTO IMAGES DATABASE, CURRENTLY NOT IMPLEMENTED
+    Only once every upload succeeded are the Images rows added and the transaction committed,
+    if any upload fails the already uploaded objects are deleted and the adventure is rolled back
+    so no half created post is left behind. Returns HTTP 500 in that case.
 
+    A job per image builds its thumbnail and WebP version in the background (see app/jobs.py),
+    thumbnail_url / webp_url are filled in once it ran.
 
 """
-from random import randint
 
 @router.post("/", status_code= status.HTTP_201_CREATED, response_model= AdventureReturn)
 async def post_adventure_create(
@@ -136,7 +152,7 @@ async def post_adventure_create(
     description: str = Form(...),
     images: List[UploadFile] = File(...),
     caption: List[str] = Form(...),
-    db: Session = Depends(get_gb),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Users = Depends(get_current_user)
 ):
     if len(title) < 5:
@@ -162,47 +178,33 @@ async def post_adventure_create(
         )
 
     #do a check if title and owner_id already exists
-    title_check = db.query(Adventures).filter(Adventures.title == title and Adventures.owner_id == current_user.user_id).first()
-    if title_check:
+    title_check = await db.execute(
+        select(Adventures).where((Adventures.title == title) & (Adventures.owner_id == current_user.user_id))
+    )
+    if title_check.scalars().first():
         raise HTTPException(
             status_code= status.HTTP_409_CONFLICT,
             detail="User has already posted an adventure with this title"
         )
 
-    new_adventure = Adventures(title=title, description=description, owner_id = current_user.user_id)
+    #owner is attached directly so the response can be serialized without a lazy load
+    #the adventure is only flushed (not committed) so it can be rolled back if an upload fails
+    new_adventure = Adventures(title=title, description=description, owner_id = current_user.user_id, owner = current_user)
     db.add(new_adventure)
-    db.commit()
-    db.refresh(new_adventure)
-
-    for i, image in enumerate(images):
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            tmp.write(await image.read())
-            tmp_path = tmp.name
+    await db.flush()
 
-        # Generate random object name
-        object_name = f"adventures/{new_adventure.adventure_id}/{randint(1,999999)}_{image.filename}"
-
-        # Upload to S3
-        upload_success = upload_file(tmp_path, settings.S3_BUCKET_NAME, object_name)
-        os.remove(tmp_path)
-
-        if not upload_success:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to upload image to S3"
-            )
-
-        S3url = f"https://{settings.S3_BUCKET_NAME}.s3.{settings.AWS_REGION}.amazonaws.com/{object_name}"
-
-        new_image = Images(
-            url=S3url,
-            caption=caption[i],
-            adventure_id=new_adventure.adventure_id,
-            owner_id=current_user.user_id
+    files = [(image.file, image.filename, image.content_type) for image in images]
+    try:
+        await add_images(db, new_adventure.adventure_id, current_user.user_id, files, caption)
+    except (ClientError, BotoCoreError):
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to upload image to S3"
         )
-        db.add(new_image)
-    db.commit()
+    await db.commit()
+    job_worker.notify()
+    await db.refresh(new_adventure, attribute_names=["created_at", "like_count", "comment_count"])
 
     return new_adventure
 
@@ -215,16 +217,19 @@ Input:
 
 Process:
     -Check if user attempting to delete is the same as the owener of the post
+    -Deletes the adventure and its images from the database and queues a job that
+     removes the image objects no other image references from S3 (see app/jobs.py),
+     the response does not wait on S3
 Return:
     - if found and deleted successfully: HTTP status code 204 with no return Content
     - if not found: HTTP status code 404
     - if person accessing is not the owner of post: HTTP status code 403
 """
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_adventure_id(id: int, db: Session = Depends(get_gb), current_user: Users = Depends(get_current_user)):
+async def delete_adventure_id(id: int, db: AsyncSession = Depends(get_async_db), current_user: Users = Depends(get_current_user)):
     
-    queried_adventure = db.query(Adventures).filter(Adventures.adventure_id == id)
-    adventure = queried_adventure.first()
+    queried_adventure = await db.execute(select(Adventures).where(Adventures.adventure_id == id))
+    adventure = queried_adventure.scalars().first()
 
     if adventure == None:
         raise HTTPException(
@@ -238,28 +243,20 @@ async def delete_adventure_id(id: int, db: Session = Depends(get_gb), current_us
             detail="You do not have permission to perform this action"
         )
     
-    images = db.query(Images).filter(Images.adventure_id == id).all()
-    s3 = boto3.client(
-        "s3",
-        region_name=settings.AWS_REGION,
-        aws_access_key_id=settings.AWS_ACCESS_KEY,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
-    )
-
-    for image in images:
-        try:
-            parsed = urlparse(image.url)
-            bucket = parsed.netloc.split('.')[0]
-            key = parsed.path.lstrip('/')
-            s3.delete_object(Bucket=bucket, Key=key)
-        except ClientError as e:
-            print(f"Warning: could not delete {image.url} from S3: {e}")
+    image_urls = await release_images(db, Images.adventure_id == id)
+    if image_urls:
+        enqueue_job(db, "delete_s3_objects", {"urls": image_urls})
 
     #  Remove images from the database
-    db.query(Images).filter(Images.adventure_id == id).delete()
+    await db.execute(delete(Images).where(Images.adventure_id == id))
     
-    queried_adventure.delete(synchronize_session= False)
-    db.commit()
+    await db.execute(
+        delete(Adventures)
+        .where(Adventures.adventure_id == id)
+        .execution_options(synchronize_session= False)
+    )
+    await db.commit()
+    job_worker.notify()
 
 #----------------------------------[ PUT /adventures/{id} ]----------------------------------
 """
@@ -277,8 +274,7 @@ notes:
     -Only changes the inputs recieved, must be in json format
 """
 @router.put("/{id}", status_code= status.HTTP_204_NO_CONTENT)
-async def update_adventure_id(id: int, new_adventure: AdventureUpdate, db: Session = Depends(get_gb), current_user: Users = Depends(get_current_user)):
-    queried_adventure = db.query(Adventures).filter(Adventures.adventure_id == id)
+async def update_adventure_id(id: int, new_adventure: AdventureUpdate, db: AsyncSession = Depends(get_async_db), current_user: Users = Depends(get_current_user)):
 
     update_data = new_adventure.model_dump(exclude_unset=True)
     if not update_data:
@@ -288,32 +284,37 @@ async def update_adventure_id(id: int, new_adventure: AdventureUpdate, db: Sessi
     )
 
     if new_adventure.title:
-        title_query = db.query(Adventures).filter(
+        title_query = await db.execute(select(Adventures).where(
         (Adventures.title == new_adventure.title) & (Adventures.owner_id == current_user.user_id)
-        ).first()
+        ))
 
-        if title_query:
+        if title_query.scalars().first():
             raise HTTPException(
                 status_code= status.HTTP_409_CONFLICT,
                 detail= "User has already made an adventure with this title"
             )
     
-    if queried_adventure.first() == None:
+    queried_adventure = await db.execute(select(Adventures).where(Adventures.adventure_id == id))
+    adventure = queried_adventure.scalars().first()
+
+    if adventure == None:
         raise HTTPException(
             status_code= status.HTTP_404_NOT_FOUND,
             detail=f"Adventure with id={id} could not be found"
         )
 
-    if queried_adventure.first().owner_id != current_user.user_id:
+    if adventure.owner_id != current_user.user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have permision to perform this action"
         )
 
-    queried_adventure.update(
-        new_adventure.model_dump(exclude_unset=True),
-        synchronize_session = False
+    await db.execute(
+        update(Adventures)
+        .where(Adventures.adventure_id == id)
+        .values(**new_adventure.model_dump(exclude_unset=True))
+        .execution_options(synchronize_session = False)
     )
 
-    db.commit()
+    await db.commit()
 
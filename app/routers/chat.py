@@ -5,16 +5,24 @@ chat.py
 handles LLM communications
 """
 
+import json
+from dataclasses import dataclass
+from typing import List, Optional
+
 from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from slowapi.util import get_remote_address
 from slowapi import Limiter
 
 from app.schemas import PostQuery, LLMresponse
-from app.LLMdatapipeline.LLMutils import model, client
+from app.LLMdatapipeline.retrieval import retriever
+from app.LLMdatapipeline.embedding_cache import query_embedder
+from app.LLMdatapipeline.response_cache import response_cache
+from app.LLMdatapipeline.openai_client import complete, stream_completion
 from app.config import settings
 from app.models import Users as User
 from app.oauth2 import get_current_user
-from openai import OpenAI
 
 
 MAX_QUERY_CHARS = 500
@@ -22,24 +30,42 @@ MAX_QUERY_CHARS = 500
 limiter = Limiter(key_func=get_remote_address)
 router = APIRouter()
 
-@router.post("", status_code=status.HTTP_200_OK, response_model=LLMresponse)
-@limiter.limit("5/hour")
-async def chat(request:Request, query: PostQuery, current_user: User = Depends(get_current_user)):
-    query = query.query
+#----------------------------------[ Retrieval ]----------------------------------
+"""
+Shared by POST /chat and POST /chat/stream: checks the query, embeds it, retrieves the 3 most
+similar hikes and builds the prompt, or finds a cached answer for it
+"""
+@dataclass
+class ChatContext:
+    query_vector: List[float]
+    hit_ids: list
+    cached_answer: Optional[str]
+    prompt: Optional[str]
+
+async def prepare_chat(query: str) -> ChatContext:
     if len(query) > MAX_QUERY_CHARS:
         raise HTTPException(
             status_code= status.HTTP_400_BAD_REQUEST,
             detail=f"Query is too long, try shorter than {MAX_QUERY_CHARS}"
         )
     
-    query_vector = model.encode(query).tolist()
+    #cached by normalized query, misses are encoded in the embedding worker processes
+    query_vector = await query_embedder.embed(query)
 
-    results = client.search(
-        collection_name="hikes",
-        query_vector=query_vector,
-        limit=3,  # top 3 most similar
-        with_payload=True  # return full hike metadata too
-    )
+    #qdrant, or the in-process NumPy index while qdrant is down (see LLMdatapipeline/retrieval.py)
+    try:
+        results = await run_in_threadpool(retriever.search, query_vector, 3)
+    except Exception:
+        raise HTTPException(
+            status_code= status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Hike search is unavailable, try again later"
+        )
+
+    #an equivalent question that retrieved the same hikes was answered recently
+    hit_ids = [hit.id for hit in results]
+    cached_answer = response_cache.lookup(query_vector, hit_ids)
+    if cached_answer is not None:
+        return ChatContext(query_vector, hit_ids, cached_answer, None)
 
     context = ""
     for hit in results:
@@ -60,12 +86,81 @@ async def chat(request:Request, query: PostQuery, current_user: User = Depends(g
 
     based on these, answer the user's question in a friendly and concise way.
     """
-    client_openai = OpenAI(api_key=settings.CHAT_KEY)
+    return ChatContext(query_vector, hit_ids, None, prompt)
 
-    response = client_openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-    )
+#----------------------------------[ POST /chat ]----------------------------------
+"""
+Asks Roamly Rabbit a hiking question
+
+Input: query, at most MAX_QUERY_CHARS characters
+
+process:
+    - embeds the query (cached, see LLMdatapipeline/embedding_cache.py)
+    - retrieves the 3 most similar hikes (Qdrant or the NumPy index, see LLMdatapipeline/retrieval.py)
+    - returns a cached answer if a similar question retrieved the same hikes
+      (see LLMdatapipeline/response_cache.py), otherwise asks OpenAI and caches the answer
+
+Return: LLMresponse
+        HTTP 400 if the query is too long
+        HTTP 503 if no retrieval backend is available
+"""
+@router.post("", status_code=status.HTTP_200_OK, response_model=LLMresponse)
+@limiter.limit("5/hour")
+async def chat(request:Request, query: PostQuery, current_user: User = Depends(get_current_user)):
+    chat_context = await prepare_chat(query.query)
+    if chat_context.cached_answer is not None:
+        return LLMresponse(response=chat_context.cached_answer)
+
+    #awaited on the shared AsyncOpenAI client, other requests keep being served meanwhile
+    answer = await complete(chat_context.prompt)
+    response_cache.store(chat_context.query_vector, chat_context.hit_ids, answer)
+    return LLMresponse(response=answer)
+
+#----------------------------------[ POST /chat/stream ]----------------------------------
+"""
+Streaming version of POST /chat, the answer is sent as server-sent events while OpenAI generates it
+
+Input: query, at most MAX_QUERY_CHARS characters
 
-    return LLMresponse(response=response.choices[0].message.content)
\ No newline at end of file
+process: same retrieval as POST /chat, then relays the completion chunk by chunk
+         (a cached answer is sent as a single chunk), the full answer is cached once it finished
+
+Return: text/event-stream of
+            data: {"token": "..."}                  one per chunk of the answer
+            event: done, data: {}                    once the answer is complete
+            event: error, data: {"detail": "..."}    if the completion failed midway
+        HTTP 400 if the query is too long (before the stream starts)
+        HTTP 503 if no retrieval backend is available
+"""
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@router.post("/stream", status_code=status.HTTP_200_OK)
+@limiter.limit("5/hour")
+async def chat_stream(request:Request, query: PostQuery, current_user: User = Depends(get_current_user)):
+    chat_context = await prepare_chat(query.query)
+
+    async def events():
+        if chat_context.cached_answer is not None:
+            yield sse_event({"token": chat_context.cached_answer})
+            yield sse_event({}, event="done")
+            return
+
+        tokens = []
+        try:
+            async for token in stream_completion(chat_context.prompt):
+                tokens.append(token)
+                yield sse_event({"token": token})
+        except Exception:
+            yield sse_event({"detail": "Roamly Rabbit could not finish the answer"}, event="error")
+            return
+        response_cache.store(chat_context.query_vector, chat_context.hit_ids, "".join(tokens))
+        yield sse_event({}, event="done")
+
+    #no-transform / X-Accel-Buffering stop proxies (nginx) from buffering the stream
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"}
+    )
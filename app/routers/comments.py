@@ -5,21 +5,32 @@ comment.py
 handles comment CRUD operations for the api
 
 """
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Response
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 from app.models import Comments as Comment, Users as User, Adventures
-from app.database import get_gb
+from app.database import get_async_db
 from app.oauth2 import get_current_user
 from app.schemas import CommentReturn, CommentPost
+from app.queries import get_comment_page, encode_comment_cursor
+
+MAX_COMMENT_PAGE = 100
 
 router = APIRouter()
 
 #----------------------------------[ POST /comment/{adventure_id} ]----------------------------------
+"""
+Adds a comment to an adventure as the authenticated user, the adventures comment_count is
+incremented in the same transaction (UPDATE ... SET comment_count = comment_count + 1)
+
+Return: CommentReturn
+        HTTP 404 if the adventure does not exist
+"""
 @router.post("/{adventure_id}/comments", status_code= status.HTTP_201_CREATED, response_model= CommentReturn)
-async def post_comment(adventure_id: int, comment_data: CommentPost, db: Session= Depends(get_gb), current_user: User = Depends(get_current_user)):
-    adventure_query = db.query(Adventures).filter(Adventures.adventure_id == adventure_id).first()
+async def post_comment(adventure_id: int, comment_data: CommentPost, db: AsyncSession= Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    adventure_query = (await db.execute(select(Adventures).where(Adventures.adventure_id == adventure_id))).scalars().first()
     if not adventure_query:
         raise HTTPException(
             status_code= status.HTTP_404_NOT_FOUND,
@@ -28,31 +39,80 @@ async def post_comment(adventure_id: int, comment_data: CommentPost, db: Session
     comment = Comment(
         **comment_data.model_dump(),
         adventure_id = adventure_id,
-        owner_id = current_user.user_id
+        owner_id = current_user.user_id,
+        owner = current_user
         )
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await db.execute(
+        update(Adventures)
+        .where(Adventures.adventure_id == adventure_id)
+        .values(comment_count=Adventures.comment_count + 1)
+        .execution_options(synchronize_session = False)
+    )
+    await db.commit()
+    await db.refresh(comment, attribute_names=["comment_id", "created_at"])
     
     return comment
 
 #----------------------------------[ GET /comment ]----------------------------------
+"""
+Comments of an adventure, oldest first, one page at a time
+
+Input:
+    limit: comments per page (1 to MAX_COMMENT_PAGE)
+    cursor: opaque cursor from the X-Next-Cursor header of the previous page
+    Example: http://localhost:8000/adventure/1/comments?limit=20
+
+process: one statement for the page with the owners joined in (see get_comment_page in queries.py)
+
+Return: List of CommentReturn
+        X-Next-Cursor header is set when the page is full, pass it back as cursor to get the next page
+        HTTP 404 if the adventure does not exist
+        HTTP 422 if limit is out of range or the cursor is invalid
+"""
 @router.get("/{adventure_id}/comments", status_code= status.HTTP_200_OK, response_model=List[CommentReturn])
-def get_adventure_comments(adventure_id:int, db: Session = Depends(get_gb)):
-    adventure_query = db.query(Adventures).filter(Adventures.adventure_id == adventure_id).first()
+async def get_adventure_comments(
+    adventure_id:int,
+    response: Response,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if limit < 1 or limit > MAX_COMMENT_PAGE:
+        raise HTTPException(
+            status_code= status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail= f"limit parameter must be between 1 and {MAX_COMMENT_PAGE}"
+        )
+    adventure_query = (await db.execute(select(Adventures.adventure_id).where(Adventures.adventure_id == adventure_id))).scalars().first()
     if not adventure_query:
         raise HTTPException(
             status_code= status.HTTP_404_NOT_FOUND,
             detail= f"could not find adventure with adventure id = {adventure_id}"
         )
-    comment_query = db.query(Comment).filter(Comment.adventure_id == adventure_id).all()
-    return comment_query
+    try:
+        comments = await get_comment_page(db, adventure_id, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code= status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail= "cursor parameter is invalid"
+        )
+
+    if len(comments) == limit:
+        response.headers["X-Next-Cursor"] = encode_comment_cursor(comments[-1])
+    return comments
 
 #----------------------------------[ DELETE /comment ]----------------------------------
+"""
+Deletes a comment of the authenticated user and decrements the adventures comment_count
+
+Return: HTTP 204
+        HTTP 404 if the comment does not exist
+        HTTP 401 if the comment belongs to someone else
+"""
 @router.delete("/comment/{comment_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_comment_id(comment_id:int, db:Session = Depends(get_gb), current_user: User = Depends(get_current_user)):
-    comment_query = db.query(Comment).filter(Comment.comment_id ==  comment_id)
-    comment = comment_query.first()
+async def delete_comment_id(comment_id:int, db:AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    comment_query = await db.execute(select(Comment).where(Comment.comment_id ==  comment_id))
+    comment = comment_query.scalars().first()
     if not comment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -63,8 +123,21 @@ async def delete_comment_id(comment_id:int, db:Session = Depends(get_gb), curren
             status_code= status.HTTP_401_UNAUTHORIZED,
             detail= f"You are not permitted to delete comments from this adventure"
         )
-    comment_query.delete(synchronize_session= False)
-    db.commit()
+    deleted = await db.execute(
+        delete(Comment)
+        .where(Comment.comment_id == comment_id)
+        .returning(Comment.adventure_id)
+        .execution_options(synchronize_session= False)
+    )
+    #only if this request deleted it, a concurrent delete of the same comment counts once
+    if deleted.first():
+        await db.execute(
+            update(Adventures)
+            .where(Adventures.adventure_id == comment.adventure_id)
+            .values(comment_count=Adventures.comment_count - 1)
+            .execution_options(synchronize_session = False)
+        )
+    await db.commit()
 
 #----------------------------------[ PUT /comment ]----------------------------------
 
@@ -6,23 +6,30 @@ handles image CRUD operations for the api
 
 """
 from fastapi import APIRouter, HTTPException, status, Depends, Form, File,  UploadFile
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
 from typing import List
-from random import randint
-import tempfile
+from uuid import uuid4
 import os
-from urllib.parse import urlparse
-import boto3
+from botocore.exceptions import ClientError, BotoCoreError
 
-from app.schemas import ImageReturn, ImageChange
+from app.schemas import ImageReturn, ImageChange, ImageUploadRequest, PresignedUpload, ImageConfirm
 from app.models import Users as User, Adventures, Images
-from app.oauth2 import get_gb, get_current_user
-from app.aws import upload_file, delete_file_from_s3
+from app.database import get_async_db
+from app.oauth2 import get_current_user
+from app.aws import generate_presigned_upload, get_object_metadata, s3_url
 from app.config import settings
+from app.jobs import enqueue_job, enqueue_image_derivatives, job_worker
+from app.image_store import add_images, release_images
 
 BUCKET_NAME = settings.S3_BUCKET_NAME
 AWS_REGION = settings.AWS_REGION
 
+VALID_MIME = ["image/jpeg", "image/png", "image/webp"]
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+PRESIGNED_UPLOAD_EXPIRE_SECONDS = 300
+
 router = APIRouter()
 
 
@@ -38,42 +45,87 @@ inputs: in Form Data
 returns:
     - HTTP 404 if the image id could not be found
     - HTTP 403 if the user is not the same as the owner of the image
-    - if successfull then it returns a List of all images in adventure
+    - if successfull then it returns a List of all images in adventure,
+      thumbnail_url / webp_url of the new image are filled in by a background job
 """
 @router.post("/{adventure_id}/images", status_code=status.HTTP_200_OK, response_model=List[ImageReturn])
 async def post_image_adventure_id(
     adventure_id: int,
     caption: str = Form(...),
     image: UploadFile = File(...),
-    db: Session = Depends(get_gb),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    valid_MIME = ["image/jpeg", "image/png", "image/webp"]
-    if image.content_type.lower() not in valid_MIME:
+    if image.content_type.lower() not in VALID_MIME:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Image type not supported"
         )
 
-    # Temporarily store the uploaded file
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        tmp.write(await image.read())
-        tmp_path = tmp.name
-
-    object_name = f"adventures/{adventure_id}/{randint(1,999999)}_{image.filename}"
+    adventure = (await db.execute(select(Adventures).where(Adventures.adventure_id == adventure_id))).scalars().first()
+    if not adventure:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"adventure with id={adventure_id} could not be found"
+        )
 
-    upload_success = upload_file(tmp_path, BUCKET_NAME, object_name)
-    os.remove(tmp_path)  # Clean up temp file
+    if adventure.owner_id != current_user.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not permitted to add photos to this adventure"
+        )
 
-    if not upload_success:
+    #hashed and streamed to S3 with the shared client off the event loop, skipped if already stored
+    try:
+        await add_images(db, adventure_id, current_user.user_id, [(image.file, image.filename, image.content_type)], [caption])
+    except (ClientError, BotoCoreError):
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to upload image to S3"
         )
+    await db.commit()
+    job_worker.notify()
+    adventure_images = await db.execute(select(Images).where(Images.adventure_id == adventure_id))
+    return adventure_images.scalars().all()
+
+#----------------------------------[ POST /image/upload-url ]----------------------------------
+"""
+Issues a presigned S3 POST so the client uploads an image directly to S3,
+the image bytes never pass through the api
+
+inputs:
+    - id of the adventure the image will be associated with
+    - filename and content type of the image
 
-    S3url = f"https://{BUCKET_NAME}.s3.amazonaws.com/{object_name}"
+process:
+    - checks the adventure exists and belongs to the user and the MIME type is supported
+    - picks a unique object name under adventures/{adventure_id}/
+    - S3 will only accept the upload with that content type, under MAX_IMAGE_BYTES,
+      for PRESIGNED_UPLOAD_EXPIRE_SECONDS
 
-    adventure = db.query(Adventures).filter(Adventures.adventure_id == adventure_id).first()
+returns:
+    - HTTP 404 if the adventure could not be found
+    - HTTP 403 if the user is not the owner of the adventure
+    - HTTP 422 if the image type is not supported
+    - if successfull then the url and form fields to POST the file to, and the object name
+      to send to POST /{adventure_id}/images/confirm once the upload finished
+"""
+@router.post("/{adventure_id}/images/upload-url", status_code=status.HTTP_201_CREATED, response_model=PresignedUpload)
+async def post_image_upload_url(
+    adventure_id: int,
+    upload_request: ImageUploadRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    content_type = upload_request.content_type.lower()
+    if content_type not in VALID_MIME:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Image type not supported"
+        )
+
+    adventure = (await db.execute(select(Adventures).where(Adventures.adventure_id == adventure_id))).scalars().first()
     if not adventure:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -86,11 +138,93 @@ async def post_image_adventure_id(
             detail="You are not permitted to add photos to this adventure"
         )
 
-    new_image = Images(adventure_id=adventure_id, caption=caption, url=S3url, owner_id=current_user.user_id)
+    filename = os.path.basename(upload_request.filename)
+    object_name = f"adventures/{adventure_id}/{uuid4().hex}_{filename}"
+    presigned = generate_presigned_upload(
+        object_name,
+        content_type=content_type,
+        max_bytes=MAX_IMAGE_BYTES,
+        expires_in=PRESIGNED_UPLOAD_EXPIRE_SECONDS
+    )
+
+    return {
+        "url": presigned["url"],
+        "fields": presigned["fields"],
+        "object_name": object_name,
+        "expires_in": PRESIGNED_UPLOAD_EXPIRE_SECONDS
+    }
+
+#----------------------------------[ POST /image/confirm ]----------------------------------
+"""
+Registers an image that the client uploaded directly to S3 with a presigned url
+
+inputs:
+    - id of the adventure the image belongs to
+    - object name returned by POST /{adventure_id}/images/upload-url
+    - caption of the image
+
+process:
+    - checks the adventure exists and belongs to the user
+    - checks the object name belongs to this adventure and was not registered already
+    - checks the object really exists in S3 before adding the Images row
+
+returns:
+    - HTTP 404 if the adventure could not be found
+    - HTTP 403 if the user is not the owner of the adventure
+    - HTTP 422 if the object name is not one issued for this adventure
+    - HTTP 409 if the image was already registered
+    - HTTP 400 if the object has not been uploaded to S3
+    - if successfull then it returns a List of all images in adventure
+"""
+@router.post("/{adventure_id}/images/confirm", status_code=status.HTTP_201_CREATED, response_model=List[ImageReturn])
+async def post_image_confirm(
+    adventure_id: int,
+    confirm_data: ImageConfirm,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    adventure = (await db.execute(select(Adventures).where(Adventures.adventure_id == adventure_id))).scalars().first()
+    if not adventure:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"adventure with id={adventure_id} could not be found"
+        )
+
+    if adventure.owner_id != current_user.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not permitted to add photos to this adventure"
+        )
+
+    object_name = confirm_data.object_name
+    if not object_name.startswith(f"adventures/{adventure_id}/") or ".." in object_name:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="object name does not belong to this adventure"
+        )
+
+    S3url = s3_url(object_name)
+    if (await db.execute(select(Images).where(Images.url == S3url))).scalars().first():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="image has already been added to this adventure"
+        )
+
+    metadata = await run_in_threadpool(get_object_metadata, object_name)
+    if metadata is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="image has not been uploaded to S3"
+        )
+
+    new_image = Images(adventure_id=adventure_id, caption=confirm_data.caption, url=S3url, owner_id=current_user.user_id)
     db.add(new_image)
-    db.commit()
-    adventure_images = db.query(Images).filter(Images.adventure_id == adventure_id).all()
-    return adventure_images
+    await db.flush()
+    enqueue_image_derivatives(db, new_image, object_name)
+    await db.commit()
+    job_worker.notify()
+    adventure_images = await db.execute(select(Images).where(Images.adventure_id == adventure_id))
+    return adventure_images.scalars().all()
 
 #----------------------------------[ GET /image/id ]----------------------------------
 """
@@ -104,7 +238,7 @@ returns:
 
 """
 @router.get("/images/{adventure_id}", response_model= List[ImageReturn])
-async def get_adventure_images(adventure_id: int, db: Session = Depends(get_gb)):
+async def get_adventure_images(adventure_id: int, db: AsyncSession = Depends(get_async_db)):
 
     if adventure_id<1:
         raise HTTPException(
@@ -112,14 +246,14 @@ async def get_adventure_images(adventure_id: int, db: Session = Depends(get_gb))
             detail="No adventure with id less than 1"
         )
     
-    adventure = db.query(Adventures).filter(Adventures.adventure_id == adventure_id).first()
+    adventure = (await db.execute(select(Adventures).where(Adventures.adventure_id == adventure_id))).scalars().first()
     if not adventure:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"adventure with id={adventure_id} could not be found"
         )
-    db_query = db.query(Images).filter(Images.adventure_id == adventure_id).all()
-    return db_query
+    db_query = await db.execute(select(Images).where(Images.adventure_id == adventure_id))
+    return db_query.scalars().all()
 
 
 #----------------------------------[ DELETE /image/id ]----------------------------------
@@ -132,16 +266,20 @@ returns:
     - HTTP 404 if the image id could not be found
     - HTTP 403 if the user is not the same as the owner of the image
     - if successfull then it returns a List of all images in adventure
+
+notes:
+    the row is deleted right away, the S3 object is removed by a queued job (see app/jobs.py)
+    unless another image still references the same content
 """
 @router.delete("/images/{image_id}", status_code= status.HTTP_202_ACCEPTED, response_model= List[ImageReturn])
-async def delete_id(image_id: int, db: Session = Depends(get_gb), current_user: User = Depends(get_current_user)):
+async def delete_id(image_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     if image_id<1:
         raise HTTPException(
             status_code= status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="No images with id less than 1"
         )
-    image_query = db.query(Images).filter(Images.image_id == image_id)
-    image = image_query.first()
+    image_query = await db.execute(select(Images).where(Images.image_id == image_id))
+    image = image_query.scalars().first()
     
     if not image:
         raise HTTPException(
@@ -154,18 +292,19 @@ async def delete_id(image_id: int, db: Session = Depends(get_gb), current_user:
             detail= f"You are not permitted to delete photos from this adventure"
         )
 
-    try:
-        delete_file_from_s3(image.url)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to delete image from S3: {e}"
-        )
-
     adventure_id = image.adventure_id
-    image_query.delete(synchronize_session= False)
-    db.commit()
-    return db.query(Images).filter(Images.adventure_id == adventure_id).all()
+    image_urls = await release_images(db, Images.image_id == image_id)
+    if image_urls:
+        enqueue_job(db, "delete_s3_objects", {"urls": image_urls})
+    await db.execute(
+        delete(Images)
+        .where(Images.image_id == image_id)
+        .execution_options(synchronize_session= False)
+    )
+    await db.commit()
+    job_worker.notify()
+    adventure_images = await db.execute(select(Images).where(Images.adventure_id == adventure_id))
+    return adventure_images.scalars().all()
     
 
 #----------------------------------[ PUT /image/id ]----------------------------------
@@ -182,9 +321,9 @@ returns:
     - if successfull then it returns a List of all images in adventure
 """
 @router.put("/images/{image_id}", status_code=status.HTTP_200_OK, response_model=List[ImageReturn])
-async def put_image_id(image_id: int, new_caption: ImageChange, db: Session = Depends(get_gb), current_user: Session = Depends(get_current_user)):
-    queried_images = db.query(Images).filter(Images.image_id == image_id)
-    image = queried_images.first()
+async def put_image_id(image_id: int, new_caption: ImageChange, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    queried_images = await db.execute(select(Images).where(Images.image_id == image_id))
+    image = queried_images.scalars().first()
 
     if not image: 
         raise HTTPException(
@@ -200,11 +339,14 @@ async def put_image_id(image_id: int, new_caption: ImageChange, db: Session = De
     
     adventure_id = image.adventure_id
 
-    queried_images.update(
-        new_caption.model_dump(),
-        synchronize_session = False
+    await db.execute(
+        update(Images)
+        .where(Images.image_id == image_id)
+        .values(**new_caption.model_dump())
+        .execution_options(synchronize_session = "evaluate")
     )
 
-    db.commit()
+    await db.commit()
     
-    return db.query(Images).filter(Images.adventure_id == adventure_id)
\ No newline at end of file
+    adventure_images = await db.execute(select(Images).where(Images.adventure_id == adventure_id))
+    return adventure_images.scalars().all()
\ No newline at end of file
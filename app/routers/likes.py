@@ -0,0 +1,141 @@
+"""
+likes.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ likes Router ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+handles liking and unliking adventures
+
+Adventures.like_count is a counter kept next to the likes table: a like inserts the row and, only
+if it did not exist yet, increments the counter in the same transaction
+(UPDATE adventures SET like_count = like_count + 1), an unlike does the reverse. The increment is
+done by postgres on the locked row, so concurrent likes never lose an update, and liking twice
+does not count twice. Reading a count never scans the likes table.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.schemas import LikeReturn
+from app.database import get_async_db
+from app.models import Adventures, Likes, Users as User
+from app.oauth2 import get_current_user, get_optional_current_user
+from app.queries import get_liked_ids
+
+MAX_LIKE_COUNT_IDS = 100
+
+router = APIRouter()
+
+async def get_adventure_or_404(db: AsyncSession, adventure_id: int) -> Adventures:
+    adventure = (await db.execute(select(Adventures).where(Adventures.adventure_id == adventure_id))).scalars().first()
+    if not adventure:
+        raise HTTPException(
+            status_code= status.HTTP_404_NOT_FOUND,
+            detail= f"could not find adventure with adventure id = {adventure_id}"
+        )
+    return adventure
+
+#----------------------------------[ GET /adventure/likes ]----------------------------------
+"""
+Like counts of several adventures in one request, e.g. to refresh the counts of a feed page
+
+Input: ids, adventure ids (repeated query parameter, at most MAX_LIKE_COUNT_IDS)
+    Example: http://localhost:8000/adventure/likes?ids=1&ids=2&ids=3
+
+process: one statement for the counts and, for an authenticated user, one for liked_by_me
+
+Return: List of LikeReturn in the order of ids, unknown adventure ids are left out
+        HTTP 422 if no or more than MAX_LIKE_COUNT_IDS ids are given
+"""
+@router.get("/likes", status_code=status.HTTP_200_OK, response_model=List[LikeReturn])
+async def get_like_counts(
+    ids: List[int] = Query(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_optional_current_user)
+):
+    if len(ids) > MAX_LIKE_COUNT_IDS:
+        raise HTTPException(
+            status_code= status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail= f"at most {MAX_LIKE_COUNT_IDS} ids can be requested at once"
+        )
+
+    result = await db.execute(
+        select(Adventures.adventure_id, Adventures.like_count)
+        .where(Adventures.adventure_id.in_(ids))
+    )
+    counts = dict(result.all())
+    liked = await get_liked_ids(db, current_user.user_id, list(counts)) if current_user else set()
+
+    return [
+        LikeReturn(adventure_id=adventure_id, like_count=counts[adventure_id], liked_by_me=adventure_id in liked)
+        for adventure_id in dict.fromkeys(ids) if adventure_id in counts
+    ]
+
+#----------------------------------[ POST /adventure/{adventure_id}/like ]----------------------------------
+"""
+Likes an adventure as the authenticated user
+
+process:
+    - inserts the like, ON CONFLICT DO NOTHING so liking twice is a no-op
+    - increments like_count only if a row was inserted
+
+Return: LikeReturn with the new count
+        HTTP 404 if the adventure does not exist
+"""
+@router.post("/{adventure_id}/like", status_code=status.HTTP_200_OK, response_model=LikeReturn)
+async def like_adventure(adventure_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    adventure = await get_adventure_or_404(db, adventure_id)
+
+    inserted = await db.execute(
+        insert(Likes)
+        .values(adventure_id=adventure_id, owner_id=current_user.user_id)
+        .on_conflict_do_nothing()
+        .returning(Likes.adventure_id)
+    )
+    like_count = adventure.like_count
+    if inserted.first():
+        like_count = (await db.execute(
+            update(Adventures)
+            .where(Adventures.adventure_id == adventure_id)
+            .values(like_count=Adventures.like_count + 1)
+            .returning(Adventures.like_count)
+            .execution_options(synchronize_session = False)
+        )).scalar_one()
+    await db.commit()
+
+    return LikeReturn(adventure_id=adventure_id, like_count=like_count, liked_by_me=True)
+
+#----------------------------------[ DELETE /adventure/{adventure_id}/like ]----------------------------------
+"""
+Removes the authenticated user's like from an adventure
+
+process:
+    - deletes the like, unliking an adventure that was not liked is a no-op
+    - decrements like_count only if a row was deleted
+
+Return: LikeReturn with the new count
+        HTTP 404 if the adventure does not exist
+"""
+@router.delete("/{adventure_id}/like", status_code=status.HTTP_200_OK, response_model=LikeReturn)
+async def unlike_adventure(adventure_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    adventure = await get_adventure_or_404(db, adventure_id)
+
+    deleted = await db.execute(
+        delete(Likes)
+        .where(Likes.adventure_id == adventure_id, Likes.owner_id == current_user.user_id)
+        .returning(Likes.adventure_id)
+        .execution_options(synchronize_session = False)
+    )
+    like_count = adventure.like_count
+    if deleted.first():
+        like_count = (await db.execute(
+            update(Adventures)
+            .where(Adventures.adventure_id == adventure_id)
+            .values(like_count=Adventures.like_count - 1)
+            .returning(Adventures.like_count)
+            .execution_options(synchronize_session = False)
+        )).scalar_one()
+    await db.commit()
+
+    return LikeReturn(adventure_id=adventure_id, like_count=like_count, liked_by_me=False)
@@ -0,0 +1,86 @@
+"""
+metrics.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ metrics Router ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+exposes runtime metrics of the api so they can be scraped for capacity planning
+
+"""
+from fastapi import APIRouter, status
+
+from app.schemas import PoolStats, EmbeddingCacheStats, CacheStats, PasswordHashingStats
+from app.database import pool_stats
+from app.LLMdatapipeline.embedding_cache import query_embedder
+from app.LLMdatapipeline.response_cache import response_cache
+from app.passwords import password_hasher
+from app.oauth2 import principal_cache, token_cache
+
+router = APIRouter()
+
+#----------------------------------[ GET /metrics/db-pool ]----------------------------------
+"""
+Returns the current state of the async database connection pool
+
+Return:
+    PoolStats: pool size, connections checked out/in, overflow in use,
+    and how long requests have waited to get a connection (average and max in ms)
+"""
+@router.get("/db-pool", status_code=status.HTTP_200_OK, response_model=PoolStats)
+async def get_db_pool_stats():
+    return pool_stats()
+
+#----------------------------------[ GET /metrics/embedding-cache ]----------------------------------
+"""
+Returns the counters of the chat query embedding cache
+
+Return:
+    EmbeddingCacheStats: entries, hits/misses, evictions, expirations and hit rate of the
+    in-process cache, and how many misses were served by the shared store
+"""
+@router.get("/embedding-cache", status_code=status.HTTP_200_OK, response_model=EmbeddingCacheStats)
+async def get_embedding_cache_stats():
+    return query_embedder.stats()
+
+#----------------------------------[ GET /metrics/chat-cache ]----------------------------------
+"""
+Returns the counters of the semantic chat response cache
+
+Return:
+    CacheStats: cached answers, hits (completions saved), misses, evictions, expirations and hit rate
+"""
+@router.get("/chat-cache", status_code=status.HTTP_200_OK, response_model=CacheStats)
+async def get_chat_cache_stats():
+    return response_cache.stats()
+
+#----------------------------------[ GET /metrics/password-hashing ]----------------------------------
+"""
+Returns the state of the bcrypt thread pool used for signups, password changes and logins
+
+Return:
+    PasswordHashingStats: workers, hashes running / queued now (and the peak), completed and
+    rejected (HTTP 503, back-pressure) hashes, average and max queue wait and average hash time in ms
+"""
+@router.get("/password-hashing", status_code=status.HTTP_200_OK, response_model=PasswordHashingStats)
+async def get_password_hashing_stats():
+    return password_hasher.stats()
+
+#----------------------------------[ GET /metrics/principal-cache ]----------------------------------
+"""
+Returns the counters of the authenticated user cache used by get_current_user
+
+Return:
+    CacheStats: cached users, hits (user queries saved), misses, evictions, expirations and hit rate
+"""
+@router.get("/principal-cache", status_code=status.HTTP_200_OK, response_model=CacheStats)
+async def get_principal_cache_stats():
+    return principal_cache.stats()
+
+#----------------------------------[ GET /metrics/jwt-cache ]----------------------------------
+"""
+Returns the counters of the verified token cache used by verify_token
+
+Return:
+    CacheStats: cached tokens, hits (JWT decodes saved), misses, evictions, expirations and hit rate
+"""
+@router.get("/jwt-cache", status_code=status.HTTP_200_OK, response_model=CacheStats)
+async def get_jwt_cache_stats():
+    return token_cache.stats()
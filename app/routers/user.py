@@ -7,19 +7,21 @@ handles user CRUD operations for the api
 """
 
 from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text, select, update, delete, or_, func
 from typing import List, Optional
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
 
 from app.schemas import UserCreate, UserAuthReturn, UserReturn, UserUpdate, Token, UserLogin, AdventureReturn
-from app.database import get_gb
-from app.oauth2 import get_current_user, create_access_token, authenticate_user
-from app.models import Users as User, Adventures
+from app.database import get_async_db
+from app.oauth2 import get_current_user, create_access_token, authenticate_user, invalidate_principal
+from app.queries import get_adventures_by_owner, add_liked_by_me
+from app.image_store import release_images
+from app.models import Users as User, Adventures, Images, Likes, Comments
+from app.jobs import enqueue_job, job_worker
+from app.passwords import password_hasher
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def check_password_requirments(password:str):
     """
@@ -54,7 +56,7 @@ Input:
 process:
     -checks if email/ username already exists
     -Checks password requirments
-    -Hashes password
+    -Hashes password (in the password hashing pool, see passwords.py)
     -Uploads user to database
 
 Returns: 
@@ -62,32 +64,33 @@ Returns:
     -else:
         -returns HTTP 409 if email or username exits
         -returns HTTP 400 if password doesnt meet specifications
+        -returns HTTP 503 if too many passwords are being hashed at once
 
 """
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=UserAuthReturn)
-async def post_user(new_user_data: UserCreate, db: Session = Depends(get_gb)):
+async def post_user(new_user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
 
-    if db.query(User).filter(User.email == new_user_data.email).first():
+    if (await db.execute(select(User).where(User.email == new_user_data.email))).scalars().first():
         raise HTTPException(
             status_code= status.HTTP_409_CONFLICT,
             detail="Email has already been used to create acount"
         )
-    if db.query(User).filter(User.username == new_user_data.username).first():
+    if (await db.execute(select(User).where(User.username == new_user_data.username))).scalars().first():
         raise HTTPException(
             status_code= status.HTTP_409_CONFLICT,
             detail="There is already an acount with that username"
         )
     
     check_password_requirments(new_user_data.password) 
-    hashed_password = pwd_context.hash(new_user_data.password)
+    hashed_password = await password_hasher.hash(new_user_data.password)
     new_user_data.password = hashed_password
 
     new_user = User(**new_user_data.model_dump())
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     access_token = create_access_token(data= {"user_id":new_user.user_id})
     
@@ -122,7 +125,7 @@ Return:
     """
 @router.get("/", response_model = List[UserReturn])
 async def get_user(
-    db: Session = Depends(get_gb),
+    db: AsyncSession = Depends(get_async_db),
     username: Optional[str] = None,
     skip: int = 0,
     limit: int = 10
@@ -145,17 +148,16 @@ async def get_user(
             "limit_amount": limit
         }
 
-        user_search = db.execute(sql, params)
+        user_search = await db.execute(sql, params)
 
-        return [UserReturn(**dict(row)) for row in user_search]
+        return [UserReturn(**row) for row in user_search.mappings()]
     else:
-        user_search = (
-            db.query(User)
+        user_search = await db.execute(
+            select(User)
             .offset(skip)
             .limit(limit)
-            .all()
         )
-        return user_search
+        return user_search.scalars().all()
     
 #----------------------------------[ GET /user/{id} ]----------------------------------
 """
@@ -167,8 +169,8 @@ Return: if found: user
         if not found: HTTP 404 
 """
 @router.get("/{id}", response_model = UserReturn)
-async def get_user_id(id: int, db: Session = Depends(get_gb)):
-    queried_user = db.query(User).filter(User.user_id == id).first()
+async def get_user_id(id: int, db: AsyncSession = Depends(get_async_db)):
+    queried_user = (await db.execute(select(User).where(User.user_id == id))).scalars().first()
     
     if not queried_user:
         raise HTTPException(
@@ -185,12 +187,15 @@ Simple Delete request to delete a user with a certain ID
 inputs: Id of user
 
 process: Checks if user, the user is attempting to delete is the same one that is being deleted
+         Deletes the user (adventures, comments and likes cascade) and all of their images,
+         the like_count / comment_count of every adventure they liked / commented on is decremented,
+         the image objects are removed from S3 by a queued job (see app/jobs.py)
 
 Return: if found: user
         if not found: HTTP 404 
 """
 @router.delete("/{id}", status_code = status.HTTP_204_NO_CONTENT)
-async def delete_user_id(id: int, db: Session = Depends(get_gb), current_user: User = Depends(get_current_user)):
+async def delete_user_id(id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     
     if current_user.user_id != id:
         raise HTTPException(
@@ -198,14 +203,54 @@ async def delete_user_id(id: int, db: Session = Depends(get_gb), current_user: U
             detail="You do not have permision to perform this action"
         )
     
-    db_query = db.query(User).filter(User.user_id == id)
-    if not db_query.first():
+    db_query = await db.execute(select(User).where(User.user_id == id))
+    if not db_query.scalars().first():
         raise HTTPException(
             status_code= status.HTTP_404_NOT_FOUND,
             detail= f"could not find user with id={id}"
         )
-    db_query.delete(synchronize_session= False)
-    db.commit()
+
+    #images of the users adventures are removed by the database cascade, their S3 objects are not,
+    #so collect the urls first (images.owner_id has no foreign key, those rows are deleted explicitly)
+    user_images = or_(
+        Images.owner_id == id,
+        Images.adventure_id.in_(select(Adventures.adventure_id).where(Adventures.owner_id == id))
+    )
+    image_urls = await release_images(db, user_images)
+    if image_urls:
+        enqueue_job(db, "delete_s3_objects", {"urls": image_urls})
+    await db.execute(
+        delete(Images)
+        .where(user_images)
+        .execution_options(synchronize_session= False)
+    )
+    #the users likes and comments are removed by the cascade, the counters of the adventures are not
+    await db.execute(
+        update(Adventures)
+        .where(Adventures.adventure_id.in_(select(Likes.adventure_id).where(Likes.owner_id == id)))
+        .values(like_count=Adventures.like_count - 1)
+        .execution_options(synchronize_session= False)
+    )
+    user_comments = (
+        select(Comments.adventure_id, func.count().label("comments"))
+        .where(Comments.owner_id == id)
+        .group_by(Comments.adventure_id)
+        .subquery()
+    )
+    await db.execute(
+        update(Adventures)
+        .where(Adventures.adventure_id == user_comments.c.adventure_id)
+        .values(comment_count=Adventures.comment_count - user_comments.c.comments)
+        .execution_options(synchronize_session= False)
+    )
+    await db.execute(
+        delete(User)
+        .where(User.user_id == id)
+        .execution_options(synchronize_session= False)
+    )
+    await db.commit()
+    invalidate_principal(id)
+    job_worker.notify()
 
 #----------------------------------[ PUT /user/{id} ]----------------------------------
 """
@@ -231,28 +276,28 @@ returns:
     - HTTP 204: successfull change, no return content
 """
 @router.put("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-async def put_user_id(id: int, new_user_data: UserUpdate, db: Session = Depends(get_gb), current_user : User = Depends(get_current_user)):
+async def put_user_id(id: int, new_user_data: UserUpdate, db: AsyncSession = Depends(get_async_db), current_user : User = Depends(get_current_user)):
     if current_user.user_id != id:
         raise HTTPException(
             status_code= status.HTTP_403_FORBIDDEN,
             detail="You do not have permision to perform this action"
         )
     
-    if db.query(User).filter(User.email == new_user_data.email).first():
+    if (await db.execute(select(User).where(User.email == new_user_data.email))).scalars().first():
         raise HTTPException(
             status_code= status.HTTP_409_CONFLICT,
             detail="Email has already been used to create acount"
         )
     
-    if db.query(User).filter(User.username == new_user_data.username).first():
+    if (await db.execute(select(User).where(User.username == new_user_data.username))).scalars().first():
         raise HTTPException(
             status_code= status.HTTP_409_CONFLICT,
             detail="There is already an acount with that username"
         )
     
-    db_query = db.query(User).filter(User.user_id == id)
+    db_query = await db.execute(select(User).where(User.user_id == id))
 
-    if not db_query.first():
+    if not db_query.scalars().first():
         raise HTTPException(
             status_code= status.HTTP_404_NOT_FOUND,
             detail= f"could not find user with id={id}"
@@ -260,20 +305,23 @@ async def put_user_id(id: int, new_user_data: UserUpdate, db: Session = Depends(
     if new_user_data.password:
         check_password_requirments(new_user_data.password)
 
-        hashed_password = pwd_context.hash(new_user_data.password)
+        hashed_password = await password_hasher.hash(new_user_data.password)
         new_user_data.password = hashed_password
 
-    db_query.update(
-        new_user_data.model_dump(exclude_unset=True),
-        synchronize_session = False
+    await db.execute(
+        update(User)
+        .where(User.user_id == id)
+        .values(**new_user_data.model_dump(exclude_unset=True))
+        .execution_options(synchronize_session = False)
     )
-    db.commit()
+    await db.commit()
+    invalidate_principal(id)
 
 #----------------------------------[ POST /user/login ]----------------------------------
 
 @router.post("/login", status_code=status.HTTP_200_OK, response_model= Token)
-async def post_user_login(login_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_gb)):
-    user = authenticate_user(login_data.username, login_data.password, db)
+async def post_user_login(login_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(login_data.username, login_data.password, db)
     access_token = create_access_token(data = {"user_id":user.user_id})
     return {
         "access_token": access_token,
@@ -299,11 +347,11 @@ Returns:
 @router.get("/{id}/adventures", status_code=status.HTTP_200_OK, response_model=List[AdventureReturn])
 async def get_user_adventures(
     id: int,
-    db: Session = Depends(get_gb),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Ensure the user exists
-    user_exists = db.query(User).filter(User.user_id == id).first()
+    user_exists = (await db.execute(select(User).where(User.user_id == id))).scalars().first()
     if not user_exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -311,6 +359,6 @@ async def get_user_adventures(
         )
 
     # Get adventures for that user
-    adventures = db.query(Adventures).filter(Adventures.owner_id == id).all()
+    adventures = await get_adventures_by_owner(db, id)
 
-    return adventures
\ No newline at end of file
+    return await add_liked_by_me(db, adventures, current_user.user_id)
\ No newline at end of file
@@ -68,6 +68,8 @@ class UserReturn(UserBase):
 AdventureBase: basic outline for adventure inheretance
 AdventureUpdate: schema for updating adventures [PUT]
 AdventureReturn: Return Schema for adventure [Get]
+    like_count: number of likes, liked_by_me: whether the authenticated user liked it
+    (always false for anonymous requests), comment_count: number of comments
 """
 class AdventureBase(BaseModel):
     title: str
@@ -81,12 +83,24 @@ class AdventureReturn(AdventureBase):
     adventure_id: int
     created_at: datetime
     owner: UserReturn
+    like_count: int = 0
+    liked_by_me: bool = False
+    comment_count: int = 0
 
     model_config = {
         "from_attributes": True
     }
 
     
+#----------------------------------[ Likes ]----------------------------------
+"""
+LikeReturn: like count of an adventure and whether the authenticated user liked it [post, delete, get]
+"""
+class LikeReturn(BaseModel):
+    adventure_id: int
+    like_count: int
+    liked_by_me: bool
+
 #----------------------------------[ Images ]----------------------------------
 
 class ImageBase(BaseModel):
@@ -97,6 +111,8 @@ class ImageReturn(ImageBase):
     image_id: int
     url: str
     owner_id: int
+    thumbnail_url: Optional[str] = None
+    webp_url: Optional[str] = None
 
     model_config = {
         "from_attributes": True
@@ -105,6 +121,25 @@ class ImageReturn(ImageBase):
 class ImageChange(BaseModel):
     caption: str
 
+"""
+ImageUploadRequest: asks for a presigned url to upload one image directly to S3 [post]
+PresignedUpload: presigned S3 POST, the client sends fields + file as multipart form data to url
+ImageConfirm: registers an image once the client finished uploading it to object_name [post]
+"""
+class ImageUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+
+class PresignedUpload(BaseModel):
+    url: str
+    fields: dict
+    object_name: str
+    expires_in: int
+
+class ImageConfirm(BaseModel):
+    object_name: str
+    caption: str
+
 #----------------------------------[ Comments ]----------------------------------
 
 class CommentBase(BaseModel):
@@ -127,4 +162,47 @@ class PostQuery(ChatBase):
     pass
 
 class LLMresponse(BaseModel):
-    response: str
\ No newline at end of file
+    response: str
+
+#----------------------------------[ Metrics ]----------------------------------
+"""
+PoolStats: snapshot of the async database connection pool [get]
+CacheStats: counters of an in-process cache [get]
+EmbeddingCacheStats: CacheStats of the chat query embedding cache plus its shared store [get]
+PasswordHashingStats: queue depth and timings of the bcrypt thread pool [get]
+"""
+class PoolStats(BaseModel):
+    pool_size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    max_overflow: int
+    checkouts: int
+    average_wait_ms: float
+    max_wait_ms: float
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    hit_rate: float
+
+class EmbeddingCacheStats(CacheStats):
+    store_enabled: bool
+    store_hits: int
+
+class PasswordHashingStats(BaseModel):
+    workers: int
+    max_pending: int
+    pending: int
+    running: int
+    queued: int
+    peak_pending: int
+    completed: int
+    rejected: int
+    avg_wait_ms: float
+    max_wait_ms: float
+    avg_hash_ms: float
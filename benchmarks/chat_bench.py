@@ -0,0 +1,88 @@
+"""
+chat_bench.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Chat completion throughput benchmark ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+Sends N concurrent completions through one event loop (like one api worker) against the local fake
+OpenAI server, comparing:
+    - per-request sync client: a new OpenAI() per call and a blocking create(), how /chat used to work,
+      every call freezes the loop so the calls run one after another
+    - shared async client: app.LLMdatapipeline.openai_client.complete, the calls overlap
+
+usage (from the repo root, with the normal .env present):
+    python -m benchmarks.chat_bench --requests 50 --latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from openai import OpenAI
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("fake OpenAI server did not start")
+
+
+async def sync_client_run(base_url: str, requests: int):
+    async def one():
+        client = OpenAI(api_key="bench", base_url=base_url)
+        client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+    await asyncio.gather(*[one() for _ in range(requests)])
+
+
+async def async_client_run(requests: int):
+    from app.LLMdatapipeline.openai_client import complete, openai_client
+    await asyncio.gather(*[complete("hi") for _ in range(requests)])
+    await openai_client.close()
+
+
+def timed(label: str, requests: int, coroutine):
+    start = time.perf_counter()
+    asyncio.run(coroutine)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f} s   {requests / elapsed:8.1f} completions/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_openai_server", "--port", str(port), "--latency-ms", str(args.latency_ms)
+    ])
+    try:
+        wait_for_server(port)
+        base_url = f"http://127.0.0.1:{port}/v1"
+        #must be set before app.config is imported by the async run
+        os.environ["OPENAI_BASE_URL"] = base_url
+
+        print(f"{args.requests} concurrent completions, {args.latency_ms:.0f} ms fake latency")
+        timed("per-request sync client", args.requests, sync_client_run(base_url, args.requests))
+        timed("shared async client", args.requests, async_client_run(args.requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+fake_openai_server.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Local fake of the OpenAI chat API ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+Answers POST /v1/chat/completions like OpenAI would, after a fixed delay, so chat throughput can
+be measured without an API key, network jitter or cost. stream=true is answered with server-sent
+events, one chunk per word, spread over the same delay.
+
+usage:
+    python -m benchmarks.fake_openai_server --port 8099 --latency-ms 500
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+ANSWER = "Mount Finlayson is a steep but rewarding hike near Victoria with great views of the Saanich Inlet."
+
+app = FastAPI()
+app.state.latency = 0.5
+
+
+def completion_chunk(completion_id: str, model: str, content=None, finish_reason=None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": content} if content is not None else {}, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-3.5-turbo")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    latency = app.state.latency
+
+    if body.get("stream"):
+        words = ANSWER.split(" ")
+
+        async def events():
+            for i, word in enumerate(words):
+                await asyncio.sleep(latency / len(words))
+                yield completion_chunk(completion_id, model, word if i == 0 else f" {word}")
+            yield completion_chunk(completion_id, model, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+    }
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    app.state.latency = args.latency_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+jwt_bench.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ JWT verification benchmark ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+Cost of verifying one bearer token (what every protected request pays) with:
+    - jose:        python-jose's jwt.decode, how verify_token used to work
+    - hmac:        the standard library HS256 backend (JWT_BACKEND=hmac)
+    - cached jose / cached hmac: app.oauth2.decode_token after the first request, a sha256 of the
+      token and a cache lookup
+
+usage (from the repo root, with the normal .env present):
+    python -m benchmarks.jwt_bench --iterations 20000
+"""
+import argparse
+import time
+
+from app import oauth2
+from app.cache import TTLCache
+
+
+def timed(label: str, iterations: int, function, token: str):
+    function(token)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(token)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} {elapsed / iterations * 1e6:8.1f} us/token   {iterations / elapsed:10.0f} tokens/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare JWT decoding backends and the token cache")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = oauth2.create_access_token(data={"user_id": 1})
+    backends = {
+        "jose": oauth2.JoseBackend(oauth2.SECRET_KEY, oauth2.ALGORITHM),
+        "hmac": oauth2.HmacBackend(oauth2.SECRET_KEY, oauth2.ALGORITHM),
+    }
+    for name, backend in backends.items():
+        timed(name, args.iterations, backend.decode, token)
+
+    for name, backend in backends.items():
+        oauth2.jwt_backend = backend
+        oauth2.token_cache = TTLCache(maxsize=100, ttl=oauth2.ACCESS_TOKEN_EXPIRE_MIN * 60)
+        timed(f"cached {name}", args.iterations, oauth2.decode_token, token)
+
+
+if __name__ == "__main__":
+    main()
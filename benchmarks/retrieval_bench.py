@@ -0,0 +1,111 @@
+"""
+retrieval_bench.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Hike retrieval benchmark ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+Top 3 search latency of the retrieval backends (app/LLMdatapipeline/retrieval.py) for random
+384 dimension corpora of several sizes:
+    - numpy:  the memory-mapped NumPy index, in process
+    - qdrant: a Qdrant collection, on the server given with --qdrant-host (the real network hop),
+              otherwise qdrant_client's local in-memory mode (no network, so a lower bound)
+
+Both backends are checked to return the same top hit before timing. collected_data.json holds
+60 hikes, the larger sizes show where the brute force scan stops being the cheaper option.
+
+usage (from the repo root, with the normal .env present):
+    python -m benchmarks.retrieval_bench
+    python -m benchmarks.retrieval_bench --sizes 100 1000 10000 100000 --queries 200 --qdrant-host localhost
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from app.LLMdatapipeline.retrieval import NumpyIndex, QdrantBackend
+
+DIMENSIONS = 384
+COLLECTION_NAME = "retrieval_bench"
+
+
+def corpus(size: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(size, DIMENSIONS)).astype(np.float32)
+    ids = [str(uuid.UUID(int=i)) for i in range(size)]
+    payloads = [{"hike_name": f"hike {i}"} for i in range(size)]
+    return ids, vectors, payloads
+
+
+def qdrant_backend(client, ids, vectors, payloads) -> QdrantBackend:
+    from qdrant_client.models import Batch, Distance, VectorParams
+    if client.collection_exists(COLLECTION_NAME):
+        client.delete_collection(COLLECTION_NAME)
+    client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=VectorParams(size=DIMENSIONS, distance=Distance.COSINE),
+    )
+    for start in range(0, len(ids), 1000):
+        end = start + 1000
+        client.upsert(
+            collection_name=COLLECTION_NAME,
+            points=Batch(ids=ids[start:end], vectors=vectors[start:end].tolist(), payloads=payloads[start:end]),
+            wait=True,
+        )
+    return QdrantBackend(client, COLLECTION_NAME)
+
+
+def timed_searches(backend, queries) -> list:
+    backend.search(queries[0], 3)  #warm up (mmap pages, connections)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        backend.search(query, 3)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label: str, size: int, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<8} {size:>8}   p50 {statistics.median(latencies):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the NumPy index and Qdrant")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60, 1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--qdrant-host", default=None, help="benchmark a Qdrant server instead of the local mode")
+    parser.add_argument("--qdrant-port", type=int, default=6333)
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    if args.qdrant_host:
+        client = QdrantClient(host=args.qdrant_host, port=args.qdrant_port)
+        print(f"qdrant: server at {args.qdrant_host}:{args.qdrant_port}")
+    else:
+        client = QdrantClient(":memory:")
+        print("qdrant: local in-memory mode (no network hop)")
+
+    queries = np.random.default_rng(1).normal(size=(args.queries, DIMENSIONS)).astype(np.float32).tolist()
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            ids, vectors, payloads = corpus(size)
+            NumpyIndex.write(Path(directory) / f"index_{size}", ids, vectors, payloads)
+            numpy_index = NumpyIndex(Path(directory) / f"index_{size}")
+            qdrant = qdrant_backend(client, ids, vectors, payloads)
+
+            if numpy_index.search(queries[0], 1)[0].id != qdrant.search(queries[0], 1)[0].id:
+                raise RuntimeError(f"backends disagree on the top hit for {size} vectors")
+
+            report("numpy", size, timed_searches(numpy_index, queries))
+            report("qdrant", size, timed_searches(qdrant, queries))
+
+    if client.collection_exists(COLLECTION_NAME):
+        client.delete_collection(COLLECTION_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+s3_client_bench.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ S3 client microbenchmark ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+Measures the per call overhead of building a new boto3 S3 client for every request (how
+upload_file / delete_file_from_s3 used to work) against the shared client from app.aws.get_s3_client
+
+Runs against moto's in-process S3 stand-in so no AWS account or network is needed, which means
+the numbers are mostly client construction + request signing, the part the shared client removes.
+
+usage (from the repo root, with the normal .env present):
+    pip install "moto[s3]"
+    python -m benchmarks.s3_client_bench --calls 200
+"""
+import argparse
+import io
+import os
+import time
+
+os.environ.pop("AWS_ENDPOINT_URL", None) #make sure every client talks to moto
+
+from moto import mock_aws
+import boto3
+
+from app.config import settings
+from app import aws
+
+BUCKET = "roamly-bench"
+
+
+def fresh_client_call(key: str, body: bytes):
+    s3 = boto3.client(
+        "s3",
+        region_name=settings.AWS_REGION,
+        aws_access_key_id=settings.AWS_ACCESS_KEY,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+    )
+    s3.upload_fileobj(io.BytesIO(body), BUCKET, key)
+    s3.delete_object(Bucket=BUCKET, Key=key)
+
+
+def shared_client_call(key: str, body: bytes):
+    aws.upload_fileobj(io.BytesIO(body), key, "image/jpeg", bucket=BUCKET)
+    aws.get_s3_client().delete_object(Bucket=BUCKET, Key=key)
+
+
+def run(name, call, calls: int, body: bytes) -> float:
+    call("warmup", body)
+    start = time.perf_counter()
+    for i in range(calls):
+        call(f"bench/{name}/{i}.jpg", body)
+    per_call_ms = (time.perf_counter() - start) / calls * 1000
+    print(f"{name:<16} {per_call_ms:8.2f} ms/call")
+    return per_call_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=64)
+    args = parser.parse_args()
+    body = os.urandom(args.size_kb * 1024)
+
+    with mock_aws():
+        aws._s3_client = None #build the shared client inside the mock
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+
+        print(f"{args.calls} upload+delete calls of {args.size_kb} KB against moto")
+        fresh = run("fresh client", fresh_client_call, args.calls, body)
+        shared = run("shared client", shared_client_call, args.calls, body)
+        print(f"overhead removed: {fresh - shared:.2f} ms/call ({fresh / shared:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
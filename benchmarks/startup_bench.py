@@ -0,0 +1,75 @@
+"""
+startup_bench.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ API startup benchmark ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+Measures what an api worker pays before it can serve a request: the wall time and peak RSS of
+importing app.main in a fresh interpreter, and which heavy ML packages that import pulled in.
+
+Each run is a separate python process so nothing is cached between runs. The models are loaded
+lazily (see app/LLMdatapipeline/LLMutils.py), so none of HEAVY_MODULES should show up, the
+script exits with status 1 if one does.
+
+usage (from the repo root, with the normal .env present):
+    python -m benchmarks.startup_bench --runs 5
+    python -m benchmarks.startup_bench --load-model   #also time the first get_embedding_model()
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter() - start
+model_seconds = None
+if {load_model}:
+    from app.LLMdatapipeline.LLMutils import get_embedding_model
+    start = time.perf_counter()
+    get_embedding_model()
+    model_seconds = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": imported,
+    "model_seconds": model_seconds,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [name for name in {heavy} if name in sys.modules],
+}}))
+"""
+
+
+def run_probe(load_model: bool) -> dict:
+    code = PROBE.format(load_model=load_model, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--load-model", action="store_true")
+    args = parser.parse_args()
+
+    results = [run_probe(args.load_model) for _ in range(args.runs)]
+
+    import_times = [result["import_seconds"] * 1000 for result in results]
+    rss = [result["max_rss_mb"] for result in results]
+    print(f"import app.main   median {statistics.median(import_times):8.1f} ms   min {min(import_times):8.1f} ms")
+    print(f"peak RSS          median {statistics.median(rss):8.1f} MB")
+    if args.load_model:
+        model_times = [result["model_seconds"] * 1000 for result in results]
+        print(f"first model load  median {statistics.median(model_times):8.1f} ms")
+
+    heavy = sorted({name for result in results for name in result["heavy_modules"]})
+    if heavy and not args.load_model:
+        print(f"FAIL: importing app.main loaded {', '.join(heavy)}")
+        sys.exit(1)
+    print("no ML packages imported at startup" if not heavy else f"loaded after first use: {', '.join(heavy)}")
+
+
+if __name__ == "__main__":
+    main()
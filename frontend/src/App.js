@@ -542,12 +542,18 @@ function AdventureDetail() {
   const [adventure, setAdventure] = useState(null);
   const [images, setImages] = useState([]);
   const [comments, setComments] = useState([]);
+  const [commentsCursor, setCommentsCursor] = useState(null);
   const [newComment, setNewComment] = useState("");
 
-  const fetchComments = useCallback(() => {
-    fetch(`${API_BASE}/adventure/${id}/comments`)
-      .then((res) => res.json())
-      .then((data) => setComments(data))
+  // comments are paginated, the next page starts after the X-Next-Cursor of the previous one
+  const fetchComments = useCallback((cursor = null) => {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+    fetch(`${API_BASE}/adventure/${id}/comments${query}`)
+      .then((res) => {
+        setCommentsCursor(res.headers.get("X-Next-Cursor"));
+        return res.json();
+      })
+      .then((data) => setComments((previous) => (cursor ? [...previous, ...data] : data)))
       .catch((err) => console.error("Error fetching comments:", err));
   }, [id]);
 
@@ -589,6 +595,7 @@ function AdventureDetail() {
 
     if (res.ok) {
       setNewComment("");
+      setAdventure((previous) => ({ ...previous, comment_count: previous.comment_count + 1 }));
       fetchComments();
     } else {
       const err = await res.json();
@@ -615,7 +622,7 @@ function AdventureDetail() {
         {adventure.description}
       </p>
 
-      <h2 className="text-2xl font-semibold mt-10 mb-4">Comments</h2>
+      <h2 className="text-2xl font-semibold mt-10 mb-4">Comments ({adventure.comment_count})</h2>
 
       <div className="mb-6">
         <textarea
@@ -643,6 +650,14 @@ function AdventureDetail() {
         ) : (
           <p className="text-gray-500">No comments yet.</p>
         )}
+        {commentsCursor && (
+          <button
+            onClick={() => fetchComments(commentsCursor)}
+            className="text-blue-600 hover:underline"
+          >
+            Load more comments
+          </button>
+        )}
       </div>
     </div>
   );
@@ -21,7 +21,7 @@ function ChatSidebar({ isOpen, onClose }) {
     setIsLoading(true);
 
     try {
-      const res = await fetch("http://3.23.70.81:8000/chat", {
+      const res = await fetch("http://3.23.70.81:8000/chat/stream", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -29,9 +29,34 @@ function ChatSidebar({ isOpen, onClose }) {
         },
         body: JSON.stringify({ query }),
       });
+      if (!res.ok || !res.body) throw new Error("chat request failed");
 
-      const data = await res.json();
-      setMessages((prev) => [...prev, { from: "ai", text: data.response }]);
+      // the answer arrives as server-sent events, append each token to one ai message
+      setMessages((prev) => [...prev, { from: "ai", text: "" }]);
+      setIsLoading(false);
+      const appendToAnswer = (token) =>
+        setMessages((prev) => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, text: last.text + token }];
+        });
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const event of events) {
+          const lines = event.split("\n");
+          const name = lines.find((line) => line.startsWith("event: "))?.slice(7) || "message";
+          const data = JSON.parse(lines.find((line) => line.startsWith("data: ")).slice(6));
+          if (name === "message") appendToAnswer(data.token);
+          if (name === "error") throw new Error(data.detail);
+        }
+      }
     } catch (err) {
       setMessages((prev) => [...prev, { from: "system", text: " Failed to fetch response." }]);
     } finally {
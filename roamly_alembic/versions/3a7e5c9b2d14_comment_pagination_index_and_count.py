@@ -0,0 +1,39 @@
+"""comment pagination index and comment_count
+
+Revision ID: 3a7e5c9b2d14
+Revises: 8c4d2e6f1a93
+Create Date: 2026-10-18 17:03:41.266890
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a7e5c9b2d14'
+down_revision: Union[str, None] = '8c4d2e6f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('comments_adventure_id_created_at_idx', 'comments', ['adventure_id', 'created_at', 'comment_id'], unique=False)
+    op.add_column('adventures', sa.Column('comment_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    #count the comments that already exist
+    op.execute(
+        """
+        UPDATE adventures
+        SET comment_count = counts.comments
+        FROM (SELECT adventure_id, count(*) AS comments FROM comments GROUP BY adventure_id) AS counts
+        WHERE adventures.adventure_id = counts.adventure_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('adventures', 'comment_count')
+    op.drop_index('comments_adventure_id_created_at_idx', table_name='comments')
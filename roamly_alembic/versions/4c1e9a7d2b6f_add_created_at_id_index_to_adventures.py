@@ -0,0 +1,33 @@
+"""add created_at id index to adventures for feed keyset pagination
+
+Revision ID: 4c1e9a7d2b6f
+Revises: 381597a4f258
+Create Date: 2026-10-18 10:12:41.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1e9a7d2b6f'
+down_revision: Union[str, None] = '381597a4f258'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'adventures_created_at_id_idx',
+        'adventures',
+        [sa.text('created_at DESC'), 'adventure_id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('adventures_created_at_id_idx', table_name='adventures')
@@ -0,0 +1,42 @@
+"""content addressed image blobs
+
+Revision ID: 5d9f1b3e8a47
+Revises: e2a8c4f17d90
+Create Date: 2026-10-18 14:05:33.918260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d9f1b3e8a47'
+down_revision: Union[str, None] = 'e2a8c4f17d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('object_name', sa.String(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), server_default=sa.text('1'), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('sha256'),
+    sa.UniqueConstraint('object_name')
+    )
+    op.add_column('images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_images_content_hash'), 'images', ['content_hash'], unique=False)
+    #identical uploads share one object, so several rows can have the same url
+    op.drop_constraint('images_url_key', 'images', type_='unique')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_unique_constraint('images_url_key', 'images', ['url'])
+    op.drop_index(op.f('ix_images_content_hash'), table_name='images')
+    op.drop_column('images', 'content_hash')
+    op.drop_table('image_blobs')
@@ -0,0 +1,37 @@
+"""add like_count to adventures
+
+Revision ID: 8c4d2e6f1a93
+Revises: 5d9f1b3e8a47
+Create Date: 2026-10-18 16:12:07.402318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4d2e6f1a93'
+down_revision: Union[str, None] = '5d9f1b3e8a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('adventures', sa.Column('like_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    #count the likes that already exist
+    op.execute(
+        """
+        UPDATE adventures
+        SET like_count = counts.likes
+        FROM (SELECT adventure_id, count(*) AS likes FROM likes GROUP BY adventure_id) AS counts
+        WHERE adventures.adventure_id = counts.adventure_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('adventures', 'like_count')
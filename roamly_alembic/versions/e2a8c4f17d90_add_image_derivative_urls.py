@@ -0,0 +1,30 @@
+"""add image derivative urls
+
+Revision ID: e2a8c4f17d90
+Revises: b7d3f0a91c25
+Create Date: 2026-10-18 12:40:51.204417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a8c4f17d90'
+down_revision: Union[str, None] = 'b7d3f0a91c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('images', sa.Column('thumbnail_url', sa.String(), nullable=True))
+    op.add_column('images', sa.Column('webp_url', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('images', 'webp_url')
+    op.drop_column('images', 'thumbnail_url')
@@ -7,7 +7,7 @@ conftest.py
 
 -Code sets up the test communication with the testing database:
 
-Creates a client pytest fixture that replaces the get_gb object used by the main code to be a testing object that works
+Creates a client pytest fixture that replaces the get_async_db object used by the main code to be a testing object that works
 with the testing database, to do this it calls the session fixture which drops the current testing database
 to reset it and build a new one with the neccessary stuff like gin for trigram indexing on fuzzy searches for adventure title
 to mimic real database.
@@ -19,13 +19,16 @@ import pytest
 from app.main import app
 from app import models
 from app.config import settings
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, event
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.database import get_gb, Base
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import NullPool
+from app.database import get_async_db, acquire_connection, Base
+from app.oauth2 import principal_cache
 from fastapi import status, HTTPException
 
 #----------------------------------[ CREATE TEST USER DATABASE]----------------------------------
-SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}/{settings.DATABASE_NAME}_test"
+SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}_test"
 
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
@@ -36,6 +39,19 @@ TestingSessionLocal = sessionmaker(
     bind= engine
 )
 
+#TestClient runs each request on its own event loop, so asyncpg connections cannot be pooled between requests
+SQLALCHEMY_ASYNC_DATABASE_URL = f"postgresql+asyncpg://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}_test"
+
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=NullPool)
+
+TestingAsyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    bind= async_engine
+)
+
 @pytest.fixture()
 def session():
     with engine.connect() as connection:
@@ -58,13 +74,14 @@ def session():
 
 @pytest.fixture()
 def client(session):
-    def override_get_gb():
-        try:
-            yield session
-        finally:
-            session.close()
-
-    app.dependency_overrides[get_gb] = override_get_gb
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            await acquire_connection(db)
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    #user ids restart at 1 with every fresh database
+    principal_cache.clear()
     yield TestClient(app)
 #----------------------------------[ CREATE USER IN DATABASE]----------------------------------
 @pytest.fixture
@@ -180,5 +197,44 @@ def test_comments(client, session, test_adventures, test_user):
     ]
     image_map = [models.Comments(**comment) for comment in comments]
     session.add_all(image_map)
+    #keep the denormalized counters in step, like the comment endpoints do
+    for adventure in test_adventures:
+        adventure.comment_count = sum(comment["adventure_id"] == adventure.adventure_id for comment in comments)
+    session.commit()
+    return image_map
+
+#----------------------------------[ COUNT SQL STATEMENTS ]----------------------------------
+"""
+Counts the SQL statements the api sends to the testing database, used to catch N+1 queries
+"""
+@pytest.fixture
+def statement_counter():
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+#----------------------------------[ CREATE FEED IN DATABASE]----------------------------------
+@pytest.fixture
+def test_feed(session):
+    """
+    12 adventures each posted by a diffrent user, so every owner in a page is distinct
+    """
+    users = [
+        models.Users(username=f"feed_user{i}", email=f"feed_user{i}@gmail.com", password="irrelevant")
+        for i in range(12)
+    ]
+    session.add_all(users)
+    session.commit()
+
+    adventures = [
+        models.Adventures(title=f"feed adventure {i}", description="feed description", owner_id=user.user_id)
+        for i, user in enumerate(users)
+    ]
+    session.add_all(adventures)
     session.commit()
-    return image_map
\ No newline at end of file
+    return adventures
@@ -8,6 +8,8 @@ from fastapi import status, HTTPException
 from app import schemas
 from app import models
 from app import oauth2
+from app import aws
+from botocore.exceptions import ClientError
 
 import pytest
 #----------------------------------[ TEST GET /adventures ]----------------------------------
@@ -52,6 +54,44 @@ def test_get_adventure_invalid_limit(client):
     result = client.get("/adventure/", params={"limit": -1})
     assert result.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
+def test_get_adventure_statement_count_constant(client, test_feed, statement_counter):
+    #owners are eager loaded, so a bigger page must not issue more statements
+    counts = []
+    for limit in [1, 5, 12]:
+        statement_counter.clear()
+        result = client.get("/adventure/", params={"limit": limit})
+        assert result.status_code == status.HTTP_200_OK
+        assert len({adventure['owner']['user_id'] for adventure in result.json()}) == limit
+        counts.append(len(statement_counter))
+    assert counts[0] == counts[1] == counts[2]
+
+def test_get_adventure_cursor_pagination(client, test_feed):
+    offset_result = client.get("/adventure/", params={"limit": 12})
+    expected_ids = [adventure['adventure_id'] for adventure in offset_result.json()]
+
+    seen_ids = []
+    params = {"limit": 5}
+    while True:
+        result = client.get("/adventure/", params=params)
+        assert result.status_code == status.HTTP_200_OK
+        seen_ids += [adventure['adventure_id'] for adventure in result.json()]
+        next_cursor = result.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        params = {"limit": 5, "cursor": next_cursor}
+
+    assert seen_ids == expected_ids
+    assert len(seen_ids) == 12
+
+@pytest.mark.parametrize("parameters", [
+    {"cursor": "not-a-cursor"},
+    {"cursor": "eyJhIjogMX0="}, #valid base64 but missing fields
+    {"cursor": "eyJhIjogMX0=", "search": "feed"},
+])
+def test_get_adventure_invalid_cursor(client, test_feed, parameters):
+    result = client.get("/adventure/", params=parameters)
+    assert result.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
 
 
 #----------------------------------[ TEST POST /adventures ]----------------------------------
@@ -82,6 +122,39 @@ def test_posting_adventure(client, session, test_adventures, test_user):
     image_query = session.query(models.Images).filter(models.Images.adventure_id == 5).all()
     assert len(image_query) == 4
 
+def test_posting_adventure_upload_failure_rolls_back(client, session, test_adventures, test_user, monkeypatch):
+    uploaded = []
+    deleted = []
+
+    def fake_upload_fileobj(fileobj, object_name, content_type, bucket):
+        if object_name.endswith("image3.jpg"):
+            raise ClientError({"Error": {"Code": "500", "Message": "upload failed"}}, "PutObject")
+        uploaded.append(object_name)
+
+    monkeypatch.setattr(aws, "upload_fileobj", fake_upload_fileobj)
+    monkeypatch.setattr(aws, "delete_files_from_s3", lambda urls: deleted.extend(urls) or [])
+
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    data = {
+        "title": "an adventure that fails to upload",
+        "description": "one of the images will not make it to S3",
+        "caption": ["caption 1", "caption 2", "caption 3", "caption 4"]
+    }
+    files = [
+        ("images", ("image1.jpg", b"file_content_1", "image/jpeg")),
+        ("images", ("image2.jpg", b"file_content_2", "image/jpeg")),
+        ("images", ("image3.jpg", b"file_content_3", "image/jpeg")),
+        ("images", ("image4.jpg", b"file_content_4", "image/jpeg")),
+    ]
+
+    result = client.post("/adventure/", data=data, files=files, headers=jwt)
+    assert result.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert len(uploaded) == 3
+    assert sorted(deleted) == sorted(aws.s3_url(object_name) for object_name in uploaded)
+    adventure_query = session.query(models.Adventures).filter(models.Adventures.title == data["title"]).first()
+    assert not adventure_query
+    assert session.query(models.Images).count() == 0
+
 def test_invalid_adventure_too_few_captions(client, test_adventures, test_user):
     jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
 
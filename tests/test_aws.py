@@ -0,0 +1,45 @@
+"""
+test_aws.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for aws functions ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+from botocore.exceptions import ClientError
+
+from app import aws
+#----------------------------------[ TEST delete_files_from_s3 ]----------------------------------
+
+class FakeS3Client:
+    def __init__(self, fail_bucket=None):
+        self.calls = []
+        self.fail_bucket = fail_bucket
+
+    def delete_objects(self, Bucket, Delete):
+        self.calls.append((Bucket, [obj["Key"] for obj in Delete["Objects"]]))
+        if Bucket == self.fail_bucket:
+            raise ClientError({"Error": {"Code": "NoSuchBucket", "Message": "missing"}}, "DeleteObjects")
+        return {}
+
+def test_delete_files_from_s3_batches(monkeypatch):
+    fake_client = FakeS3Client()
+    monkeypatch.setattr(aws, "get_s3_client", lambda: fake_client)
+
+    urls = [f"https://bucket-a.s3.us-east-1.amazonaws.com/adventures/1/{i}.jpg" for i in range(2500)]
+    urls.append("https://bucket-b.s3.us-east-1.amazonaws.com/adventures/2/0.jpg")
+
+    failed = aws.delete_files_from_s3(urls)
+    assert failed == []
+    assert [(bucket, len(keys)) for bucket, keys in fake_client.calls] == [
+        ("bucket-a", 1000), ("bucket-a", 1000), ("bucket-a", 500), ("bucket-b", 1)
+    ]
+    assert fake_client.calls[0][1][0] == "adventures/1/0.jpg"
+
+def test_delete_files_from_s3_reports_failures(monkeypatch):
+    fake_client = FakeS3Client(fail_bucket="bucket-b")
+    monkeypatch.setattr(aws, "get_s3_client", lambda: fake_client)
+
+    urls = [
+        "https://bucket-a.s3.us-east-1.amazonaws.com/adventures/1/0.jpg",
+        "https://bucket-b.s3.us-east-1.amazonaws.com/adventures/2/0.jpg",
+    ]
+    assert aws.delete_files_from_s3(urls) == [urls[1]]
@@ -0,0 +1,95 @@
+"""
+test_chat.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for chat ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from app.LLMdatapipeline import openai_client
+from app.routers import chat
+from benchmarks import fake_openai_server
+
+def fake_openai(latency=0.0):
+    fake_openai_server.app.state.latency = latency
+    return AsyncOpenAI(
+        api_key="test",
+        base_url="http://fake-openai/v1",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_openai_server.app)),
+    )
+
+def test_complete_returns_answer(monkeypatch):
+    monkeypatch.setattr(openai_client, "openai_client", fake_openai())
+    answer = asyncio.run(openai_client.complete("easy hikes near victoria"))
+    assert answer == fake_openai_server.ANSWER
+
+
+def test_completions_do_not_block_each_other(monkeypatch):
+    monkeypatch.setattr(openai_client, "openai_client", fake_openai(latency=0.2))
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(*[openai_client.complete("hi") for _ in range(5)])
+        return asyncio.get_running_loop().time() - start
+
+    #sequential calls would take 1 second
+    assert asyncio.run(run()) < 0.6
+
+
+#----------------------------------[ TEST POST /chat/stream ]----------------------------------
+
+class FakeHit:
+    def __init__(self, id):
+        self.id = id
+        self.payload = {"hike_name": f"hike {id}", "distance": "5 km", "time_to_complete": "2 hours", "summary": "nice"}
+
+class FakeRetriever:
+    name = "fake"
+
+    def search(self, vector, limit):
+        return [FakeHit(1), FakeHit(2), FakeHit(3)][:limit]
+
+@pytest.fixture
+def fake_chat(monkeypatch):
+    async def embed(text):
+        return [1.0, 0.0, 0.0]
+    monkeypatch.setattr(chat, "retriever", FakeRetriever())
+    monkeypatch.setattr(chat.query_embedder, "embed", embed)
+    monkeypatch.setattr(openai_client, "openai_client", fake_openai())
+    chat.response_cache.clear()
+    yield
+    chat.response_cache.clear()
+
+def read_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+def test_chat_stream(client, test_user, fake_chat):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    result = client.post("/chat/stream", json={"query": "easy hikes near victoria"}, headers=jwt)
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith("text/event-stream")
+
+    events = read_events(result.text)
+    tokens = [data["token"] for event, data in events if event == "message"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == fake_openai_server.ANSWER
+    assert events[-1][0] == "done"
+
+    #the streamed answer was cached and is sent in one chunk the next time
+    events = read_events(client.post("/chat/stream", json={"query": "easy hikes near victoria"}, headers=jwt).text)
+    assert events[0] == ("message", {"token": fake_openai_server.ANSWER})
+
+
+def test_chat_stream_query_too_long(client, test_user, fake_chat):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    result = client.post("/chat/stream", json={"query": "x" * 501}, headers=jwt)
+    assert result.status_code == 400
@@ -22,6 +22,15 @@ def test_post_comment(client, session, test_user, test_adventures):
     comment_query = session.query(Comments).filter(Comments.comment == comment_str)
     assert comment_query
 
+def test_post_comments_with_cached_user(client, session, test_user, test_adventures):
+    #the second request gets the user from the principal cache, it must not be inserted again
+    jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
+    for comment_str in ["first comment", "second comment"]:
+        result = client.post('/adventure/1/comments', json={'comment': comment_str}, headers =jwt)
+        assert result.status_code == status.HTTP_201_CREATED
+        assert result.json()["owner"]["username"] == test_user["username"]
+    assert session.query(Comments).count() == 2
+
 def test_invalid_adventure_id_post_comment(client, session,test_user, test_adventures):
     jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
     data = {
@@ -62,4 +71,69 @@ def test_invalid_user_delete_comment(client, session, test_adventures, test_comm
 
 #----------------------------------[ TEST PUT /adventure/comment/{comment_id} ]----------------------------------
 
-#Currently the program does not call for updating comments
\ No newline at end of file
+#Currently the program does not call for updating comments
+#----------------------------------[ TEST comment pagination ]----------------------------------
+
+def make_comments(session, test_user, count):
+    #one transaction, so every comment has the same created_at and the id breaks the tie
+    session.add_all([Comments(comment=f"comment {i}", adventure_id=1, owner_id=test_user['user_id']) for i in range(count)])
+    session.commit()
+
+def test_get_adventure_comments_pages(client, session, test_user, test_adventures):
+    make_comments(session, test_user, 7)
+    seen = []
+    cursor = None
+    for expected_size in [3, 3, 1]:
+        url = "/adventure/1/comments?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        result = client.get(url)
+        assert result.status_code == status.HTTP_200_OK
+        assert len(result.json()) == expected_size
+        seen += [comment["comment"] for comment in result.json()]
+        cursor = result.headers.get("X-Next-Cursor")
+    assert cursor is None
+    assert seen == [f"comment {i}" for i in range(7)]
+
+
+def test_get_adventure_comments_statement_count(client, session, test_user, test_adventures, statement_counter):
+    make_comments(session, test_user, 10)
+    other_user = {"Authorization": f"bearer {create_access_token(data={'user_id': 2})}"}
+    for _ in range(3):
+        client.post('/adventure/1/comments', json={'comment': 'from another user'}, headers=other_user)
+
+    statement_counter.clear()
+    result = client.get("/adventure/1/comments?limit=13")
+    assert len({comment["owner"]["username"] for comment in result.json()}) == 2
+    #adventure check and one page with the owners joined in
+    assert len(statement_counter) == 2
+
+
+def test_get_adventure_comments_invalid_parameters(client, test_adventures):
+    assert client.get("/adventure/1/comments?cursor=not-a-cursor").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.get("/adventure/1/comments?limit=0").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.get("/adventure/1/comments?limit=101").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+#----------------------------------[ TEST comment_count ]----------------------------------
+
+def comment_count(client, adventure_id):
+    return client.get(f"/adventure/{adventure_id}").json()["comment_count"]
+
+def test_comment_count(client, session, test_user, test_adventures):
+    jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
+    for _ in range(2):
+        comment = client.post('/adventure/1/comments', json={'comment': 'hello'}, headers=jwt).json()
+    assert comment_count(client, 1) == 2
+
+    client.delete(f"/adventure/comment/{comment['comment_id']}", headers=jwt)
+    assert comment_count(client, 1) == 1
+    assert client.delete(f"/adventure/comment/{comment['comment_id']}", headers=jwt).status_code == status.HTTP_404_NOT_FOUND
+    assert comment_count(client, 1) == 1
+
+
+def test_delete_user_decrements_comment_count(client, session, test_user, test_adventures):
+    jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
+    other_user = {"Authorization": f"bearer {create_access_token(data={'user_id': 2})}"}
+    for headers in [jwt, jwt, other_user]:
+        client.post('/adventure/4/comments', json={'comment': 'hello'}, headers=headers)
+
+    client.delete(f"/user/{test_user['user_id']}", headers=jwt)
+    assert comment_count(client, 4) == 1
@@ -0,0 +1,218 @@
+"""
+test_embedding_service.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for the embedding service ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.cache import TTLCache
+from app.LLMdatapipeline.embedding_service import EmbeddingBatcher
+from app.LLMdatapipeline.embedding_cache import CachedEmbedder, SharedEmbeddingStore
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+def make_batcher(encoder, **kwargs):
+    return EmbeddingBatcher(encode=encoder, executor_factory=lambda: ThreadPoolExecutor(1), **kwargs)
+
+def test_concurrent_queries_are_batched():
+    encoder = FakeEncoder()
+    batcher = make_batcher(encoder, batch_window_ms=20, max_batch=32)
+    queries = [f"hike {'x' * i}" for i in range(10)]
+
+    async def run():
+        vectors = await asyncio.gather(*[batcher.embed(query) for query in queries])
+        await batcher.shutdown()
+        return vectors
+
+    vectors = asyncio.run(run())
+    assert vectors == [[float(len(query))] for query in queries]
+    assert encoder.calls == [queries]
+    assert batcher.batches == 1
+
+
+def test_batches_are_capped_at_max_batch():
+    encoder = FakeEncoder()
+    batcher = make_batcher(encoder, batch_window_ms=20, max_batch=4)
+
+    async def run():
+        await asyncio.gather(*[batcher.embed(str(i)) for i in range(10)])
+        await batcher.shutdown()
+
+    asyncio.run(run())
+    assert [len(call) for call in encoder.calls] == [4, 4, 2]
+
+
+def test_encode_error_is_raised_to_every_caller():
+    def failing_encode(texts):
+        raise RuntimeError("model crashed")
+    batcher = make_batcher(failing_encode, batch_window_ms=5)
+
+    async def run():
+        results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+        await batcher.shutdown()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_shutdown_finishes_pending_batches():
+    encoder = FakeEncoder()
+    batcher = make_batcher(encoder, batch_window_ms=1000)
+
+    async def run():
+        waiters = [asyncio.create_task(batcher.embed(text)) for text in ("a", "bb")]
+        await asyncio.sleep(0)
+        #the batch window has not passed yet, shutdown encodes what is waiting
+        await batcher.shutdown()
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(run()) == [[1.0], [2.0]]
+    assert not batcher._tasks
+
+
+def test_shutdown_cancels_batches_that_do_not_finish():
+    started = threading.Event()
+    release = threading.Event()
+    def slow_encode(texts):
+        started.set()
+        release.wait(5)
+        return [[0.0] for _ in texts]
+    batcher = make_batcher(slow_encode, batch_window_ms=1)
+
+    async def run():
+        waiter = asyncio.create_task(batcher.embed("a"))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        await batcher.shutdown(timeout=0.05)
+        results = await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        return results
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert not batcher._tasks
+
+#----------------------------------[ TEST embedding cache ]----------------------------------
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=120)
+    clock.now = 61
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_ttl_cache_peek_does_not_count_a_lookup():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=60, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.peek("a") == 1
+    #peek did not make a recently used, it is evicted first
+    cache.set("c", 3)
+    assert cache.peek("a") is None
+    clock.now = 61
+    assert cache.peek("b") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (0, 0, 1, 1)
+
+
+def counting_embed(calls):
+    async def embed(text):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return [float(len(text)), 0.5]
+    return embed
+
+def test_cached_embedder_normalizes_queries():
+    calls = []
+    embedder = CachedEmbedder(counting_embed(calls), TTLCache(maxsize=10, ttl=60))
+
+    async def run():
+        first = await embedder.embed("Easy hikes near   Victoria")
+        second = await embedder.embed("easy hikes near victoria ")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert calls == ["easy hikes near victoria"]
+    assert embedder.stats()["hits"] == 1
+
+
+def test_cached_embedder_coalesces_concurrent_misses():
+    calls = []
+    embedder = CachedEmbedder(counting_embed(calls), TTLCache(maxsize=10, ttl=60))
+
+    async def run():
+        return await asyncio.gather(*[embedder.embed("waterfalls") for _ in range(5)])
+
+    assert len(set(map(tuple, asyncio.run(run())))) == 1
+    assert calls == ["waterfalls"]
+
+
+def test_cached_embedder_survives_cancelled_leader():
+    calls = []
+    embedder = CachedEmbedder(counting_embed(calls), TTLCache(maxsize=10, ttl=60))
+
+    async def run():
+        leader = asyncio.create_task(embedder.embed("glaciers"))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(embedder.embed("glaciers")) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.wait_for(asyncio.gather(*followers), timeout=1)
+
+    vectors = asyncio.run(run())
+    assert vectors == [[8.0, 0.5]] * 3
+    #one follower embeds it again, the others wait on that one
+    assert calls == ["glaciers", "glaciers"]
+
+
+def test_shared_store_is_used_across_embedders(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    calls = []
+    worker_1 = CachedEmbedder(counting_embed(calls), TTLCache(maxsize=10, ttl=60), SharedEmbeddingStore(path, ttl=60))
+    worker_2 = CachedEmbedder(counting_embed(calls), TTLCache(maxsize=10, ttl=60), SharedEmbeddingStore(path, ttl=60))
+
+    vector_1 = asyncio.run(worker_1.embed("lakes"))
+    vector_2 = asyncio.run(worker_2.embed("Lakes"))
+    assert vector_1 == vector_2
+    assert calls == ["lakes"]
+    assert worker_2.stats()["store_hits"] == 1
+
+
+def test_embedding_cache_metrics(client):
+    result = client.get("/metrics/embedding-cache")
+    assert result.status_code == 200
+    assert {"hits", "misses", "hit_rate", "store_enabled"} <= result.json().keys()
@@ -5,9 +5,13 @@ test_images.py
 
 """
 import pytest
+from botocore.exceptions import ClientError
 from fastapi import status
 from app import models
 from app import schemas
+from app import image_store
+from app import aws
+from app.aws import s3_url
 from app.oauth2 import create_access_token
 #----------------------------------[ TEST POST /image ]----------------------------------
 
@@ -47,6 +51,91 @@ def test_invalid_post_image_id(client, session, test_adventures, test_user, adve
     image_query = session.query(models.Images).filter(models.Images.adventure_id == adventure_id).first()
     assert not image_query
 
+#----------------------------------[ TEST POST /image/upload-url ]----------------------------------
+
+def test_post_image_upload_url(client, test_adventures, test_user):
+    jwt = {"Authorization" : f"bearer {test_user["jwt_token"]}"}
+    data = {"filename": "view.jpg", "content_type": "image/jpeg"}
+    result = client.post("adventure/1/images/upload-url", json=data, headers=jwt)
+    assert result.status_code == status.HTTP_201_CREATED
+    upload = schemas.PresignedUpload(**result.json())
+    assert upload.object_name.startswith("adventures/1/")
+    assert upload.object_name.endswith("_view.jpg")
+    assert upload.fields["key"] == upload.object_name
+    assert upload.fields["Content-Type"] == "image/jpeg"
+
+@pytest.mark.parametrize("adventure_id, content_type, status_code", [
+    (6, "image/jpeg", status.HTTP_404_NOT_FOUND),
+    (1, "image/svg+xml", status.HTTP_422_UNPROCESSABLE_ENTITY),
+    (4, "image/webp", status.HTTP_403_FORBIDDEN), #other users adventure
+])
+def test_invalid_post_image_upload_url(client, test_adventures, test_user, adventure_id, content_type, status_code):
+    jwt = {"Authorization" : f"bearer {test_user["jwt_token"]}"}
+    data = {"filename": "view.jpg", "content_type": content_type}
+    result = client.post(f"adventure/{adventure_id}/images/upload-url", json=data, headers=jwt)
+    assert result.status_code == status_code
+
+#----------------------------------[ TEST POST /image/confirm ]----------------------------------
+
+@pytest.mark.parametrize("adventure_id, object_name, status_code", [
+    (6, "adventures/6/abc_view.jpg", status.HTTP_404_NOT_FOUND),
+    (4, "adventures/4/abc_view.jpg", status.HTTP_403_FORBIDDEN), #other users adventure
+    (1, "adventures/4/abc_view.jpg", status.HTTP_422_UNPROCESSABLE_ENTITY), #object of another adventure
+    (1, "adventures/1/../4/abc_view.jpg", status.HTTP_422_UNPROCESSABLE_ENTITY),
+])
+def test_invalid_post_image_confirm(client, session, test_adventures, test_user, adventure_id, object_name, status_code):
+    jwt = {"Authorization" : f"bearer {test_user["jwt_token"]}"}
+    data = {"object_name": object_name, "caption": "nice view"}
+    result = client.post(f"adventure/{adventure_id}/images/confirm", json=data, headers=jwt)
+    assert result.status_code == status_code
+    image_query = session.query(models.Images).filter(models.Images.adventure_id == adventure_id).first()
+    assert not image_query
+
+class FakeS3Client:
+    def __init__(self, object_names):
+        self.object_names = set(object_names)
+        self.heads = []
+
+    def head_object(self, Bucket, Key):
+        self.heads.append(Key)
+        if Key not in self.object_names:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": 14, "ContentType": "image/jpeg"}
+
+def test_post_image_confirm(client, session, test_adventures, test_user, monkeypatch):
+    object_name = "adventures/1/abc_view.jpg"
+    fake_client = FakeS3Client([object_name])
+    monkeypatch.setattr(aws, "get_s3_client", lambda: fake_client)
+    jwt = {"Authorization" : f"bearer {test_user["jwt_token"]}"}
+    data = {"object_name": object_name, "caption": "nice view"}
+
+    result = client.post("adventure/1/images/confirm", json=data, headers=jwt)
+    assert result.status_code == status.HTTP_201_CREATED
+    images = [schemas.ImageReturn(**image) for image in result.json()]
+    assert len(images) == 1
+    assert images[0].url == s3_url(object_name)
+    assert images[0].caption == "nice view"
+    assert fake_client.heads == [object_name]
+
+    image = session.query(models.Images).filter(models.Images.adventure_id == 1).one()
+    assert image.url == s3_url(object_name)
+    assert image.owner_id == test_user["user_id"]
+    assert session.query(models.Jobs).filter(models.Jobs.kind == "image_derivatives").count() == 1
+
+    #registering the same upload twice is refused
+    result = client.post("adventure/1/images/confirm", json=data, headers=jwt)
+    assert result.status_code == status.HTTP_409_CONFLICT
+    assert session.query(models.Images).count() == 1
+
+
+def test_post_image_confirm_missing_object(client, session, test_adventures, test_user, monkeypatch):
+    monkeypatch.setattr(aws, "get_s3_client", lambda: FakeS3Client([]))
+    jwt = {"Authorization" : f"bearer {test_user["jwt_token"]}"}
+    data = {"object_name": "adventures/1/abc_view.jpg", "caption": "nice view"}
+    result = client.post("adventure/1/images/confirm", json=data, headers=jwt)
+    assert result.status_code == status.HTTP_400_BAD_REQUEST
+    assert session.query(models.Images).count() == 0
+
 #----------------------------------[ TEST Put /image ]----------------------------------
 
 def test_put_images(client, test_user, test_images, session, test_adventures):
@@ -101,6 +190,70 @@ def test_delete_image_unauthorized(client, test_user, test_images, test_adventur
     result = client.delete(f"adventure/images/1", headers= jwt_header)
     assert result.status_code == status.HTTP_401_UNAUTHORIZED
 
+#----------------------------------[ TEST image deduplication ]----------------------------------
+
+def test_identical_images_stored_once(client, test_user, test_adventures, session):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    for filename in ("first.jpg", "repost.jpg"):
+        result = client.post(
+            "adventure/1/images",
+            data={"caption": "same photo"},
+            files={"image": (filename, b"identical_content", "image/jpeg")},
+            headers=jwt
+        )
+        assert result.status_code == status.HTTP_200_OK
+
+    images = session.query(models.Images).order_by(models.Images.image_id).all()
+    assert len(images) == 2
+    assert images[0].url == images[1].url
+    assert images[0].url.endswith("/first.jpg")
+    blob = session.query(models.ImageBlobs).one()
+    assert blob.ref_count == 2
+    #derivatives are only built once per content
+    assert session.query(models.Jobs).filter(models.Jobs.kind == "image_derivatives").count() == 1
+
+    #the object is still referenced by the repost
+    client.delete(f"adventure/images/{images[0].image_id}", headers=jwt)
+    session.expire_all()
+    assert session.query(models.ImageBlobs).one().ref_count == 1
+    assert session.query(models.Jobs).filter(models.Jobs.kind == "delete_s3_objects").count() == 0
+
+    client.delete(f"adventure/images/{images[1].image_id}", headers=jwt)
+    assert session.query(models.ImageBlobs).count() == 0
+    delete_job = session.query(models.Jobs).filter(models.Jobs.kind == "delete_s3_objects").one()
+    assert images[1].url in delete_job.payload["urls"]
+
+def test_concurrent_first_uploads_share_one_object(client, test_user, test_adventures, session, monkeypatch):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    real_upload_fileobjs = image_store.upload_fileobjs
+    deleted = []
+
+    async def upload_after_other_request(uploads):
+        #another request stores the same new content under its own filename after our lookup
+        sha256 = image_store.hash_fileobj(uploads[0][0])
+        session.add(models.ImageBlobs(sha256=sha256, object_name=f"images/{sha256}/first.jpg", ref_count=1))
+        session.commit()
+        await real_upload_fileobjs(uploads)
+
+    monkeypatch.setattr(image_store, "upload_fileobjs", upload_after_other_request)
+    monkeypatch.setattr(image_store, "delete_files_from_s3", lambda urls: deleted.extend(urls) or [])
+    result = client.post(
+        "adventure/1/images",
+        data={"caption": "same photo"},
+        files={"image": ("second.jpg", b"raced_content", "image/jpeg")},
+        headers=jwt
+    )
+    assert result.status_code == status.HTTP_200_OK
+
+    session.expire_all()
+    image = session.query(models.Images).one()
+    assert image.url.endswith("/first.jpg")
+    blob = session.query(models.ImageBlobs).one()
+    assert blob.ref_count == 2
+    assert len(deleted) == 1 and deleted[0].endswith("/second.jpg")
+    #the request that stored the content first builds the derivatives
+    assert session.query(models.Jobs).filter(models.Jobs.kind == "image_derivatives").count() == 0
+
 #----------------------------------[ TEST GET /image ]----------------------------------
 
 def test_get_images_success(client, test_images):
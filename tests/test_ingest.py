@@ -0,0 +1,135 @@
+"""
+test_ingest.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for the hike ingestion pipeline ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+import json
+
+import pytest
+
+from app.LLMdatapipeline.ingest import iter_json_array, ingest, hike_id, Progress, DEFAULT_DATA_PATH
+
+def make_hikes(count):
+    return [
+        {"Trail name": f"trail {i}", "Length": f"{i}km", "Elevation gain": "10m", "Estimated time": "1h", "Summary": f"summary {i}"}
+        for i in range(count)
+    ]
+
+class FakePoint:
+    def __init__(self, id, payload):
+        self.id = id
+        self.payload = payload
+
+class FakeQdrant:
+    def __init__(self):
+        self.requests = []
+        self.points = {}
+
+    def upsert(self, collection_name, points):
+        self.requests.append((collection_name, points))
+        for point_id, payload in zip(points.ids, points.payloads):
+            self.points[point_id] = payload
+
+    def scroll(self, collection_name, limit, offset, with_payload, with_vectors):
+        ids = sorted(self.points)
+        start = offset or 0
+        page = [FakePoint(point_id, {"content_hash": self.points[point_id].get("content_hash")}) for point_id in ids[start:start + limit]]
+        return page, (start + limit if start + limit < len(ids) else None)
+
+    def delete(self, collection_name, points_selector):
+        for point_id in points_selector.points:
+            del self.points[point_id]
+
+def fake_summarize(calls):
+    def summarize(texts):
+        calls.append(len(texts))
+        return [f"short {text}" for text in texts]
+    return summarize
+
+def fake_embed(calls):
+    def embed(texts):
+        calls.append(len(texts))
+        return [[float(len(text))] for text in texts]
+    return embed
+
+#----------------------------------[ TEST iter_json_array ]----------------------------------
+
+def test_iter_json_array_streams_objects(tmp_path):
+    hikes = make_hikes(25)
+    path = tmp_path / "hikes.json"
+    path.write_text(json.dumps(hikes, indent=2))
+    #chunks much smaller than one object
+    assert list(iter_json_array(path, chunk_chars=7)) == hikes
+
+
+def test_iter_json_array_reads_collected_data():
+    assert list(iter_json_array(DEFAULT_DATA_PATH)) == json.loads(DEFAULT_DATA_PATH.read_text())
+
+
+@pytest.mark.parametrize("content", ['{"a": 1}', '[{"a": 1}, 2]', '[{"a": 1}, {"b":'])
+def test_iter_json_array_rejects_invalid(tmp_path, content):
+    path = tmp_path / "hikes.json"
+    path.write_text(content)
+    with pytest.raises(ValueError):
+        list(iter_json_array(path))
+
+#----------------------------------[ TEST ingest ]----------------------------------
+
+def test_ingest_batches_model_calls_and_upserts():
+    client = FakeQdrant()
+    summarize_calls, embed_calls, reports = [], [], []
+
+    stats = ingest(
+        make_hikes(10), client,
+        summarize=fake_summarize(summarize_calls),
+        embed=fake_embed(embed_calls),
+        batch_size=4,
+        upsert_batch=3,
+        progress=Progress(report=reports.append)
+    )
+
+    assert stats.indexed == 10
+    assert summarize_calls == [4, 4, 2]
+    assert embed_calls == [4, 4, 2]
+    #each model batch is split into upsert requests of at most 3 points
+    assert [len(points.ids) for _, points in client.requests] == [3, 1, 3, 1, 2]
+    ids = [point_id for _, points in client.requests for point_id in points.ids]
+    assert ids == [hike_id(hike) for hike in make_hikes(10)]
+    assert client.requests[0][1].payloads[0]["summary"] == "short summary 0"
+    assert reports[-1].startswith("10 hikes indexed")
+
+
+def run_ingest(client, hikes, **kwargs):
+    calls = []
+    stats = ingest(hikes, client, summarize=fake_summarize(calls), embed=fake_embed([]), batch_size=4,
+                   progress=Progress(report=lambda line: None), **kwargs)
+    return stats, sum(calls)
+
+def test_reindex_only_changed_hikes():
+    client = FakeQdrant()
+    hikes = make_hikes(10)
+    stats, summarized = run_ingest(client, hikes)
+    assert (stats.indexed, stats.unchanged, stats.deleted, summarized) == (10, 0, 0, 10)
+
+    #same content in a different order, nothing to do
+    stats, summarized = run_ingest(client, list(reversed(hikes)))
+    assert (stats.indexed, stats.unchanged, stats.deleted, summarized) == (0, 10, 0, 0)
+
+    hikes[3]["Summary"] = "rewritten summary"
+    removed = hikes.pop(7)
+    hikes.append({**make_hikes(11)[10]})
+    stats, summarized = run_ingest(client, hikes)
+    assert (stats.indexed, stats.unchanged, stats.deleted, summarized) == (2, 8, 1, 2)
+    assert hike_id(removed) not in client.points
+    assert client.points[hike_id(hikes[3])]["summary"] == "short rewritten summary"
+    assert len(client.points) == 10
+
+    stats, _ = run_ingest(client, hikes, full=True)
+    assert (stats.indexed, stats.unchanged) == (10, 0)
+
+
+def test_hike_id_is_stable():
+    hike = make_hikes(1)[0]
+    assert hike_id(hike) == hike_id({**hike, "Trail name": "  Trail 0 ", "Summary": "edited"})
+    assert hike_id(hike) != hike_id(make_hikes(2)[1])
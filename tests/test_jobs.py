@@ -0,0 +1,142 @@
+"""
+test_jobs.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for background jobs ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+import asyncio
+import io
+import pytest
+from fastapi import status
+from PIL import Image
+
+from app import models, jobs
+from app.aws import get_object_metadata
+from app.image_processing import make_derivatives, THUMBNAIL_SIZE
+from tests.conftest import TestingAsyncSessionLocal
+
+def run_jobs():
+    async def run():
+        async with TestingAsyncSessionLocal() as db:
+            return await jobs.process_jobs(db)
+    return asyncio.run(run())
+
+#----------------------------------[ TEST enqueue from routes ]----------------------------------
+
+def test_delete_image_enqueues_job(client, test_user, test_images, session):
+    jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
+    result = client.delete(f"adventure/images/{test_images[0].image_id}", headers=jwt)
+    assert result.status_code == status.HTTP_202_ACCEPTED
+
+    job = session.query(models.Jobs).one()
+    assert job.kind == "delete_s3_objects"
+    assert job.payload == {"urls": ["http://some-url.com/123456789"]}
+    assert job.status == jobs.JOB_PENDING
+
+
+def test_delete_adventure_enqueues_job(client, test_user, test_images, session):
+    jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
+    result = client.delete("adventure/1", headers=jwt)
+    assert result.status_code == status.HTTP_204_NO_CONTENT
+
+    job = session.query(models.Jobs).one()
+    assert sorted(job.payload["urls"]) == ["http://some-url.com/123456789", "http://some-url.com/9999999"]
+
+
+def test_delete_adventure_without_images_enqueues_nothing(client, test_user, test_adventures, session):
+    jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
+    result = client.delete("adventure/2", headers=jwt)
+    assert result.status_code == status.HTTP_204_NO_CONTENT
+    assert session.query(models.Jobs).count() == 0
+
+#----------------------------------[ TEST process_jobs ]----------------------------------
+
+def test_process_jobs_success(session, monkeypatch):
+    deleted = []
+    monkeypatch.setattr(jobs, "delete_files_from_s3", lambda urls: deleted.extend(urls) or [])
+    session.add(models.Jobs(kind="delete_s3_objects", payload={"urls": ["a", "b"]}))
+    session.commit()
+
+    assert run_jobs() == 1
+    assert deleted == ["a", "b"]
+    session.expire_all()
+    job = session.query(models.Jobs).one()
+    assert job.status == jobs.JOB_DONE
+    assert job.attempts == 1
+    #nothing left to run
+    assert run_jobs() == 0
+
+
+def test_process_jobs_retries_then_fails(session, monkeypatch):
+    monkeypatch.setattr(jobs, "delete_files_from_s3", lambda urls: urls)
+    monkeypatch.setattr(jobs.settings, "JOB_RETRY_BASE_SEC", 0)
+    session.add(models.Jobs(kind="delete_s3_objects", payload={"urls": ["a"]}, max_attempts=2))
+    session.commit()
+
+    assert run_jobs() == 1
+    session.expire_all()
+    job = session.query(models.Jobs).one()
+    assert job.status == jobs.JOB_PENDING
+    assert job.attempts == 1
+    assert "could not delete 1 of 1" in job.last_error
+
+    assert run_jobs() == 1
+    session.expire_all()
+    job = session.query(models.Jobs).one()
+    assert job.status == jobs.JOB_FAILED
+    assert job.attempts == 2
+    assert run_jobs() == 0
+
+
+def test_enqueue_unknown_kind(session):
+    with pytest.raises(ValueError):
+        jobs.enqueue_job(session, "not_a_job", {})
+
+#----------------------------------[ TEST image derivatives ]----------------------------------
+
+def make_png(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (30, 120, 200)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_make_derivatives_sizes():
+    derivatives = make_derivatives(make_png((4000, 3000)))
+    with Image.open(io.BytesIO(derivatives["thumbnail"])) as thumbnail:
+        assert thumbnail.format == "WEBP"
+        assert thumbnail.size == THUMBNAIL_SIZE
+    with Image.open(io.BytesIO(derivatives["webp"])) as webp:
+        assert webp.format == "WEBP"
+        assert webp.size == (1600, 1200)
+
+
+def test_post_image_builds_derivatives(client, test_user, test_adventures, session):
+    jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
+    result = client.post(
+        "adventure/1/images",
+        data={"caption": "nice view"},
+        files={"image": ("photo.png", make_png((2000, 1000)), "image/png")},
+        headers=jwt
+    )
+    assert result.status_code == status.HTTP_200_OK
+    assert result.json()[-1]["thumbnail_url"] is None
+    job = session.query(models.Jobs).one()
+    assert job.kind == "image_derivatives"
+
+    assert run_jobs() == 1
+    session.expire_all()
+    assert session.query(models.Jobs).one().status == jobs.JOB_DONE
+    image = session.query(models.Images).one()
+    assert image.thumbnail_url.endswith("_thumb.webp")
+    assert image.webp_url.endswith("_full.webp")
+    for url in (image.thumbnail_url, image.webp_url):
+        object_name = url.split(".amazonaws.com/", 1)[1]
+        assert get_object_metadata(object_name)["ContentType"] == "image/webp"
+
+    images = client.get("adventure/images/1").json()
+    assert images[0]["thumbnail_url"] == image.thumbnail_url
+
+    #deleting the image removes the original and both derivatives
+    client.delete(f"adventure/images/{image.image_id}", headers=jwt)
+    delete_job = session.query(models.Jobs).filter(models.Jobs.kind == "delete_s3_objects").one()
+    assert sorted(delete_job.payload["urls"]) == sorted([image.url, image.thumbnail_url, image.webp_url])
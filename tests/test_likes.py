@@ -0,0 +1,125 @@
+"""
+test_likes.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for likes Endpoints ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+from fastapi import status
+
+from app import schemas
+from app.models import Adventures, Likes
+from app.oauth2 import create_access_token
+
+def like_count(session, adventure_id):
+    session.expire_all()
+    return session.query(Adventures).filter(Adventures.adventure_id == adventure_id).first().like_count
+
+#----------------------------------[ TEST POST /adventure/{adventure_id}/like ]----------------------------------
+
+def test_like_adventure(client, session, test_user, test_adventures):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    result = client.post("/adventure/1/like", headers=jwt)
+    assert result.status_code == status.HTTP_200_OK
+    assert schemas.LikeReturn(**result.json()) == schemas.LikeReturn(adventure_id=1, like_count=1, liked_by_me=True)
+
+    #liking twice does not count twice
+    result = client.post("/adventure/1/like", headers=jwt)
+    assert result.json()["like_count"] == 1
+    assert like_count(session, 1) == 1
+    assert session.query(Likes).count() == 1
+
+
+def test_like_counts_every_user(client, session, test_user, test_adventures):
+    for user_id in [1, 2]:
+        jwt = {"Authorization": f"bearer {create_access_token(data={'user_id': user_id})}"}
+        client.post("/adventure/4/like", headers=jwt)
+    assert like_count(session, 4) == 2
+
+
+def test_like_nonexistent_adventure(client, test_user, test_adventures):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    result = client.post("/adventure/99/like", headers=jwt)
+    assert result.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_like_requires_login(client, test_adventures):
+    assert client.post("/adventure/1/like").status_code == status.HTTP_401_UNAUTHORIZED
+
+#----------------------------------[ TEST DELETE /adventure/{adventure_id}/like ]----------------------------------
+
+def test_unlike_adventure(client, session, test_user, test_adventures):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    client.post("/adventure/1/like", headers=jwt)
+    result = client.delete("/adventure/1/like", headers=jwt)
+    assert result.status_code == status.HTTP_200_OK
+    assert result.json() == {"adventure_id": 1, "like_count": 0, "liked_by_me": False}
+
+    #unliking an adventure that is not liked does not go below zero
+    result = client.delete("/adventure/1/like", headers=jwt)
+    assert result.json()["like_count"] == 0
+    assert like_count(session, 1) == 0
+
+
+def test_delete_user_decrements_like_counts(client, session, test_user, test_adventures):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    client.post("/adventure/4/like", headers=jwt)
+    other_jwt = {"Authorization": f"bearer {create_access_token(data={'user_id': 2})}"}
+    client.post("/adventure/4/like", headers=other_jwt)
+
+    client.delete(f"/user/{test_user['user_id']}", headers=jwt)
+    assert like_count(session, 4) == 1
+
+#----------------------------------[ TEST like counts in AdventureReturn ]----------------------------------
+
+def test_feed_includes_likes(client, test_user, test_adventures):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    client.post("/adventure/1/like", headers=jwt)
+    client.post("/adventure/2/like", headers=jwt)
+
+    adventures = {adventure["adventure_id"]: adventure for adventure in client.get("/adventure/?limit=10", headers=jwt).json()}
+    assert adventures[1]["like_count"] == 1 and adventures[1]["liked_by_me"]
+    assert adventures[2]["liked_by_me"]
+    assert adventures[3]["like_count"] == 0 and not adventures[3]["liked_by_me"]
+
+    #anonymous requests get the counts but never liked_by_me
+    adventures = {adventure["adventure_id"]: adventure for adventure in client.get("/adventure/?limit=10").json()}
+    assert adventures[1]["like_count"] == 1 and not adventures[1]["liked_by_me"]
+
+    result = client.get("/adventure/1", headers=jwt).json()
+    assert result["like_count"] == 1 and result["liked_by_me"]
+
+
+def test_user_adventures_include_likes(client, test_user, test_adventures):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    client.post("/adventure/1/like", headers=jwt)
+    path = f"/user/{test_user['user_id']}/adventures"
+
+    adventures = {adventure["adventure_id"]: adventure for adventure in client.get(path, headers=jwt).json()}
+    assert adventures[1]["like_count"] == 1 and adventures[1]["liked_by_me"]
+    assert adventures[3]["like_count"] == 0 and not adventures[3]["liked_by_me"]
+    assert client.get(path).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_feed_rejects_invalid_token(client, test_adventures):
+    result = client.get("/adventure/", headers={"Authorization": "bearer not-a-token"})
+    assert result.status_code == status.HTTP_401_UNAUTHORIZED
+
+#----------------------------------[ TEST GET /adventure/likes ]----------------------------------
+
+def test_get_like_counts(client, test_user, test_adventures):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    client.post("/adventure/2/like", headers=jwt)
+
+    result = client.get("/adventure/likes?ids=3&ids=2&ids=99", headers=jwt)
+    assert result.status_code == status.HTTP_200_OK
+    assert result.json() == [
+        {"adventure_id": 3, "like_count": 0, "liked_by_me": False},
+        {"adventure_id": 2, "like_count": 1, "liked_by_me": True},
+    ]
+    assert client.get("/adventure/likes?ids=2").json()[0]["liked_by_me"] is False
+
+
+def test_get_like_counts_too_many_ids(client, test_adventures):
+    query = "&".join(f"ids={i}" for i in range(101))
+    assert client.get(f"/adventure/likes?{query}").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.get("/adventure/likes").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
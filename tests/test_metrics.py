@@ -0,0 +1,18 @@
+"""
+test_metrics.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for metrics Endpoints ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+from fastapi import status
+
+from app import schemas
+#----------------------------------[ TEST GET /metrics/db-pool ]----------------------------------
+
+def test_get_db_pool_stats(client, test_adventures):
+    client.get("/adventure/")
+    result = client.get("/metrics/db-pool")
+    assert result.status_code == status.HTTP_200_OK
+    stats = schemas.PoolStats(**result.json())
+    assert stats.checkouts >= 1
+    assert stats.max_wait_ms >= stats.average_wait_ms >= 0
@@ -0,0 +1,116 @@
+"""
+test_oauth2.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for JWT backends and the token cache ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+import time
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from fastapi import status, HTTPException
+from jose import JWTError, ExpiredSignatureError, jwt
+
+from app import oauth2, schemas
+from app.cache import TTLCache
+from app.oauth2 import JoseBackend, HmacBackend, build_jwt_backend
+
+SECRET = "testsecretkey"
+
+def claims(minutes=30, **extra):
+    return {"user_id": "1", "exp": datetime.now(timezone.utc) + timedelta(minutes=minutes), **extra}
+
+@pytest.fixture
+def fresh_token_cache(monkeypatch):
+    cache = TTLCache(maxsize=100, ttl=1800)
+    monkeypatch.setattr(oauth2, "token_cache", cache)
+    return cache
+
+#----------------------------------[ TEST JWT backends ]----------------------------------
+
+@pytest.mark.parametrize("encoder, decoder", [
+    (JoseBackend(SECRET, "HS256"), HmacBackend(SECRET, "HS256")),
+    (HmacBackend(SECRET, "HS256"), JoseBackend(SECRET, "HS256")),
+    (HmacBackend(SECRET, "HS512"), HmacBackend(SECRET, "HS512")),
+])
+def test_backends_are_interchangeable(encoder, decoder):
+    decoded = decoder.decode(encoder.encode(claims()))
+    assert decoded["user_id"] == "1"
+    assert isinstance(decoded["exp"], int)
+
+
+@pytest.mark.parametrize("backend", [JoseBackend(SECRET, "HS256"), HmacBackend(SECRET, "HS256")])
+def test_backends_reject_invalid_tokens(backend):
+    token = backend.encode(claims())
+    header, payload, signature = token.split(".")
+    other_payload = HmacBackend(SECRET, "HS256").encode(claims(user_id="2")).split(".")[1]
+
+    with pytest.raises(ExpiredSignatureError):
+        backend.decode(backend.encode(claims(minutes=-30)))
+    with pytest.raises(JWTError):
+        backend.decode(f"{header}.{other_payload}.{signature}")
+    with pytest.raises(JWTError):
+        backend.decode(HmacBackend("other secret", "HS256").encode(claims()))
+    with pytest.raises(JWTError):
+        backend.decode(HmacBackend(SECRET, "HS512").encode(claims()))
+    with pytest.raises(JWTError):
+        backend.decode("not.a.token")
+
+
+def test_hmac_backend_rejects_other_algorithms():
+    with pytest.raises(ValueError):
+        HmacBackend(SECRET, "RS256")
+    with pytest.raises(ValueError):
+        build_jwt_backend("pyjwt", SECRET, "HS256")
+
+#----------------------------------[ TEST token cache ]----------------------------------
+
+def test_verified_token_is_cached(fresh_token_cache):
+    token = oauth2.create_access_token(data={"user_id": 1})
+    exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    assert oauth2.verify_token(token, exception).id == 1
+    assert oauth2.verify_token(token, exception).id == 1
+    assert fresh_token_cache.hits == 1
+    assert len(fresh_token_cache) == 1
+
+
+def test_expired_token_is_not_cached(fresh_token_cache):
+    token = oauth2.create_access_token(data={"user_id": 1}, testing_state=True)
+    exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            oauth2.verify_token(token, exception)
+    assert len(fresh_token_cache) == 0
+
+
+def test_cached_token_expires_with_exp(fresh_token_cache):
+    exp = int(time.time()) + 1
+    token = jwt.encode({"user_id": "1", "exp": exp}, oauth2.SECRET_KEY, algorithm=oauth2.ALGORITHM)
+    exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    assert oauth2.verify_token(token, exception).id == 1
+
+    #jose compares exp with the current time in whole seconds
+    while time.time() <= exp + 1.05:
+        time.sleep(0.05)
+    with pytest.raises(HTTPException):
+        oauth2.verify_token(token, exception)
+    assert fresh_token_cache.expirations == 1
+
+
+def test_expired_jwt_rejected_after_valid_requests(client, test_user):
+    jwt_header = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    assert client.get(f"/user/{test_user['user_id']}/adventures", headers=jwt_header).status_code == status.HTTP_200_OK
+
+    expired_token = oauth2.create_access_token(data={"user_id": test_user["user_id"]}, testing_state=True)
+    result = client.get(f"/user/{test_user['user_id']}/adventures", headers={"Authorization": f"bearer {expired_token}"})
+    assert result.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_get_jwt_cache_stats(client, test_user):
+    jwt_header = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    for _ in range(2):
+        client.get(f"/user/{test_user['user_id']}/adventures", headers=jwt_header)
+    result = client.get("/metrics/jwt-cache")
+    assert result.status_code == status.HTTP_200_OK
+    stats = schemas.CacheStats(**result.json())
+    assert stats.hits >= 1
@@ -0,0 +1,141 @@
+"""
+test_passwords.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for the password hashing service ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app import schemas
+from app.models import Users
+from app.passwords import PasswordHasher, pwd_context
+
+def fast_context(rounds=4):
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+#----------------------------------[ TEST PasswordHasher ]----------------------------------
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(fast_context(), max_workers=2, max_pending=8)
+
+    async def run():
+        hashed = await hasher.hash("password123")
+        return await hasher.verify("password123", hashed), await hasher.verify("wrong", hashed)
+
+    assert asyncio.run(run()) == (True, False)
+    stats = hasher.stats()
+    assert stats["completed"] == 3
+    assert stats["pending"] == 0
+    hasher.shutdown()
+
+
+def test_hashing_does_not_block_the_event_loop():
+    hasher = PasswordHasher(fast_context(rounds=10), max_workers=1, max_pending=8)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(1)
+            await asyncio.sleep(0.005)
+
+    async def run():
+        await asyncio.gather(hasher.hash("password123"), ticker())
+
+    asyncio.run(run())
+    assert len(ticks) == 5
+    hasher.shutdown()
+
+
+def test_back_pressure_rejects_past_max_pending():
+    hasher = PasswordHasher(fast_context(), max_workers=1, max_pending=1)
+    release = threading.Event()
+
+    class SlowContext:
+        def hash(self, password):
+            release.wait(5)
+            return password
+
+    hasher.context = SlowContext()
+
+    async def run():
+        first = asyncio.create_task(hasher.hash("a"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as error:
+            await hasher.hash("b")
+        release.set()
+        await first
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert error.headers["Retry-After"] == "1"
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["peak_pending"] == 1
+    hasher.shutdown()
+
+
+def test_verify_and_update_when_cost_changes():
+    old_hash = fast_context(rounds=4).hash("password123")
+    hasher = PasswordHasher(fast_context(rounds=5), max_workers=1, max_pending=8)
+
+    verified, new_hash = asyncio.run(hasher.verify_and_update("password123", old_hash))
+    assert verified
+    assert new_hash.startswith("$2b$05$")
+    assert asyncio.run(hasher.verify_and_update("password123", new_hash)) == (True, None)
+    hasher.shutdown()
+
+#----------------------------------[ TEST POST /user/login ]----------------------------------
+
+def test_login_rehashes_outdated_password(test_user, client, session):
+    user = session.query(Users).filter(Users.user_id == test_user["user_id"]).first()
+    user.password = fast_context(rounds=4).hash(test_user["password"])
+    session.commit()
+
+    result = client.post("user/login", data={"username": test_user["username"], "password": test_user["password"]})
+    assert result.status_code == status.HTTP_200_OK
+
+    session.expire_all()
+    user = session.query(Users).filter(Users.user_id == test_user["user_id"]).first()
+    assert not pwd_context.needs_update(user.password)
+    assert pwd_context.verify(test_user["password"], user.password)
+
+
+def test_get_password_hashing_stats(test_user, client):
+    result = client.get("/metrics/password-hashing")
+    assert result.status_code == status.HTTP_200_OK
+    stats = schemas.PasswordHashingStats(**result.json())
+    assert stats.completed >= 1
+    assert stats.pending == 0
+
+
+def test_cancelled_queued_hash_gives_back_its_slot():
+    hasher = PasswordHasher(fast_context(), max_workers=1, max_pending=8)
+    release = threading.Event()
+
+    class SlowContext:
+        def hash(self, password):
+            release.wait(5)
+            return password
+
+    hasher.context = SlowContext()
+
+    async def run():
+        first = asyncio.create_task(hasher.hash("a"))
+        queued = [asyncio.create_task(hasher.hash(str(i))) for i in range(3)]
+        await asyncio.sleep(0.01)
+        #cancelled while still waiting for the single worker, e.g. the client disconnected
+        for task in queued:
+            task.cancel()
+        await asyncio.gather(*queued, return_exceptions=True)
+        release.set()
+        await first
+
+    asyncio.run(run())
+    hasher.shutdown()
+    assert hasher.stats()["pending"] == 0
+    assert hasher.stats()["completed"] == 1
@@ -0,0 +1,75 @@
+"""
+test_response_cache.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for the semantic response cache ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+from app.LLMdatapipeline.response_cache import SemanticResponseCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_cache(**kwargs):
+    settings = {"maxsize": 10, "ttl": 60, "threshold": 0.9}
+    settings.update(kwargs)
+    return SemanticResponseCache(**settings)
+
+def test_similar_query_with_same_hikes_hits():
+    cache = make_cache()
+    cache.store([1.0, 0.0, 0.1], [3, 1, 2], "try Mount Finlayson")
+    #same hikes in a different order, nearly the same direction
+    assert cache.lookup([0.98, 0.02, 0.12], [1, 2, 3]) == "try Mount Finlayson"
+    assert cache.stats()["hits"] == 1
+
+
+def test_dissimilar_query_misses():
+    cache = make_cache()
+    cache.store([1.0, 0.0, 0.0], [1, 2, 3], "answer")
+    assert cache.lookup([0.0, 1.0, 0.0], [1, 2, 3]) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_different_hikes_miss():
+    cache = make_cache()
+    cache.store([1.0, 0.0, 0.0], [1, 2, 3], "answer")
+    assert cache.lookup([1.0, 0.0, 0.0], [1, 2, 4]) is None
+
+
+def test_entries_expire_and_are_evicted():
+    clock = FakeClock()
+    cache = make_cache(maxsize=2, clock=clock)
+    cache.store([1.0, 0.0], [1], "first")
+    cache.store([0.0, 1.0], [2], "second")
+    cache.store([1.0, 1.0], [3], "third")
+    assert cache.lookup([1.0, 0.0], [1]) is None
+    assert cache.stats()["evictions"] == 1
+
+    clock.now = 61
+    assert cache.lookup([0.0, 1.0], [2]) is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["size"] == 1
+
+
+def test_removed_entries_leave_the_hits_index():
+    clock = FakeClock()
+    cache = make_cache(maxsize=2, clock=clock)
+    for hike_id in range(3):
+        cache.store([1.0, 0.0], [hike_id], "answer")
+    assert set(cache.entries.by_hits) == {("1",), ("2",)}
+
+    clock.now = 61
+    cache.lookup([1.0, 0.0], [1])
+    assert set(cache.entries.by_hits) == {("2",)}
+    cache.clear()
+    assert cache.entries.by_hits == {}
+
+
+def test_chat_cache_metrics(client):
+    result = client.get("/metrics/chat-cache")
+    assert result.status_code == 200
+    assert result.json()["maxsize"] > 0
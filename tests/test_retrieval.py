@@ -0,0 +1,180 @@
+"""
+test_retrieval.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for the hike retrieval backends ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.LLMdatapipeline import LLMutils
+from app.LLMdatapipeline.retrieval import Hit, NumpyIndex, FallbackBackend, export_index, build_retriever
+from app.routers import chat
+
+def make_index(tmp_path, count=50, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    ids = [f"id-{i}" for i in range(count)]
+    payloads = [{"hike_name": f"hike {i}"} for i in range(count)]
+    NumpyIndex.write(tmp_path / "hikes_index", ids, vectors, payloads)
+    return NumpyIndex(tmp_path / "hikes_index"), vectors
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FakeBackend:
+    def __init__(self, name, hits=None, error=None):
+        self.name = name
+        self.hits = hits or []
+        self.error = error
+        self.calls = 0
+
+    def search(self, vector, limit):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.hits[:limit]
+
+#----------------------------------[ TEST NumpyIndex ]----------------------------------
+
+def test_numpy_index_top_k_matches_brute_force(tmp_path):
+    index, vectors = make_index(tmp_path)
+    query = np.random.default_rng(1).normal(size=8)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosine = unit @ (query / np.linalg.norm(query))
+    expected = [f"id-{i}" for i in np.argsort(-cosine)[:3]]
+
+    hits = index.search(query.tolist(), 3)
+    assert [hit.id for hit in hits] == expected
+    assert hits[0].score == pytest.approx(cosine.max(), abs=1e-5)
+    assert hits[0].payload == {"hike_name": f"hike {expected[0][3:]}"}
+
+
+def test_numpy_index_limit_larger_than_corpus(tmp_path):
+    index, _ = make_index(tmp_path, count=2)
+    hits = index.search([1.0] * 8, 3)
+    assert len(hits) == 2
+    assert hits[0].score >= hits[1].score
+
+
+def test_numpy_index_is_memory_mapped_and_reloads(tmp_path):
+    index, _ = make_index(tmp_path, count=5)
+    index.search([1.0] * 8, 1)
+    assert isinstance(index._matrix, np.memmap)
+    assert len(index) == 5
+
+    NumpyIndex.write(tmp_path / "hikes_index", ["new"], [[1.0] * 8], [{"hike_name": "new"}])
+    #different mtime even on coarse clocks
+    index._loaded_mtime = -1
+    assert [hit.id for hit in index.search([1.0] * 8, 3)] == ["new"]
+
+
+def test_numpy_index_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        NumpyIndex(tmp_path / "missing").search([1.0], 3)
+
+
+def test_export_index(tmp_path):
+    class Point:
+        def __init__(self, id):
+            self.id = id
+            self.vector = [float(id), 1.0]
+            self.payload = {"hike_name": f"hike {id}"}
+
+    class FakeQdrant:
+        def scroll(self, collection_name, limit, offset, with_payload, with_vectors):
+            start = offset or 0
+            points = [Point(i) for i in range(start, min(start + limit, 5))]
+            return points, (start + limit if start + limit < 5 else None)
+
+    assert export_index(FakeQdrant(), tmp_path / "hikes_index", page_size=2) == 5
+    hits = NumpyIndex(tmp_path / "hikes_index").search([0.0, 1.0], 1)
+    assert hits[0].id == "0"
+    assert hits[0].payload == {"hike_name": "hike 0"}
+
+#----------------------------------[ TEST FallbackBackend ]----------------------------------
+
+def test_fallback_used_while_primary_is_down():
+    clock = FakeClock()
+    primary = FakeBackend("qdrant", error=ConnectionError("down"))
+    fallback = FakeBackend("numpy", hits=[Hit("a", 1.0)])
+    backend = FallbackBackend(primary, fallback, retry_after=30, clock=clock)
+
+    assert backend.search([1.0], 3) == [Hit("a", 1.0)]
+    #primary is not retried until retry_after has passed
+    backend.search([1.0], 3)
+    assert primary.calls == 1
+    assert backend.fallbacks == 2
+
+    clock.now = 31
+    primary.error = None
+    primary.hits = [Hit("b", 0.5)]
+    assert backend.search([1.0], 3) == [Hit("b", 0.5)]
+
+
+def test_fallback_raises_when_both_fail():
+    backend = FallbackBackend(FakeBackend("qdrant", error=ConnectionError("down")), FakeBackend("numpy", error=FileNotFoundError()))
+    with pytest.raises(FileNotFoundError):
+        backend.search([1.0], 3)
+
+
+def test_build_retriever_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        build_retriever("faiss")
+
+#----------------------------------[ TEST POST /chat ]----------------------------------
+
+def test_chat_without_retrieval_backend(client, test_user, monkeypatch):
+    async def embed(text):
+        return [1.0, 0.0, 0.0]
+    monkeypatch.setattr(chat.query_embedder, "embed", embed)
+    monkeypatch.setattr(chat, "retriever", FakeBackend("qdrant", error=ConnectionError("down")))
+
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    result = client.post("/chat", json={"query": "easy hikes near victoria"}, headers=jwt)
+    assert result.status_code == 503
+
+#----------------------------------[ TEST Qdrant setup ]----------------------------------
+
+class UnreachableQdrant:
+    def __init__(self):
+        self.calls = 0
+
+    def get_collections(self):
+        self.calls += 1
+        raise ConnectionError("qdrant is down")
+
+def test_setup_qdrant_stops_waiting_when_asked(monkeypatch):
+    qdrant = UnreachableQdrant()
+    monkeypatch.setattr(LLMutils, "client", qdrant)
+    stop = threading.Event()
+    stop.set()
+    assert LLMutils.setup_qdrant(attempts=5, stop=stop) is False
+    assert qdrant.calls == 1
+
+
+def test_startup_does_not_wait_for_qdrant(monkeypatch):
+    started = threading.Event()
+    def slow_setup_qdrant(stop):
+        started.set()
+        stop.wait(10)
+        return False
+    monkeypatch.setattr(main, "setup_qdrant", slow_setup_qdrant)
+    monkeypatch.setattr(main.settings, "RETRIEVAL_BACKEND", "auto")
+    monkeypatch.setattr(main.settings, "JOB_WORKER_ENABLED", False)
+    monkeypatch.setattr(main.settings, "EMBEDDING_MODEL_PRELOAD", False)
+
+    start = time.perf_counter()
+    with TestClient(main.app):
+        assert started.wait(1)
+    assert time.perf_counter() - start < 5
@@ -0,0 +1,11 @@
+"""
+test_startup.py
+
+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=[ Tests for api startup ]=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
+
+"""
+from benchmarks.startup_bench import run_probe
+
+def test_import_does_not_load_ml_packages():
+    #fresh interpreter, the test session itself may already have imported them
+    assert run_probe(load_model=False)["heavy_modules"] == []
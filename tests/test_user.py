@@ -12,8 +12,8 @@ import pytest
 from jose import jwt
 
 from app.config import settings
-from app.oauth2 import verify_password
-from app.models import Users
+from app.oauth2 import verify_password, principal_cache
+from app.models import Users, Images
 from app import schemas
 from tests.testing_strings import long_email, sql_injections
 
@@ -141,6 +141,15 @@ def test_delete_user(test_user, session, client):
     assert not user_query
 
 
+def test_delete_user_removes_images(test_user, test_images, session, client):
+    jwt = {"Authorization" : f"bearer {test_user['jwt_token']}"}
+    id = test_user["user_id"]
+    result = client.delete(f"user/{id}", headers=jwt)
+    assert result.status_code == status.HTTP_204_NO_CONTENT
+    #all images were either in the users adventures or owned by the user
+    assert session.query(Images).count() == 0
+
+
 #----------------------------------[ Test PUT /user/{id} ]----------------------------------
 @pytest.mark.parametrize("username, email, password",[
     (None, None, "password123"),
@@ -215,4 +224,37 @@ def test_invalid_get_user(client, test_user):
     id = 124
     result = client.get(f"user/{id}")
     assert result.status_code == status.HTTP_404_NOT_FOUND
-    assert result.json().get("detail") == f"could not find user with id={id}"
\ No newline at end of file
+    assert result.json().get("detail") == f"could not find user with id={id}"
+#----------------------------------[ Test principal cache ]----------------------------------
+
+def test_current_user_is_cached(client, test_user):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    id = test_user['user_id']
+    client.get(f"user/{id}/adventures", headers=jwt)
+    hits = principal_cache.hits
+    result = client.get(f"user/{id}/adventures", headers=jwt)
+    assert result.status_code == status.HTTP_200_OK
+    assert principal_cache.hits == hits + 1
+    assert principal_cache.get(id)["username"] == test_user["username"]
+
+
+def test_put_user_invalidates_cached_user(client, test_user):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    id = test_user['user_id']
+    client.get(f"user/{id}/adventures", headers=jwt)
+
+    result = client.put(f"user/{id}", json={"username": "renamed"}, headers=jwt)
+    assert result.status_code == status.HTTP_204_NO_CONTENT
+    assert principal_cache.get(id) is None
+
+    client.get(f"user/{id}/adventures", headers=jwt)
+    assert principal_cache.get(id)["username"] == "renamed"
+
+
+def test_delete_user_invalidates_cached_user(client, test_user):
+    jwt = {"Authorization": f"bearer {test_user['jwt_token']}"}
+    id = test_user['user_id']
+    client.get(f"user/{id}/adventures", headers=jwt)
+    result = client.delete(f"user/{id}", headers=jwt)
+    assert result.status_code == status.HTTP_204_NO_CONTENT
+    assert principal_cache.get(id) is None